@@ -0,0 +1,112 @@
+"""Messages per second of handle_message vs. the original if/elif version.
+
+Replays the golden utterances from tests/golden/handle_message.json::
+
+    python benchmarks/bench_intents.py --seconds 2
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+import streamlit as st  # noqa: E402
+
+import app  # noqa: E402
+from helpers import find_property, get_faq_answer, load_properties  # noqa: E402
+
+
+def legacy_handle_message(user_text, df):
+    """handle_message as it was before the compiled router (LLM polish omitted)."""
+    user_text = user_text.lower()
+
+    def detail(prop):
+        return (
+            f"{prop['property_name']} — {int(prop['bedrooms']) if prop['bedrooms'] else 0} BHK "
+            f"({int(prop['area_sqft'])} sqft) in {prop['city']}. Price: {int(prop['price']):,} {prop['price_currency']}. "
+            f"Status: {prop['availability']}.\nShort: {prop['short_description']}\nContact: {prop['agent_email']}"
+        ), ["Book a visit", "Show all properties"]
+
+    if user_text in ["hi", "hello", "hey"]:
+        return "Hello! 👋 How can I help you today?", ["Show all properties", "Book a visit", "FAQs", "Check amenities"]
+    elif "properties" in user_text or "show all properties" in user_text:
+        st.session_state.show_properties = True
+        return "Here are the available properties:", ["Book a visit", "Check amenities"]
+    elif "book" in user_text or "visit" in user_text:
+        st.session_state.booking_flow = {"step": "ask_name", "buffer": {}}
+        return "Sure! Let's schedule a visit. Please share your full name:", []
+    elif "amenities" in user_text:
+        st.session_state.show_properties = False
+        amenities = "\n".join([f"🏠 {row['property_name']}: {row['short_description']}" for _, row in df.iterrows()])
+        return f"Here are the amenities for each property:\n\n{amenities}", []
+    elif "faq" in user_text:
+        return "Here are some FAQs: ...", ["Show all properties", "Book a visit"]
+    elif "price" in user_text:
+        prop_id_match = re.search(r'P\d+', user_text.upper())
+        if prop_id_match:
+            prop = find_property(df, prop_id_match.group())
+            if prop:
+                return detail(prop)
+        prop = find_property(df, user_text)
+        if prop:
+            return detail(prop)
+        prices = "\n".join([
+            f"{row['property_name']}: {int(row['price']):,} {row['price_currency']}" for _, row in df.iterrows()
+        ])
+        return f"Here are the property prices:\n\n{prices}", []
+    else:
+        faq = get_faq_answer(user_text)
+        if faq:
+            return faq, ["Show all properties", "Book a visit"]
+        prop = find_property(df, user_text)
+        if prop:
+            return detail(prop)
+        cleaned_text = re.sub(r'show details for|details for|information about|tell me about|what is|price of|property|apartment|villa|studio|office|house', '', user_text).strip()
+        if cleaned_text:
+            prop = find_property(df, cleaned_text)
+            if prop:
+                return detail(prop)
+        return "I didn't understand that. Please try again.", ["Show all properties", "Book a visit"]
+
+
+def throughput(fn, df, utterances, seconds):
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for text in utterances:
+            fn(text, df)
+        count += len(utterances)
+    return count / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    os.environ.pop("LLM_API_KEY", None)
+    with open(os.path.join(ROOT, "tests", "golden", "handle_message.json"), encoding="utf-8") as fh:
+        cases = json.load(fh)
+    df = load_properties()
+
+    mixes = {
+        "all golden utterances": [c["text"] for c in cases],
+        # Leave out the catalog dumps (amenities, all prices), which are row iteration.
+        "routing + lookups": [c["text"] for c in cases if not c["reply"].startswith("Here are the")],
+    }
+    for label, utterances in mixes.items():
+        legacy = throughput(legacy_handle_message, df, utterances, args.seconds)
+        current = throughput(app.handle_message, df, utterances, args.seconds)
+        print(f"[{label}]")
+        print(f"  legacy if/elif chain : {legacy:10,.0f} msg/s")
+        print(f"  handle_message       : {current:10,.0f} msg/s  ({current / legacy:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
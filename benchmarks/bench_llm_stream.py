@@ -0,0 +1,57 @@
+"""Time-to-first-token of streamed LLM polish vs. the blocking call.
+
+Runs against the local fake completions server, so no API key or network
+is needed::
+
+    python benchmarks/bench_llm_stream.py --delay 0.3 --token-delay 0.02
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.helpers import ResponseCache, polish_with_llm, stream_polish_with_llm  # noqa: E402
+from tests.fake_llm import FakeLLMServer  # noqa: E402
+
+REPLY = (
+    "Marina Studio — 0 BHK (420 sqft) in Dubai. Price: 95,000 USD. Status: Available.\n"
+    "Short: Compact studio near marina\nContact: agent3@zorever.com"
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--delay", type=float, default=0.3, help="server think time before the first byte")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="server delay between tokens")
+    args = parser.parse_args()
+
+    blocking, first_token, streamed_total = [], [], []
+    with FakeLLMServer(delay=args.delay, token_delay=args.token_delay) as server:
+        for _ in range(args.runs):
+            # Fresh caches so every run goes to the server.
+            t0 = time.perf_counter()
+            polish_with_llm(REPLY, "key", api_url=server.url, cache=ResponseCache())
+            blocking.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            first = None
+            for _partial in stream_polish_with_llm(REPLY, "key", api_url=server.url, cache=ResponseCache()):
+                if first is None:
+                    first = time.perf_counter() - t0
+            first_token.append(first)
+            streamed_total.append(time.perf_counter() - t0)
+
+    def ms(values):
+        return f"p50 {statistics.median(values) * 1e3:8.1f} ms   max {max(values) * 1e3:8.1f} ms"
+
+    print(f"blocking reply visible : {ms(blocking)}")
+    print(f"streaming first token  : {ms(first_token)}")
+    print(f"streaming full reply   : {ms(streamed_total)}")
+
+
+if __name__ == "__main__":
+    main()
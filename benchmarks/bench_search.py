@@ -0,0 +1,61 @@
+"""Per-query latency of the trigram property search on a synthetic catalog.
+
+    python benchmarks/bench_search.py --rows 500000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import pandas as pd  # noqa: E402
+
+from search import TrigramIndex  # noqa: E402
+
+WORDS = [
+    "sunrise", "marina", "desert", "royal", "palm", "garden", "golden", "blue", "silver", "crystal",
+    "emerald", "ocean", "harbor", "maple", "cedar", "lake", "river", "park", "hill", "valley",
+]
+KINDS = ["apartments", "villa", "studio", "residences", "towers", "heights", "court", "plaza", "lofts", "suites"]
+
+
+def typo(word: str, rng: random.Random) -> str:
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1:]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    vocab = [f"{w}{i}" if i else w for i in range(10) for w in WORDS]
+    names = [f"{rng.choice(vocab)} {rng.choice(vocab)} {rng.choice(KINDS)}".title() for _ in range(args.rows)]
+    df = pd.DataFrame({"property_name": names})
+
+    t0 = time.perf_counter()
+    index = TrigramIndex(df)
+    print(f"build: {time.perf_counter() - t0:.2f}s for {args.rows:,} rows")
+
+    queries = [" ".join(typo(w, rng) for w in rng.choice(names).lower().split()) for _ in range(args.queries)]
+    for q in queries:  # resolve query words once, as a warm process would have
+        index.search(q)
+    timings = []
+    for q in queries:
+        t0 = time.perf_counter()
+        index.search(q)
+        timings.append(time.perf_counter() - t0)
+    timings.sort()
+    p = lambda f: timings[int(f * (len(timings) - 1))] * 1e3  # noqa: E731
+    print(f"query: p50 {p(0.5):.3f} ms  p95 {p(0.95):.3f} ms  p99 {p(0.99):.3f} ms  mean {statistics.mean(timings) * 1e3:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
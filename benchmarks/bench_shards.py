@@ -0,0 +1,115 @@
+"""Query throughput of the sharded catalog vs. shard count on a synthetic catalog.
+
+    python benchmarks/bench_shards.py --rows 1000000 --shards 1,2,4 --clients 8
+
+Client threads replay a mixed workload (id/name lookups, grid filters, BM25
+and fuzzy name searches) against an in-process baseline and then against a
+``ShardedCatalog`` per shard count. Scaling needs as many cores as shards;
+on fewer cores the workers just take turns.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import bm25  # noqa: E402
+from facets import SORT_OPTIONS, get_facet_index  # noqa: E402
+from helpers import find_property, load_properties  # noqa: E402
+from search import get_trigram_index  # noqa: E402
+from shards import SHARD_BY, ShardedCatalog  # noqa: E402
+from synthetic import CITIES, TYPES, write_catalog  # noqa: E402
+
+SEARCHES = ["villa with private pool", "near metro", "studio close to the beach", "family home park views"]
+
+
+def workload(df, count, rng):
+    """``count`` (operation, args) pairs drawn from a fixed mix."""
+    ids = df["listing_id"].to_numpy()
+    names = df["property_name"].to_numpy()
+    ops = []
+    for _ in range(count):
+        row = rng.randrange(len(df))
+        kind = rng.choices(["id", "name", "filter", "search", "fuzzy"], weights=[30, 10, 20, 25, 15])[0]
+        if kind == "id":
+            ops.append(("find", (ids[row],)))
+        elif kind == "name":
+            ops.append(("find", (names[row].lower(),)))
+        elif kind == "filter":
+            ops.append(("filter", (rng.choice(CITIES), rng.choice(TYPES + ["All"]), None, rng.choice(list(SORT_OPTIONS)))))
+        elif kind == "search":
+            ops.append(("search", (rng.choice(SEARCHES),)))
+        else:
+            ops.append(("fuzzy_search", (names[row][:-2].lower(),)))
+    return ops
+
+
+class InProcess:
+    """The same operations against one in-process frame."""
+
+    def __init__(self, df):
+        self.df = df
+        self.bm25 = bm25.BM25Index.build(df)
+        get_facet_index(df)
+        get_trigram_index(df)
+
+    def find(self, query):
+        return find_property(self.df, query)
+
+    def filter(self, city, property_type, price, sort_by, limit=50):
+        positions = get_facet_index(self.df).filter(city, property_type, price, sort_by)
+        return len(positions), self.df.iloc[positions[:limit]].to_dict("records")
+
+    def search(self, query, k=5):
+        return self.bm25.search(query, k)
+
+    def fuzzy_search(self, query, k=5):
+        return get_trigram_index(self.df).search(query, k)
+
+
+def throughput(catalog, ops, clients):
+    """Operations per second with ``clients`` threads splitting ``ops``."""
+    def run(part):
+        for method, args in part:
+            getattr(catalog, method)(*args)
+
+    threads = [threading.Thread(target=run, args=(ops[i::clients],)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return len(ops) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--shards", default=",".join(str(n) for n in sorted({1, 2, 4, os.cpu_count() or 1})))
+    parser.add_argument("--by", choices=SHARD_BY, default="hash")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--workdir", default=os.path.join("/tmp", "zorever-bench"))
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    csv_path = write_catalog(os.path.join(args.workdir, f"properties_{args.rows}.csv"), args.rows)
+    df = load_properties(csv_path)
+    ops = workload(df, args.queries, random.Random(7))
+    print(f"{args.rows:,} rows, {args.queries:,} mixed queries, {args.clients} clients, {os.cpu_count()} cpus")
+
+    print(f"in-process: {throughput(InProcess(df), ops, args.clients):8.0f} q/s")
+    del df
+    for shards in (int(n) for n in args.shards.split(",")):
+        start = time.perf_counter()
+        with ShardedCatalog(csv_path, shards, args.by) as catalog:
+            ready = time.perf_counter() - start
+            print(f"{shards:2d} shards:  {throughput(catalog, ops, args.clients):8.0f} q/s  (ready in {ready:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
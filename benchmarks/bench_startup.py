@@ -0,0 +1,88 @@
+"""Cold-start cost of the headless chat path, one fresh interpreter per run.
+
+    python benchmarks/bench_startup.py --repeats 5 [--properties data/properties.csv]
+
+Each scenario runs in a new ``python`` process: the wall time covers
+interpreter start, imports and the first turn; ``import`` is the time to
+import ``engine`` alone. The last columns tell whether pandas or requests
+got imported, which the FAQ and fast-startup lookup paths should avoid.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SRC = os.path.join(ROOT, "src")
+
+CHILD = """
+import sys, time, json
+start = time.perf_counter()
+import engine
+imported = time.perf_counter()
+chat = engine.ChatEngine(properties_path={properties!r}, bookings_path={bookings!r}, polish=False,
+                         fast_startup={fast})
+state = None
+for message in {messages!r}:
+    state = chat.handle(state, message).state
+print(json.dumps({{"import": imported - start, "total": time.perf_counter() - start,
+                  "pandas": "pandas" in sys.modules, "requests": "requests" in sys.modules}}))
+"""
+
+# name -> (messages, fast_startup)
+SCENARIOS = {
+    "import only": ([], False),
+    "faq": (["what are your working hours"], False),
+    "id lookup": (["P003"], False),
+    "id lookup (fast)": (["P003"], True),
+    "name lookup (fast)": (["tell me about marina studio"], True),
+    "booking (fast)": (["book a visit", "Bench User", "555-0100", "P003"], True),
+}
+
+
+def run(properties, bookings, messages, fast):
+    code = CHILD.format(properties=properties, bookings=bookings, messages=messages, fast=fast)
+    env = dict(os.environ, PYTHONPATH=SRC, LLM_API_KEY="")
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["wall"] = time.perf_counter() - start
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--properties", default=os.path.join(ROOT, "data", "properties.csv"))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    properties = os.path.abspath(args.properties)
+    bookings = os.path.join(os.path.dirname(properties), "bench_startup_visits.csv")
+    # Precompile the snapshots the fast path reads.
+    subprocess.run([sys.executable, os.path.join(SRC, "lookup.py"), properties], check=True, capture_output=True)
+
+    results = {}
+    print(f"{'scenario':<20} {'wall ms':>9} {'import ms':>10} {'turns ms':>9}  pandas  requests")
+    try:
+        for name, (messages, fast) in SCENARIOS.items():
+            runs = [run(properties, bookings, messages, fast) for _ in range(args.repeats)]
+            row = {key: statistics.median(r[key] for r in runs) * 1e3 for key in ("wall", "import", "total")}
+            row.update(pandas=runs[-1]["pandas"], requests=runs[-1]["requests"])
+            results[name] = row
+            print(f"{name:<20} {row['wall']:9.0f} {row['import']:10.0f} {row['total'] - row['import']:9.0f}  "
+                  f"{'yes' if row['pandas'] else 'no':<6}  {'yes' if row['requests'] else 'no'}")
+    finally:
+        for path in (bookings, bookings + ".lock"):
+            if os.path.exists(path):
+                os.remove(path)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump({"python": sys.version.split()[0], "properties": properties, "results": results}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""Latency and throughput of the bot's hot paths on synthetic catalogs.
+
+    python benchmarks/bench_suite.py --sizes 10k,100k,1m --out results.json
+    python benchmarks/bench_suite.py --sizes 10k --compare results.json
+
+For each catalog size this measures ``load_properties`` (CSV parse, snapshot
+and cached), ``find_property``, ``ChatEngine.handle`` over a representative
+utterance mix and ``save_visit_booking`` into a growing visits.csv, then runs
+a concurrent-session driver (in process, or against ``src/server.py`` with
+``--url``). Every metric reports p50/p95/p99 in milliseconds and operations
+per second. ``--compare`` flags metrics whose p50 or p95 got slower than
+``--threshold`` times the baseline and exits with status 1.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+sys.path.insert(0, HERE)
+
+import pandas as pd  # noqa: E402
+
+import helpers  # noqa: E402
+from engine import ChatEngine, MemorySessionStore  # noqa: E402
+from facets import get_facet_index  # noqa: E402
+from helpers import PropertyIndex, find_property, load_properties, save_visit_booking  # noqa: E402
+from search import TrigramIndex, get_trigram_index  # noqa: E402
+from synthetic import SIZES, write_catalog  # noqa: E402
+
+# (weight, template) pairs; {id}, {name} and {typo} are filled from the catalog.
+UTTERANCE_MIX = [
+    (10, "hi"),
+    (10, "show all properties"),
+    (5, "FAQs"),
+    (5, "where is your office?"),
+    (5, "what are your working hours"),
+    (5, "check amenities"),
+    (20, "show details for {id}"),
+    (15, "what is the price of {id}?"),
+    (15, "tell me about {name}"),
+    (5, "{typo}"),
+    (5, "book a visit"),
+]
+
+
+def summarize(timings):
+    """p50/p95/p99/mean in ms and ops/s of a list of durations in seconds."""
+    if not timings:
+        return {"n": 0}
+    ordered = sorted(timings)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1e3  # noqa: E731
+    total = sum(ordered)
+    return {
+        "n": len(ordered),
+        "p50_ms": round(pick(0.50), 4),
+        "p95_ms": round(pick(0.95), 4),
+        "p99_ms": round(pick(0.99), 4),
+        "mean_ms": round(total / len(ordered) * 1e3, 4),
+        "ops_per_s": round(len(ordered) / total, 1) if total else None,
+    }
+
+
+def timed(fn, items):
+    timings = []
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def _typo(text, rng):
+    words = text.split()
+    i = rng.randrange(len(words))
+    word = words[i]
+    if len(word) > 3:
+        j = rng.randrange(1, len(word) - 1)
+        words[i] = word[:j] + word[j + 1:]
+    return " ".join(words)
+
+
+def utterances(df, count, rng):
+    """``count`` messages drawn from UTTERANCE_MIX with catalog values filled in."""
+    weights = [w for w, _ in UTTERANCE_MIX]
+    templates = rng.choices([t for _, t in UTTERANCE_MIX], weights=weights, k=count)
+    rows = [rng.randrange(len(df)) for _ in range(count)]
+    ids = df["listing_id"].to_numpy()
+    names = df["property_name"].to_numpy()
+    return [
+        t.format(id=ids[r], name=names[r], typo=_typo(names[r], rng)) for t, r in zip(templates, rows)
+    ]
+
+
+def bench_load(csv_path, repeats):
+    results = {}
+    snap = helpers.snapshot_path(os.path.abspath(csv_path))
+    parse, snapshot = [], []
+    for _ in range(repeats):
+        helpers._PROPERTIES_CACHE.clear()
+        if os.path.exists(snap):
+            os.remove(snap)
+        parse.extend(timed(load_properties, [csv_path]))
+        helpers._PROPERTIES_CACHE.clear()
+        snapshot.extend(timed(load_properties, [csv_path]))
+    results["load_properties.parse"] = summarize(parse)
+    results["load_properties.snapshot"] = summarize(snapshot)
+    results["load_properties.cached"] = summarize(timed(load_properties, [csv_path] * 1000))
+    return results
+
+
+def bench_indexes(df):
+    """One-off build cost of the lazily built per-frame indexes."""
+    results = {
+        "build.property_index": summarize(timed(PropertyIndex, [df])),
+        "build.trigram_index": summarize(timed(TrigramIndex, [df])),
+    }
+    # Attach the shared indexes so the per-request timings below are warm.
+    get_trigram_index(df)
+    results["build.facet_index"] = summarize(timed(get_facet_index, [df]))
+    return results
+
+
+def bench_find(df, count, rng):
+    rows = [rng.randrange(len(df)) for _ in range(count)]
+    ids = [str(df["listing_id"].iat[r]) for r in rows]
+    names = [str(df["property_name"].iat[r]).lower() for r in rows]
+    find_property(df, ids[0])  # build the index outside the timings
+    return {
+        "find_property.id": summarize(timed(lambda q: find_property(df, q), ids)),
+        "find_property.name": summarize(timed(lambda q: find_property(df, q), names)),
+        "find_property.miss": summarize(timed(lambda q: find_property(df, q), [f"zz{i} qq" for i in range(count)])),
+    }
+
+
+def bench_handle(engine, df, count, rng):
+    messages = utterances(df, count, rng)
+    engine.handle(None, messages[0], df)  # build lazy indexes outside the timings
+    return {"handle_message.mix": summarize(timed(lambda m: engine.handle(None, m, df), messages))}
+
+
+def bench_bookings(visits_path, count, rng):
+    timings = timed(
+        lambda i: save_visit_booking(f"P{i:03d}", f"Property {i}", f"User {i}", f"555-{i:04d}", "book a visit",
+                                     out_path=visits_path),
+        range(count),
+    )
+    tenth = max(1, count // 10)
+    return {
+        "save_visit_booking": summarize(timings),
+        "save_visit_booking.first_10pct": summarize(timings[:tenth]),
+        "save_visit_booking.last_10pct": summarize(timings[-tenth:]),
+    }
+
+
+def session_script(df, rng):
+    """One visitor: browse, look a few listings up, then book a visit."""
+    script = ["hi", "show all properties"] + utterances(df, 4, rng)
+    row = rng.randrange(len(df))
+    return script + ["book a visit", "Jane Doe", "555-0100", str(df["listing_id"].iat[row])]
+
+
+def _http_sender(url):
+    parsed = urlparse(url)
+    local = threading.local()
+
+    def send(session_id, message):
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+        conn.request("POST", "/chat", json.dumps({"session_id": session_id, "message": message}),
+                     {"Content-Type": "application/json"})
+        return json.loads(conn.getresponse().read())["session_id"]
+
+    return send
+
+
+def _engine_sender(engine, df):
+    store = MemorySessionStore()
+
+    def send(session_id, message):
+        session_id = session_id or store.new_id()
+        store.put(session_id, engine.handle(store.get(session_id), message, df).state)
+        return session_id
+
+    return send
+
+
+def drive_sessions(send, scripts, concurrency):
+    """Replay ``scripts`` (one per session) on ``concurrency`` threads."""
+    pending = list(scripts)
+    lock = threading.Lock()
+    timings = []
+
+    def worker():
+        local = []
+        while True:
+            with lock:
+                if not pending:
+                    break
+                script = pending.pop()
+            session_id = None
+            for message in script:
+                t0 = time.perf_counter()
+                session_id = send(session_id, message)
+                local.append(time.perf_counter() - t0)
+        with lock:
+            timings.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    summary = summarize(timings)
+    summary.update(concurrency=concurrency, sessions=len(scripts), turns_per_s=round(len(timings) / wall, 1))
+    return summary
+
+
+def run_size(label, rows, args, workdir):
+    rng = random.Random(args.seed)
+    csv_path = write_catalog(os.path.join(args.data_dir, f"properties_{label}.csv"), rows, args.seed)
+    results = bench_load(csv_path, args.load_repeats)
+    df = load_properties(csv_path)
+    results.update(bench_indexes(df))
+    results.update(bench_find(df, args.queries, rng))
+    visits_path = os.path.join(workdir, f"visits_{label}.csv")
+    engine = ChatEngine(properties_path=csv_path, bookings_path=visits_path, polish=False)
+    results.update(bench_handle(engine, df, args.queries, rng))
+    results.update(bench_bookings(os.path.join(workdir, f"bookings_{label}.csv"), args.bookings, rng))
+    send = _http_sender(args.url) if args.url else _engine_sender(engine, df)
+    scripts = [session_script(df, rng) for _ in range(args.sessions)]
+    results["sessions"] = drive_sessions(send, scripts, args.concurrency)
+    return results
+
+
+def compare(current, baseline, threshold):
+    """Lines describing metrics slower than ``threshold`` x the baseline."""
+    regressions = []
+    for size, metrics in current["results"].items():
+        for name, stats in metrics.items():
+            old = baseline.get("results", {}).get(size, {}).get(name)
+            if not old:
+                continue
+            for key in ("p50_ms", "p95_ms"):
+                if old.get(key) and stats.get(key) and stats[key] > old[key] * threshold:
+                    regressions.append(f"{size} {name} {key}: {old[key]:.3f} -> {stats[key]:.3f} ms")
+    return regressions
+
+
+def print_table(results):
+    for size, metrics in results.items():
+        print(f"\n== {size} ==")
+        for name, s in metrics.items():
+            extra = f"  {s['turns_per_s']:>9,.0f} turns/s" if "turns_per_s" in s else ""
+            print(f"{name:<34} p50 {s['p50_ms']:>9.3f}  p95 {s['p95_ms']:>9.3f}  p99 {s['p99_ms']:>9.3f} ms"
+                  f"  {s['ops_per_s'] or 0:>11,.0f} ops/s{extra}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10k,100k", help=f"comma-separated, from {', '.join(SIZES)} or row counts")
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--bookings", type=int, default=2_000)
+    parser.add_argument("--load-repeats", type=int, default=3)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--url", help="drive sessions against a running server, e.g. http://127.0.0.1:8080")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "zorever-bench"),
+                        help="where generated catalogs are cached between runs")
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --out")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        },
+        "results": {},
+    }
+    workdir = tempfile.mkdtemp(prefix="zorever-bench-")
+    try:
+        for label in args.sizes.split(","):
+            label = label.strip().lower()
+            rows = SIZES.get(label) or int(label)
+            print(f"running {label} ({rows:,} rows)...", flush=True)
+            report["results"][label] = run_size(label, rows, args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print_table(report["results"])
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"\nwrote {args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            regressions = compare(report, json.load(fh), args.threshold)
+        print(f"\n{len(regressions)} regression(s) vs {args.compare} (threshold {args.threshold}x)")
+        for line in regressions:
+            print("  " + line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Synthetic catalogs with the ``data/properties.csv`` schema.
+
+    python benchmarks/synthetic.py --rows 100000 --out /tmp/properties_100k.csv
+
+Rows are generated with NumPy from a fixed seed, so a given size always
+produces the same file and benchmark runs stay comparable.
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = [
+    "id", "listing_id", "property_name", "address", "city", "area_sqft", "bedrooms", "bathrooms",
+    "price", "price_currency", "property_type", "availability", "short_description", "agent_email",
+]
+NAME_WORDS = [
+    "Sunrise", "Marina", "Desert", "Royal", "Palm", "Garden", "Golden", "Blue", "Silver", "Crystal",
+    "Emerald", "Ocean", "Harbor", "Maple", "Cedar", "Lake", "River", "Park", "Hill", "Valley",
+]
+TYPES = ["Apartment", "Villa", "Studio", "Townhouse", "Penthouse"]
+KINDS = {"Apartment": "Apartments", "Villa": "Villa", "Studio": "Studio", "Townhouse": "Townhouse", "Penthouse": "Penthouse"}
+CITIES = ["Dubai", "Abu Dhabi", "Sharjah", "Ajman", "Ras Al Khaimah", "Fujairah", "Al Ain", "Umm Al Quwain"]
+STREETS = ["Palm St", "Oasis Road", "Marina Walk", "Corniche Rd", "Sheikh Zayed Rd", "Creek Lane", "Jumeirah St"]
+AVAILABILITY = ["Available", "On Request", "Sold", "Under Offer"]
+DESCRIPTIONS = [
+    "Sea-view 2BHK near metro", "Private pool & garden", "Compact studio close to the beach",
+    "Family home with park views", "Skyline views and gym access", "Quiet street near schools",
+    "Renovated kitchen and balcony", "Walk to the mall and metro",
+]
+# Sizes the benchmark suite generates by default.
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+
+def generate_catalog(rows: int, seed: int = 7) -> pd.DataFrame:
+    """Return a frame of ``rows`` synthetic properties."""
+    rng = np.random.default_rng(seed)
+    types = np.array(TYPES)[rng.integers(0, len(TYPES), rows)]
+    bedrooms = np.where(types == "Studio", 0, rng.integers(1, 7, rows))
+    first = np.array(NAME_WORDS)[rng.integers(0, len(NAME_WORDS), rows)]
+    second = np.array(NAME_WORDS)[rng.integers(0, len(NAME_WORDS), rows)]
+    suffix = rng.integers(0, 1000, rows).astype(str)
+    kinds = pd.Series(types).map(KINDS).to_numpy()
+    ids = np.arange(1, rows + 1)
+    listing_ids = pd.Series(ids).map("P{:03d}".format)
+    return pd.DataFrame({
+        "id": ids,
+        "listing_id": listing_ids,
+        "property_name": pd.Series(first) + " " + pd.Series(second) + suffix + " " + pd.Series(kinds),
+        "address": pd.Series(rng.integers(1, 999, rows).astype(str)) + " " + pd.Series(np.array(STREETS)[rng.integers(0, len(STREETS), rows)]),
+        "city": np.array(CITIES)[rng.integers(0, len(CITIES), rows)],
+        "area_sqft": rng.integers(350, 6000, rows),
+        "bedrooms": bedrooms,
+        "bathrooms": np.maximum(bedrooms, 1),
+        "price": rng.integers(40, 1000, rows) * 5000,
+        "price_currency": "USD",
+        "property_type": types,
+        "availability": np.array(AVAILABILITY)[rng.integers(0, len(AVAILABILITY), rows)],
+        "short_description": np.array(DESCRIPTIONS)[rng.integers(0, len(DESCRIPTIONS), rows)],
+        "agent_email": pd.Series(rng.integers(1, 200, rows).astype(str)).radd("agent") + "@zorever.com",
+    }, columns=COLUMNS)
+
+
+def write_catalog(path: str, rows: int, seed: int = 7) -> str:
+    """Write a synthetic catalog to ``path`` unless it already has ``rows`` rows."""
+    if os.path.exists(path):
+        with open(path, "rb") as fh:
+            if sum(1 for _ in fh) - 1 == rows:
+                return path
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    generate_catalog(rows, seed).to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+    write_catalog(args.out, args.rows, args.seed)
+    print(f"wrote {args.rows:,} rows to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
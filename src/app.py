@@ -1,127 +1,79 @@
 import os
+import uuid
 import streamlit as st
-import pandas as pd
 from helpers import (
     load_properties,
     save_booking,
-    load_bookings,
-    find_property,
-    get_faq_answer,
-    save_visit_booking,
-    polish_with_llm,
+    stream_polish_with_llm,
+    dataset_version,
 )
+from bookings import get_booking_store
+from engine import ChatEngine
+from facets import SORT_OPTIONS, get_facet_index
+from history import HISTORY_WINDOW, ChatHistory, prune_archives
+from thumbnails import thumbnail_path
 
 # ---------------- Chatbot Response Logic ---------------- #
-def handle_message(user_text, df):
-    """Process user input and return chatbot response with quick actions."""
-    user_text = user_text.lower()
+# The chat logic lives in the headless ChatEngine; this module only keeps the
+# engine's session state in st.session_state and renders the result.
+ENGINE = ChatEngine(polish=False)
+_archives_pruned = False
 
-    if user_text in ["hi", "hello", "hey"]:
-        return "Hello! 👋 How can I help you today?", ["Show all properties", "Book a visit", "FAQs", "Check amenities"]
 
-    elif "properties" in user_text or "show all properties" in user_text:
-        # Signal UI to render the property grid instead of long text
-        st.session_state.show_properties = True
-        return "Here are the available properties:", ["Book a visit", "Check amenities"]
+def _chat_history():
+    """This session's ChatHistory, created (with a greeting) on first use."""
+    global _archives_pruned
+    if "history" not in st.session_state:
+        if not _archives_pruned:
+            prune_archives()
+            _archives_pruned = True
+        history = ChatHistory(uuid.uuid4().hex)
+        history.append("assistant", "Hello! 👋 How can I help you today?")
+        st.session_state.history = history
+        st.session_state.history_visible = HISTORY_WINDOW
+    return st.session_state.history
 
-    elif "book" in user_text or "visit" in user_text:
-        st.session_state.booking_flow = {"step": "ask_name", "buffer": {}}
-        return "Sure! Let's schedule a visit. Please share your full name:", []
 
-    elif "amenities" in user_text:
-        st.session_state.show_properties = False
-        amenities = "\n".join([f"🏠 {row['property_name']}: {row['short_description']}" for _, row in df.iterrows()])
-        return f"Here are the amenities for each property:\n\n{amenities}", []
-
-    elif "faq" in user_text:
-        return ("Here are some FAQs:\n\n"
-                "1️⃣ Do you offer home loans? ✅ Yes, we have tie-ups with banks.\n"
-                "2️⃣ Can I visit properties before booking? ✅ Yes, you can book a visit.\n"
-                "3️⃣ Are there any hidden charges? ❌ No, all charges are transparent."), ["Show all properties", "Book a visit"]
-
-    elif "price" in user_text:
-        # Extract property ID/name from the question
-        import re
-        # Look for patterns like "P003", "P001", etc.
-        prop_id_match = re.search(r'P\d+', user_text.upper())
-        if prop_id_match:
-            prop_id = prop_id_match.group()
-            prop = find_property(df, prop_id)
-            if prop:
-                reply = (
-                    f"{prop['property_name']} — {int(prop['bedrooms']) if prop['bedrooms'] else 0} BHK "
-                    f"({int(prop['area_sqft'])} sqft) in {prop['city']}. Price: {int(prop['price']):,} {prop['price_currency']}. "
-                    f"Status: {prop['availability']}.\nShort: {prop['short_description']}\nContact: {prop['agent_email']}"
-                )
-                # Optional LLM polish
-                api_key = os.getenv("LLM_API_KEY")
-                if api_key:
-                    reply = polish_with_llm(reply, api_key)
-                return reply, ["Book a visit", "Show all properties"]
-        
-        # Try general property lookup if no specific ID found
-        prop = find_property(df, user_text)
-        if prop:
-            reply = (
-                f"{prop['property_name']} — {int(prop['bedrooms']) if prop['bedrooms'] else 0} BHK "
-                f"({int(prop['area_sqft'])} sqft) in {prop['city']}. Price: {int(prop['price']):,} {prop['price_currency']}. "
-                f"Status: {prop['availability']}.\nShort: {prop['short_description']}\nContact: {prop['agent_email']}"
-            )
-            # Optional LLM polish
-            api_key = os.getenv("LLM_API_KEY")
-            if api_key:
-                reply = polish_with_llm(reply, api_key)
-            return reply, ["Book a visit", "Show all properties"]
-        
-        # If no specific property found, show all prices
-        prices = "\n".join([
-            f"{row['property_name']}: {int(row['price']):,} {row['price_currency']}" for _, row in df.iterrows()
-        ])
-        return f"Here are the property prices:\n\n{prices}", []
+def _chat_state():
+    return {
+        "show_properties": st.session_state.get("show_properties", False),
+        "booking_flow": st.session_state.get("booking_flow"),
+    }
 
-    else:
-        # FAQ first
-        faq = get_faq_answer(user_text)
-        if faq:
-            return faq, ["Show all properties", "Book a visit"]
-        
-        # Try property lookup with better text cleaning
-        # First try exact match
-        prop = find_property(df, user_text)
-        if prop:
-            reply = (
-                f"{prop['property_name']} — {int(prop['bedrooms']) if prop['bedrooms'] else 0} BHK "
-                f"({int(prop['area_sqft'])} sqft) in {prop['city']}. Price: {int(prop['price']):,} {prop['price_currency']}. "
-                f"Status: {prop['availability']}.\nShort: {prop['short_description']}\nContact: {prop['agent_email']}"
-            )
-            # Optional LLM polish
-            api_key = os.getenv("LLM_API_KEY")
-            if api_key:
-                reply = polish_with_llm(reply, api_key)
-            return reply, ["Book a visit", "Show all properties"]
-        
-        # Try extracting property name from phrases like "Show details for Sunrise Apartments"
-        import re
-        # Remove common phrases and clean the text
-        cleaned_text = user_text.lower()
-        cleaned_text = re.sub(r'show details for|details for|information about|tell me about|what is|price of|property|apartment|villa|studio|office|house', '', cleaned_text)
-        cleaned_text = cleaned_text.strip()
-        
-        if cleaned_text:
-            prop = find_property(df, cleaned_text)
-            if prop:
-                reply = (
-                    f"{prop['property_name']} — {int(prop['bedrooms']) if prop['bedrooms'] else 0} BHK "
-                    f"({int(prop['area_sqft'])} sqft) in {prop['city']}. Price: {int(prop['price']):,} {prop['price_currency']}. "
-                    f"Status: {prop['availability']}.\nShort: {prop['short_description']}\nContact: {prop['agent_email']}"
-                )
-                # Optional LLM polish
-                api_key = os.getenv("LLM_API_KEY")
-                if api_key:
-                    reply = polish_with_llm(reply, api_key)
-                return reply, ["Book a visit", "Show all properties"]
-        
-        return "I didn't understand that. Please try again.", ["Show all properties", "Book a visit"]
+
+def _run_turn(user_text, df, quick_action=False, stream=True):
+    """Run one engine turn, storing its state and queueing any polish."""
+    turn = ENGINE.handle(_chat_state(), user_text, df, quick_action=quick_action, polish=not stream)
+    for key, value in turn.state.items():
+        st.session_state[key] = value
+    st.session_state.search_cards = list(turn.cards)
+    if turn.polish:
+        st.session_state.pending_polish = turn.reply
+    return turn.reply, turn.actions
+
+
+def _stream_reply(user_text, reply, df):
+    """Render the turn now and stream the polished reply into its bubble."""
+    pending = st.session_state.pop("pending_polish", None)
+    if not pending:
+        return reply
+    with st.chat_message("user"):
+        st.markdown(user_text)
+    with st.chat_message("assistant"):
+        placeholder = st.empty()
+        placeholder.markdown("…")
+        for partial in stream_polish_with_llm(pending, os.getenv("LLM_API_KEY"), dataset_version=dataset_version(df)):
+            placeholder.markdown(partial)
+            reply = partial
+    return reply
+
+
+def handle_message(user_text, df, stream=False):
+    """Process user input and return chatbot response with quick actions.
+
+    With stream=True property replies are left unpolished for _stream_reply.
+    """
+    return _run_turn(user_text, df, quick_action=True, stream=stream)
 
 # ---------------- Streamlit App ---------------- #
 def run_streamlit():
@@ -133,9 +85,9 @@ def run_streamlit():
     # Load property data
     df = load_properties()
 
-    # Session state for chat
-    if "messages" not in st.session_state:
-        st.session_state.messages = [("assistant", "Hello! 👋 How can I help you today?")]
+    # Session state for chat: the history keeps recent messages in memory and
+    # spills older ones to a per-session archive.
+    history = _chat_history()
     if "dynamic_buttons" not in st.session_state:
         st.session_state.dynamic_buttons = ["Show all properties", "Book a visit", "FAQs", "Check amenities"]
     if "show_properties" not in st.session_state:
@@ -151,12 +103,32 @@ def run_streamlit():
             "price": (0, 0),
             "sort_by": "Price (low→high)"
         }
+    if "grid_page_size" not in st.session_state:
+        st.session_state.grid_page_size = 12
+        st.session_state.grid_visible = 12
+        st.session_state.grid_key = None
 
-    # Display chat history
-    for role, msg in st.session_state.messages:
+    # Display the most recent window of the chat; "Show earlier" pages back.
+    if len(history) > st.session_state.history_visible:
+        hidden = len(history) - st.session_state.history_visible
+        if st.button(f"⬆️ Show earlier ({hidden} more)"):
+            st.session_state.history_visible += HISTORY_WINDOW
+            st.rerun()
+    for role, msg in history.window(st.session_state.history_visible):
         with st.chat_message(role):
             st.markdown(msg)
 
+    # Matches of the last search or filter query, as cards under the chat
+    search_cards = st.session_state.get("search_cards") or []
+    if search_cards:
+        card_cols = st.columns(min(len(search_cards), 3))
+        for i, card in enumerate(search_cards):
+            with card_cols[i % len(card_cols)].container(border=True):
+                st.image(thumbnail_path(str(card["listing_id"]), str(card["property_type"])), use_column_width=True)
+                st.markdown(f"**{card['property_name']}**")
+                st.caption(f"{card['property_type']} • {card['city']}")
+                st.write(card["short_description"])
+
     # Quick Reply Buttons
     st.markdown("### 🔍 Quick Actions")
     num_buttons = len(st.session_state.dynamic_buttons)
@@ -164,52 +136,21 @@ def run_streamlit():
         cols = st.columns(num_buttons)
         for i, btn in enumerate(st.session_state.dynamic_buttons):
             if cols[i].button(btn):
-                st.session_state.messages.append(("user", btn))
-                reply, dynamic_buttons = handle_message(btn, df)
-                st.session_state.messages.append(("assistant", reply))
+                history.append("user", btn)
+                reply, dynamic_buttons = handle_message(btn, df, stream=True)
+                reply = _stream_reply(btn, reply, df)
+                history.append("assistant", reply)
                 st.session_state.dynamic_buttons = dynamic_buttons
                 st.rerun()
     else:
         st.caption("No quick actions available.")
 
-    # Chat input for user (with booking flow state machine)
+    # Chat input for user (the engine runs the booking flow state machine)
     if user_text := st.chat_input("Type your question..."):
-        st.session_state.messages.append(("user", user_text))
-        # Booking flow handling
-        if st.session_state.booking_flow:
-            step = st.session_state.booking_flow.get("step")
-            buf = st.session_state.booking_flow.get("buffer", {})
-            if step == "ask_name":
-                buf["name"] = user_text.strip()
-                st.session_state.booking_flow = {"step": "ask_phone", "buffer": buf}
-                reply, dynamic_buttons = ("Thanks! Please share your phone number:", [])
-            elif step == "ask_phone":
-                buf["phone"] = user_text.strip()
-                st.session_state.booking_flow = {"step": "ask_property", "buffer": buf}
-                reply, dynamic_buttons = ("Which property? You can send listing id like P003 or name (optional, type 'skip').", [])
-            elif step == "ask_property":
-                listing_id = None
-                property_name = None
-                if user_text.strip().lower() != "skip":
-                    prop = find_property(df, user_text)
-                    if prop:
-                        listing_id = prop.get("listing_id")
-                        property_name = prop.get("property_name")
-                save_visit_booking(
-                    listing_id=listing_id,
-                    property_name=property_name,
-                    name=buf.get("name", ""),
-                    phone=buf.get("phone", ""),
-                    user_message=user_text,
-                )
-                st.session_state.booking_flow = None
-                reply, dynamic_buttons = ("✅ Booking captured. Our team will reach out shortly.", ["Show all properties"])
-            else:
-                st.session_state.booking_flow = None
-                reply, dynamic_buttons = handle_message(user_text, df)
-        else:
-            reply, dynamic_buttons = handle_message(user_text, df)
-        st.session_state.messages.append(("assistant", reply))
+        history.append("user", user_text)
+        reply, dynamic_buttons = _run_turn(user_text, df)
+        reply = _stream_reply(user_text, reply, df)
+        history.append("assistant", reply)
         st.session_state.dynamic_buttons = dynamic_buttons
         st.rerun()
 
@@ -227,28 +168,29 @@ def run_streamlit():
                 price_str = str(price)
             return f"{symbol}{price_str} {currency}".strip()
 
-        # Filters & Sorting
+        # Filters & Sorting (facets are precomputed once per dataset)
+        facets = get_facet_index(df)
         with st.expander("Filters & Sorting", expanded=True):
             # Search bar
             search_term = st.text_input("🔍 Search properties by name", placeholder="e.g., Sunrise, Marina, Villa...")
             
             left, right = st.columns(2)
             with left:
-                cities = ["All"] + sorted(df["city"].dropna().unique().tolist())
+                cities = ["All"] + facets.cities
                 selected_city = st.selectbox(
                     "City",
                     options=cities,
                     index=cities.index(st.session_state.filters.get("city", "All"))
                 )
-                types = ["All"] + sorted(df["property_type"].dropna().unique().tolist())
+                types = ["All"] + facets.types
                 selected_type = st.selectbox(
                     "Type",
                     options=types,
                     index=types.index(st.session_state.filters.get("type", "All"))
                 )
             with right:
-                min_price = int(df["price"].min())
-                max_price = int(df["price"].max())
+                min_price = facets.min_price
+                max_price = facets.max_price
                 current_min, current_max = st.session_state.filters.get("price", (min_price, max_price))
                 if current_min == 0 and current_max == 0:
                     current_min, current_max = min_price, max_price
@@ -259,12 +201,7 @@ def run_streamlit():
                     value=(current_min, current_max),
                     step=5000
                 )
-                sort_options = [
-                    "Price (low→high)",
-                    "Price (high→low)",
-                    "Area (high→low)",
-                    "Bedrooms (high→low)"
-                ]
+                sort_options = list(SORT_OPTIONS)
                 selected_sort = st.selectbox(
                     "Sort by",
                     options=sort_options,
@@ -288,47 +225,35 @@ def run_streamlit():
                 "sort_by": selected_sort,
             }
 
-        properties = df.copy()
-        # Apply search filter
-        if search_term:
-            properties = properties[properties["property_name"].str.contains(search_term, case=False, na=False)]
-        
-        # Apply other filters
-        city_filter = st.session_state.filters["city"]
-        type_filter = st.session_state.filters["type"]
-        price_min, price_max = st.session_state.filters["price"]
-        if city_filter != "All":
-            properties = properties[properties["city"] == city_filter]
-        if type_filter != "All":
-            properties = properties[properties["property_type"] == type_filter]
-        properties = properties[(properties["price"] >= price_min) & (properties["price"] <= price_max)]
-
-        # Sorting
-        sort_by = st.session_state.filters["sort_by"]
-        if sort_by == "Price (low→high)":
-            properties = properties.sort_values(by=["price", "property_name"], ascending=[True, True])
-        elif sort_by == "Price (high→low)":
-            properties = properties.sort_values(by=["price", "property_name"], ascending=[False, True])
-        elif sort_by == "Area (high→low)":
-            properties = properties.sort_values(by=["area_sqft", "property_name"], ascending=[False, True])
-        elif sort_by == "Bedrooms (high→low)":
-            properties = properties.sort_values(by=["bedrooms", "property_name"], ascending=[False, True])
+        positions = facets.filter(
+            city=st.session_state.filters["city"],
+            property_type=st.session_state.filters["type"],
+            price=st.session_state.filters["price"],
+            sort_by=st.session_state.filters["sort_by"],
+            search=search_term,
+        )
+
+        # Only the first `grid_visible` matches are rendered; "Load more"
+        # extends the window. A new filter selection starts from one page.
+        grid_key = (tuple(st.session_state.filters.values()), search_term)
+        if st.session_state.grid_key != grid_key:
+            st.session_state.grid_key = grid_key
+            st.session_state.grid_visible = st.session_state.grid_page_size
+        visible = df.iloc[positions[:st.session_state.grid_visible]]
+        st.caption(f"Showing {len(visible)} of {len(positions)} properties")
+
         cards_per_row = 3
-        rows = (len(properties) + cards_per_row - 1) // cards_per_row
+        rows = (len(visible) + cards_per_row - 1) // cards_per_row
         idx = 0
         for _ in range(rows):
             col_objs = st.columns(cards_per_row)
             for col in col_objs:
-                if idx >= len(properties):
+                if idx >= len(visible):
                     break
-                row = properties.iloc[idx]
+                row = visible.iloc[idx]
                 with col.container(border=True):
-                    # Image placeholder using seeded picsum for variety per listing
-                    try:
-                        seed = int(str(row['listing_id']).strip('P').lstrip('0') or 1)
-                    except Exception:
-                        seed = 1
-                    st.image(f"https://picsum.photos/seed/{seed}/600/360", use_container_width=True)
+                    # Pre-sized thumbnail generated locally and cached per listing
+                    st.image(thumbnail_path(str(row['listing_id']), str(row['property_type'])), use_column_width=True)
                     st.markdown(f"**{row['property_name']}**")
                     st.caption(f"{row['property_type']} • {row['city']}")
                     specs = []
@@ -348,6 +273,23 @@ def run_streamlit():
                         st.toast(f"Selected {row['property_name']} for booking", icon="✅")
                 idx += 1
 
+        left, right = st.columns(2)
+        with left:
+            if len(visible) < len(positions) and st.button("⬇️ Load more"):
+                st.session_state.grid_visible += st.session_state.grid_page_size
+                st.rerun()
+        with right:
+            page_sizes = [6, 12, 24, 48]
+            page_size = st.selectbox(
+                "Cards per page",
+                options=page_sizes,
+                index=page_sizes.index(st.session_state.grid_page_size),
+            )
+            if page_size != st.session_state.grid_page_size:
+                st.session_state.grid_page_size = page_size
+                st.session_state.grid_visible = page_size
+                st.rerun()
+
     # ---------------- Booking Form ---------------- #
     st.markdown("---")
     st.subheader("📅 Book a Property Visit")
@@ -363,7 +305,8 @@ def run_streamlit():
 
         if submitted:
             if name and property_name and date:
-                save_booking(name, property_name, date)
+                listing_id = df.loc[df["property_name"] == property_name, "listing_id"].iloc[0]
+                save_booking(name, property_name, date, listing_id=listing_id)
                 st.success(f"✅ Booking confirmed for **{name}** at **{property_name}** on **{date}**")
             else:
                 st.error("⚠️ Please fill all fields.")
@@ -372,9 +315,41 @@ def run_streamlit():
     st.markdown("---")
     st.subheader("📋 View All Bookings")
 
-    bookings_df = load_bookings()
-    if not bookings_df.empty:
-        st.dataframe(bookings_df)
+    # Served a page at a time from the indexed booking store, which picks up
+    # new rows from visits.csv incrementally.
+    store = get_booking_store()
+    if "bookings_page" not in st.session_state:
+        st.session_state.bookings_page = 1
+    left, middle, right = st.columns(3)
+    with left:
+        booked_listing = st.selectbox("Listing", options=["All"] + store.listings())
+    with middle:
+        booked_phone = st.text_input("Phone")
+    with right:
+        booking_page_size = st.selectbox("Rows per page", options=[25, 50, 100], index=1)
+    page = store.query(
+        listing_id=None if booked_listing == "All" else booked_listing,
+        phone=booked_phone.strip() or None,
+        page=st.session_state.bookings_page,
+        page_size=booking_page_size,
+    )
+    st.session_state.bookings_page = page.page
+    if page.total:
+        st.dataframe(page.rows, hide_index=True)
+        prev_col, caption_col, next_col = st.columns([1, 3, 1])
+        with prev_col:
+            if page.page > 1 and st.button("◀ Newer"):
+                st.session_state.bookings_page -= 1
+                st.rerun()
+        with caption_col:
+            st.caption(f"Page {page.page} of {page.pages} • {page.total} bookings")
+        with next_col:
+            if page.page < page.pages and st.button("Older ▶"):
+                st.session_state.bookings_page += 1
+                st.rerun()
+        with st.expander("Bookings per property per day"):
+            daily = store.daily_counts(listing_id=None if booked_listing == "All" else booked_listing)
+            st.dataframe(daily.tail(200), hide_index=True)
     else:
         st.write("No bookings yet.")
 
@@ -0,0 +1,316 @@
+"""Sparse BM25 search over property descriptions, types, cities and addresses.
+
+    python src/bm25.py [data/properties.csv]   # build the index offline
+
+The index is a term -> (row, weight) CSR matrix holding the full BM25 weight
+of every (term, row) pair, so scoring a query is a sparse product: gather the
+posting rows of its terms and sum them per listing with ``np.bincount``. It is
+saved next to the CSV (``properties.bm25.npz``) for the dataset version it was
+built from, so processes load it instead of re-tokenizing the catalog. The
+term frequencies and row lengths are kept too, so a hot reload re-tokenizes
+only the changed rows and re-weights the rest (``BM25Index.updated``).
+"""
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from search import SearchHit
+
+FIELDS = ("short_description", "property_type", "city", "address")
+# Bump when tokenization or weighting changes so saved indexes are rebuilt.
+FORMAT_VERSION = 2
+STOPWORDS = frozenset([
+    "a", "an", "the", "and", "or", "of", "in", "at", "on", "to", "for", "with", "by", "is", "are", "me", "i", "my",
+    "we", "want", "need", "looking", "find", "search", "show", "any", "some", "something", "please", "property",
+    "properties", "listing", "listings", "that", "has", "have", "st", "rd",
+])
+
+_WORD_RE = r"[a-z0-9]+"
+
+
+def index_path(csv_path: str) -> str:
+    """Saved index written next to the CSV, e.g. properties.bm25.npz."""
+    return os.path.splitext(csv_path)[0] + ".bm25.npz"
+
+
+def query_terms(text: str) -> List[str]:
+    """Distinct non-stopword terms of ``text``, as they are indexed."""
+    words = re.findall(_WORD_RE, (text or "").lower())
+    return list(dict.fromkeys(w for w in words if w not in STOPWORDS))
+
+
+class Postings(NamedTuple):
+    """Tokenized rows as (term, row) pairs in CSR order, before weighting."""
+    vocabulary: List[str]
+    terms: np.ndarray
+    rows: np.ndarray
+    tf: np.ndarray
+    lengths: np.ndarray
+
+
+class CollectionStats(NamedTuple):
+    """The corpus-wide numbers BM25 weights depend on."""
+    size: int
+    total_length: float
+    doc_freq: Dict[str, int]
+
+
+def tokenize_rows(df: pd.DataFrame, fields: Sequence[str] = FIELDS) -> Postings:
+    """Term frequencies of every (term, row) pair of ``df``.
+
+    Each distinct field value is tokenized once (types, cities and stock
+    descriptions repeat across many listings); expanding those tokens to
+    rows and counting is done with NumPy.
+    """
+    size = len(df)
+    term_ids: Dict[str, int] = {}
+    row_parts, term_parts = [], []
+    for field in fields:
+        if field not in df.columns:
+            continue
+        values = df[field]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, uniques = pd.factorize(values.to_numpy())
+        tokens = [[term_ids.setdefault(t, len(term_ids)) for t in query_terms(str(u))] for u in uniques]
+        # Missing values (code -1) take the trailing empty token list.
+        tokens.append([])
+        lengths = np.fromiter(map(len, tokens), dtype=np.int64, count=len(tokens))
+        flat = np.fromiter(itertools.chain.from_iterable(tokens), dtype=np.int64, count=int(lengths.sum()))
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        row_lengths = lengths[codes]
+        offsets = np.repeat(starts[codes] - np.cumsum(row_lengths) + row_lengths, row_lengths)
+        row_parts.append(np.repeat(np.arange(size, dtype=np.int64), row_lengths))
+        term_parts.append(flat[offsets + np.arange(len(offsets))])
+    rows = np.concatenate(row_parts) if row_parts else np.empty(0, dtype=np.int64)
+    terms = np.concatenate(term_parts) if term_parts else np.empty(0, dtype=np.int64)
+
+    # Sorting (term, row) keys both counts term frequencies and lays the
+    # pairs out in CSR order.
+    keys = np.sort(terms * max(size, 1) + rows)
+    first = np.concatenate([[True], keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, dtype=bool)
+    starts = np.flatnonzero(first)
+    tf = np.diff(np.append(starts, len(keys))).astype(np.float64)
+    pair_terms, pair_rows = np.divmod(keys[starts], max(size, 1))
+    lengths = np.bincount(rows, minlength=size).astype(np.float64)
+    return Postings(list(term_ids), pair_terms, pair_rows, tf, lengths)
+
+
+def collection_stats(postings: Postings) -> CollectionStats:
+    doc_freq = np.bincount(postings.terms, minlength=len(postings.vocabulary))
+    return CollectionStats(len(postings.lengths), float(postings.lengths.sum()),
+                           dict(zip(postings.vocabulary, doc_freq.tolist())))
+
+
+def merge_stats(parts: Sequence[CollectionStats]) -> CollectionStats:
+    """Stats of the union of disjoint row sets, e.g. shards of one catalog."""
+    doc_freq: Dict[str, int] = {}
+    for part in parts:
+        for term, count in part.doc_freq.items():
+            doc_freq[term] = doc_freq.get(term, 0) + count
+    return CollectionStats(sum(p.size for p in parts), sum(p.total_length for p in parts), doc_freq)
+
+
+class BM25Index:
+    """Okapi BM25 (``k1``, ``b``) over the concatenated ``fields`` of each row.
+
+    Rows of term t are ``_rows[_ptr[t]:_ptr[t + 1]]`` (ascending) with their
+    BM25 weights in ``_weights`` and term frequencies in ``_tf``; a query
+    sums the weights of its terms. ``_lengths`` holds each row's token count.
+    """
+
+    def __init__(self, vocabulary: Sequence[str], ptr: np.ndarray, rows: np.ndarray, weights: np.ndarray,
+                 size: int, meta: Optional[Dict] = None, tf: Optional[np.ndarray] = None,
+                 lengths: Optional[np.ndarray] = None):
+        self.vocabulary = list(vocabulary)
+        self._term_ids = {term: i for i, term in enumerate(self.vocabulary)}
+        self._ptr = ptr
+        self._rows = rows
+        self._weights = weights
+        self._tf = tf
+        self._lengths = lengths
+        self.size = size
+        self.meta = meta or {}
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, fields: Sequence[str] = FIELDS, k1: float = 1.2, b: float = 0.75,
+              stats: Optional[CollectionStats] = None) -> "BM25Index":
+        """Index ``df``. ``stats`` weights terms by a larger collection that
+        ``df`` is part of (scores are then comparable across its parts)."""
+        return cls.from_postings(tokenize_rows(df, fields), fields, k1, b, stats)
+
+    @classmethod
+    def from_postings(cls, postings: Postings, fields: Sequence[str] = FIELDS, k1: float = 1.2, b: float = 0.75,
+                      stats: Optional[CollectionStats] = None) -> "BM25Index":
+        vocabulary, pair_terms, pair_rows, tf, lengths = postings
+        local_freq = np.bincount(pair_terms, minlength=len(vocabulary))
+        if stats is None:
+            stats = CollectionStats(len(lengths), float(lengths.sum()), {})
+            doc_freq = local_freq
+        else:
+            doc_freq = np.array([stats.doc_freq.get(t, 0) for t in vocabulary], dtype=np.int64)
+        avg_length = stats.total_length / stats.size if stats.size and stats.total_length > 0 else 1.0
+        idf = np.log1p((stats.size - doc_freq + 0.5) / (doc_freq + 0.5))
+        norm = k1 * (1 - b + b * lengths[pair_rows] / avg_length)
+        weights = (idf[pair_terms] * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+        ptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(local_freq, out=ptr[1:])
+        meta = {"format": FORMAT_VERSION, "fields": list(fields), "k1": k1, "b": b}
+        return cls(vocabulary, ptr, pair_rows.astype(np.int32), weights, len(lengths), meta,
+                   tf.astype(np.uint16), lengths.astype(np.int32))
+
+    def updated(self, df: pd.DataFrame, delta) -> "BM25Index":
+        """Index for ``df``, a reload of this index's frame (see ``helpers.reload_frame``).
+
+        Only the re-parsed rows are tokenized. Surviving postings are moved to
+        their new rows and every weight is recomputed, since idf and the
+        average row length change with the catalog; the result matches
+        ``BM25Index.build(df)``. Indexes weighted by external stats (shards)
+        are rebuilt.
+        """
+        fields = self.meta.get("fields", list(FIELDS))
+        k1, b = self.meta.get("k1", 1.2), self.meta.get("b", 0.75)
+        m = delta.old_to_new
+        moved = m >= 0
+        if self._tf is None or self._lengths is None or np.any(np.diff(m[moved]) < 0):
+            return BM25Index.build(df, fields, k1, b)
+        # Surviving rows keep their order, so their postings stay in (term, row) order.
+        new_rows = m[self._rows]
+        keep = new_rows >= 0
+        old_terms = np.repeat(np.arange(len(self.vocabulary), dtype=np.int64), np.diff(self._ptr))[keep]
+        old_rows = new_rows[keep].astype(np.int64)
+        fresh = tokenize_rows(df.iloc[delta.fresh], fields)
+        term_ids = dict(self._term_ids)
+        fresh_ids = np.array([term_ids.setdefault(t, len(term_ids)) for t in fresh.vocabulary], dtype=np.int64)
+        fresh_terms, fresh_rows = fresh_ids[fresh.terms], delta.fresh[fresh.rows].astype(np.int64)
+        width = max(len(df), 1)
+        fresh_keys = fresh_terms * width + fresh_rows
+        order = np.argsort(fresh_keys)
+        at = np.searchsorted(old_terms * width + old_rows, fresh_keys[order])
+        lengths = np.zeros(len(df), dtype=np.float64)
+        lengths[m[moved]] = self._lengths[moved]
+        lengths[delta.fresh] = fresh.lengths
+        # Terms no row uses any more stay in the vocabulary with no postings.
+        postings = Postings(list(term_ids), np.insert(old_terms, at, fresh_terms[order]),
+                            np.insert(old_rows, at, fresh_rows[order]),
+                            np.insert(self._tf[keep].astype(np.float64), at, fresh.tf[order]), lengths)
+        return BM25Index.from_postings(postings, fields, k1, b)
+
+    def save(self, path: str, dataset_version: Optional[str]) -> None:
+        """Atomically write the index for ``dataset_version``; a read-only dir just skips it."""
+        meta = dict(self.meta, size=self.size, dataset_version=dataset_version)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        try:
+            np.savez(tmp_path, meta=np.array(json.dumps(meta)), vocabulary=np.array(self.vocabulary, dtype=str),
+                     ptr=self._ptr, rows=self._rows, weights=self._weights, tf=self._tf, lengths=self._lengths)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    @classmethod
+    def load(cls, path: str, dataset_version: Optional[str], size: int,
+             fields: Sequence[str] = FIELDS) -> Optional["BM25Index"]:
+        """The index saved at ``path`` if it was built for this dataset version, else None."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                if (meta.get("format") != FORMAT_VERSION or meta.get("dataset_version") != dataset_version
+                        or meta.get("size") != size or meta.get("fields") != list(fields)):
+                    return None
+                return cls(data["vocabulary"].tolist(), data["ptr"], data["rows"], data["weights"], size, meta,
+                           data["tf"], data["lengths"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def __len__(self) -> int:
+        return self.size
+
+    @metrics.timed("bm25_search")
+    def search(self, query: str, k: int = 5, allowed: Optional[np.ndarray] = None) -> List[SearchHit]:
+        """Top ``k`` rows for ``query`` by BM25 score, best first (ties keep catalog order).
+
+        ``allowed`` is an optional boolean row mask; rows outside it are never returned.
+        """
+        ids = [self._term_ids[t] for t in query_terms(query) if t in self._term_ids]
+        if not ids or k <= 0:
+            return []
+        spans = [(self._ptr[t], self._ptr[t + 1]) for t in ids]
+        rows = np.concatenate([self._rows[s:e] for s, e in spans])
+        weights = np.concatenate([self._weights[s:e] for s, e in spans]).astype(np.float64)
+        if allowed is not None:
+            keep = allowed[rows]
+            rows, weights = rows[keep], weights[keep]
+            if not len(rows):
+                return []
+        if len(rows) * 8 < self.size:
+            candidates, inverse = np.unique(rows, return_inverse=True)
+            scores = np.bincount(inverse, weights)
+        else:
+            scores = np.bincount(rows, weights, minlength=self.size)
+            # Halve a threshold from the best score until at least k rows
+            # clear it; the top k are then among those rows.
+            threshold = scores.max()
+            candidates = np.flatnonzero(scores >= threshold)
+            while len(candidates) < k and threshold > 1e-3:
+                threshold /= 2
+                candidates = np.flatnonzero(scores >= threshold)
+            if len(candidates) < k:
+                candidates = np.flatnonzero(scores > 0)
+            scores = scores[candidates]
+        return _top_k(candidates, scores, k)
+
+
+def _top_k(candidates: np.ndarray, scores: np.ndarray, k: int) -> List[SearchHit]:
+    """Best ``k`` of ``candidates`` (ascending positions), ties to the earlier position."""
+    if len(candidates) > k:
+        cutoff = np.partition(scores, len(scores) - k)[len(scores) - k]
+        above = np.flatnonzero(scores > cutoff)
+        tied = np.flatnonzero(scores == cutoff)[:k - len(above)]
+        keep = np.concatenate([above, tied])
+        candidates, scores = candidates[keep], scores[keep]
+    best = np.lexsort((candidates, -scores))[:k]
+    return [SearchHit(int(candidates[i]), float(scores[i])) for i in best]
+
+
+def get_bm25_index(df: pd.DataFrame) -> BM25Index:
+    """Return the BM25Index for ``df``: attached, saved on disk, or built (and saved) now."""
+    index: Optional[BM25Index] = getattr(df, "_bm25_index", None)
+    if index is not None:
+        return index
+    version = df.attrs.get("dataset_version")
+    source = df.attrs.get("source_path")
+    path = index_path(source) if source and version else None
+    if path is not None:
+        index = BM25Index.load(path, version, len(df))
+    if index is None:
+        with metrics.span("bm25.build"):
+            index = BM25Index.build(df)
+        if path is not None:
+            index.save(path, version)
+    object.__setattr__(df, "_bm25_index", index)
+    return index
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from helpers import PROPERTIES_FILE, load_properties
+
+    args = sys.argv[1:] if argv is None else argv
+    csv_path = os.path.abspath(args[0] if args else PROPERTIES_FILE)
+    index = get_bm25_index(load_properties(csv_path))
+    print(f"BM25 index: {len(index.vocabulary)} terms, {len(index._rows)} postings -> {index_path(csv_path)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""Indexed, queryable view of the bookings in visits.csv.
+
+visits.csv stays the durable append-only log that every booking path writes
+to. ``BookingStore`` mirrors it into SQLite (WAL) with one unified schema:
+
+* ``bookings``: one row per booking, indexed on timestamp, listing_id and phone.
+* ``booking_days``: bookings per property per day, updated from each batch
+  of new rows as it is imported, so totals and daily counts never scan the
+  history.
+* ``imports``: how many bytes of each CSV have been copied in.
+
+Each query first copies in whatever was appended to the CSV since the last
+one (under the CSV's write lock, in the same transaction that advances the
+byte offset), so existing data is imported exactly once and later bookings
+cost one small read. Legacy ``Name,Property Name,Date`` rows are mapped onto
+the unified schema on the way in.
+"""
+import csv
+import io
+import math
+import os
+import re
+import sqlite3
+import threading
+from operator import itemgetter
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+import metrics
+from helpers import BOOKINGS_FILE, FORM_BOOKING_MESSAGE, VISIT_COLUMNS, _file_lock
+
+BOOKINGS_DB = os.path.join(os.path.dirname(__file__), "..", "data", "visits.db")
+STORE_COLUMNS = VISIT_COLUMNS + ["visit_date"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bookings (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    listing_id TEXT NOT NULL DEFAULT '',
+    property_name TEXT NOT NULL DEFAULT '',
+    name TEXT NOT NULL DEFAULT '',
+    phone TEXT NOT NULL DEFAULT '',
+    user_message TEXT NOT NULL DEFAULT '',
+    visit_date TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS booking_days (
+    day TEXT NOT NULL,
+    listing_id TEXT NOT NULL,
+    property_name TEXT NOT NULL,
+    bookings INTEGER NOT NULL,
+    PRIMARY KEY (day, listing_id, property_name)
+);
+CREATE INDEX IF NOT EXISTS booking_days_listing ON booking_days (listing_id, day);
+CREATE TABLE IF NOT EXISTS imports (
+    source TEXT PRIMARY KEY,
+    header TEXT NOT NULL,
+    offset INTEGER NOT NULL
+);
+"""
+
+# Secondary indexes on bookings; dropped and rebuilt around a full import.
+_INDEXES = {
+    "bookings_timestamp": "bookings (timestamp)",
+    "bookings_listing": "bookings (listing_id, timestamp)",
+    "bookings_phone": "bookings (phone)",
+}
+
+# Columns of the old form bookings -> unified columns.
+LEGACY_COLUMNS = {"Name": "name", "Property Name": "property_name", "Date": "visit_date"}
+_FORM_DATE = re.compile(re.escape(FORM_BOOKING_MESSAGE).replace(re.escape("{date}"), r"(\S+)") + "$")
+
+IMPORTED_ROWS = metrics.counter("bookings_imported_total", "visits.csv rows copied into the booking store")
+
+
+class BookingPage(NamedTuple):
+    rows: pd.DataFrame
+    total: int
+    page: int
+    pages: int
+
+
+def _unifier(columns: List[str]):
+    """Function mapping a CSV record with header ``columns`` (either schema)
+    to a ``STORE_COLUMNS`` tuple."""
+    at = {col: i for i, col in enumerate(columns)}
+    width = len(columns)
+    legacy = {col: old for old, col in LEGACY_COLUMNS.items()}
+    # Each unified column comes from its own column, else the legacy one,
+    # else the empty string appended at position ``width``.
+    picks = [at.get(col, at.get(legacy.get(col), width)) for col in STORE_COLUMNS]
+    fallbacks = [(i, at[legacy[col]]) for i, col in enumerate(STORE_COLUMNS)
+                 if col in at and legacy.get(col) in at]
+    get = itemgetter(*picks)
+    timestamp, message, visit_date = (STORE_COLUMNS.index(c) for c in ("timestamp", "user_message", "visit_date"))
+
+    def unified(record: List[str]) -> Tuple[str, ...]:
+        if len(record) < width:
+            record += [""] * (width - len(record))
+        record.append("")
+        row = list(get(record))
+        for i, alt in fallbacks:
+            if not row[i]:
+                row[i] = record[alt]
+        if not row[visit_date]:
+            form = _FORM_DATE.match(row[message])
+            if form:
+                row[visit_date] = form.group(1)
+        if not row[timestamp]:
+            row[timestamp] = row[visit_date]
+        return tuple(row)
+
+    return unified
+
+
+class BookingStore:
+    """SQLite index over one visits.csv; see the module docstring."""
+
+    def __init__(self, path: Optional[str] = None, csv_path: Optional[str] = None):
+        self.path = path if path is not None else BOOKINGS_DB
+        self.csv_path = os.path.abspath(csv_path if csv_path is not None else BOOKINGS_FILE)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            self._create_indexes(conn)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ---------------- Import ---------------- #
+    def sync(self) -> int:
+        """Copy rows appended to the CSV since the last sync. Returns how many."""
+        try:
+            size = os.path.getsize(self.csv_path)
+        except FileNotFoundError:
+            return 0
+        conn = self._connect()
+        row = conn.execute("SELECT header, offset FROM imports WHERE source = ?", (self.csv_path,)).fetchone()
+        if row is not None and row[1] == size:
+            return 0
+        with _file_lock(self.csv_path):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                count = self._import(conn)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        IMPORTED_ROWS.inc(count)
+        return count
+
+    def _import(self, conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT header, offset FROM imports WHERE source = ?", (self.csv_path,)).fetchone()
+        with open(self.csv_path, "rb") as fh:
+            header_line = fh.readline()
+            header = header_line.decode("utf-8").strip()
+            end = fh.seek(0, io.SEEK_END)
+            full = not (row is not None and row[0] == header and len(header_line) <= row[1] <= end)
+            if full:
+                # New file, or rewritten with a different header: import it all again.
+                conn.execute("DELETE FROM bookings")
+                conn.execute("DELETE FROM booking_days")
+                for name in _INDEXES:
+                    conn.execute(f"DROP INDEX IF EXISTS {name}")
+            start = len(header_line) if full else row[1]
+            fh.seek(start)
+            data = fh.read(end - start)
+        if not header:
+            self._create_indexes(conn)
+            return 0
+        unified = _unifier(next(csv.reader([header])))
+        rows = [unified(record) for record in csv.reader(io.StringIO(data.decode("utf-8"), newline="")) if record]
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM bookings").fetchone()[0]
+        conn.executemany(
+            f"INSERT INTO bookings ({', '.join(STORE_COLUMNS)}) VALUES ({', '.join('?' * len(STORE_COLUMNS))})",
+            rows,
+        )
+        conn.execute(
+            "INSERT INTO booking_days (day, listing_id, property_name, bookings) "
+            "SELECT substr(timestamp, 1, 10), listing_id, property_name, COUNT(*) FROM bookings WHERE id > ? "
+            "GROUP BY 1, 2, 3 "
+            "ON CONFLICT (day, listing_id, property_name) DO UPDATE SET bookings = bookings + excluded.bookings",
+            (last_id,),
+        )
+        conn.execute(
+            "INSERT INTO imports (source, header, offset) VALUES (?, ?, ?) "
+            "ON CONFLICT(source) DO UPDATE SET header = excluded.header, offset = excluded.offset",
+            (self.csv_path, header, start + len(data)),
+        )
+        self._create_indexes(conn)
+        return len(rows)
+
+    @staticmethod
+    def _create_indexes(conn: sqlite3.Connection) -> None:
+        for name, target in _INDEXES.items():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+    # ---------------- Queries ---------------- #
+    @staticmethod
+    def _where(listing_id=None, phone=None, since=None, until=None) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        if listing_id:
+            clauses.append("listing_id = ?")
+            params.append(listing_id.upper())
+        if phone:
+            clauses.append("phone = ?")
+            params.append(phone)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(str(since))
+        if until:
+            # Dates are inclusive: "2024-05-01" covers the whole day.
+            clauses.append("timestamp < ?")
+            params.append(str(until) + "\uffff")
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    @staticmethod
+    def _day_where(listing_id=None, since=None, until=None) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        if listing_id:
+            clauses.append("listing_id = ?")
+            params.append(listing_id.upper())
+        if since:
+            clauses.append("day >= ?")
+            params.append(str(since)[:10])
+        if until:
+            clauses.append("day <= ?")
+            params.append(str(until)[:10])
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def count(self, listing_id: Optional[str] = None, phone: Optional[str] = None,
+              since: Optional[str] = None, until: Optional[str] = None) -> int:
+        """Number of bookings matching the filters.
+
+        Without a phone filter and with whole-day bounds this sums the daily
+        aggregates instead of counting booking rows.
+        """
+        self.sync()
+        if phone or any(bound and len(str(bound)) != 10 for bound in (since, until)):
+            where, params = self._where(listing_id, phone, since, until)
+            return self._connect().execute(f"SELECT COUNT(*) FROM bookings{where}", params).fetchone()[0]
+        where, params = self._day_where(listing_id, since, until)
+        total = self._connect().execute(f"SELECT SUM(bookings) FROM booking_days{where}", params).fetchone()[0]
+        return int(total or 0)
+
+    @metrics.timed("bookings.query")
+    def query(
+        self,
+        listing_id: Optional[str] = None,
+        phone: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        page: int = 1,
+        page_size: int = 50,
+    ) -> BookingPage:
+        """One page of matching bookings, newest first."""
+        total = self.count(listing_id, phone, since, until)
+        pages = max(1, math.ceil(total / page_size))
+        page = min(max(1, page), pages)
+        where, params = self._where(listing_id, phone, since, until)
+        rows = pd.read_sql_query(
+            f"SELECT {', '.join(STORE_COLUMNS)} FROM bookings{where} "
+            "ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?",
+            self._connect(),
+            params=params + [page_size, (page - 1) * page_size],
+        )
+        return BookingPage(rows, total, page, pages)
+
+    def daily_counts(self, listing_id: Optional[str] = None, since: Optional[str] = None,
+                     until: Optional[str] = None) -> pd.DataFrame:
+        """Bookings per property per day (``day, listing_id, property_name, bookings``)."""
+        self.sync()
+        where, params = self._day_where(listing_id, since, until)
+        return pd.read_sql_query(
+            f"SELECT day, listing_id, property_name, bookings FROM booking_days{where} "
+            "ORDER BY day, listing_id, property_name",
+            self._connect(),
+            params=params,
+        )
+
+    def listings(self) -> List[str]:
+        """Listing ids that have bookings."""
+        self.sync()
+        rows = self._connect().execute(
+            "SELECT DISTINCT listing_id FROM booking_days WHERE listing_id != '' ORDER BY listing_id"
+        ).fetchall()
+        return [r[0] for r in rows]
+
+
+_STORES: Dict[Tuple[str, str], BookingStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_booking_store(csv_path: Optional[str] = None, path: Optional[str] = None) -> BookingStore:
+    """Return the process-wide BookingStore for ``csv_path``, opening it on first use.
+
+    Without ``path`` the database sits next to the CSV (``visits.csv`` ->
+    ``visits.db``).
+    """
+    csv_path = os.path.abspath(csv_path if csv_path is not None else BOOKINGS_FILE)
+    if path is None:
+        path = os.path.splitext(csv_path)[0] + ".db"
+    key = (csv_path, os.path.abspath(path))
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            store = _STORES[key] = BookingStore(path, csv_path)
+        return store
@@ -0,0 +1,554 @@
+"""Headless chat engine: (session state, message) -> (reply, actions, new state).
+
+Nothing here touches Streamlit, so the same engine serves the Streamlit UI,
+the asyncio HTTP API in ``server.py`` and tests. Session state is a plain
+JSON-serialisable dict persisted by a ``SessionStore``.
+
+With ``fast_startup`` the engine answers greetings, FAQs, id/name lookups
+and bookings without loading the properties frame: lookups read the
+pandas-free compact catalog (``lookup.py``), and the frame (with pandas) is
+loaded only by the first message that needs it.
+
+With a ``catalog`` (a started ``shards.ShardedCatalog``) lookups, filters
+and searches are answered by the shard processes; only the full price and
+amenities lists still load the frame.
+"""
+from __future__ import annotations
+
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import metrics
+from helpers import (
+    FAQS,
+    PropertyIndex,
+    ResponseCache,
+    dataset_version,
+    find_property,
+    get_property_index,
+    load_properties,
+    polish_with_llm,
+    save_visit_booking,
+)
+from intents import IntentRouter, Route
+from lazy import lazy_import
+from lookup import load_compact_catalog
+
+pd = lazy_import("pandas")
+
+ROUTER = IntentRouter()
+# Minimum fuzzy-search score for a property to be offered as a quick action.
+SUGGEST_SCORE = 0.3
+# Answer lookups from the compact catalog instead of loading the frame first.
+FAST_STARTUP = os.getenv("FAST_STARTUP", "0") == "1"
+# Listings returned as cards for a free-text search.
+SEARCH_RESULTS = 5
+CARD_FIELDS = ["listing_id", "property_name", "property_type", "city", "bedrooms", "price", "price_currency",
+               "short_description"]
+
+WELCOME = "Hello! 👋 How can I help you today?"
+WELCOME_ACTIONS = ["Show all properties", "Book a visit", "FAQs", "Check amenities"]
+DETAIL_ACTIONS = ["Book a visit", "Show all properties"]
+HELP_ACTIONS = ["Show all properties", "Book a visit"]
+NO_SEARCH_MATCHES = "I couldn't find properties matching that. Try words like pool, metro or a city."
+FAQ_REPLY = (
+    "Here are some FAQs:\n\n"
+    "1️⃣ Do you offer home loans? ✅ Yes, we have tie-ups with banks.\n"
+    "2️⃣ Can I visit properties before booking? ✅ Yes, you can book a visit.\n"
+    "3️⃣ Are there any hidden charges? ❌ No, all charges are transparent."
+)
+
+# Rendered replies of the stateless intents, keyed on (intent, entity, dataset version).
+REPLY_CACHE = ResponseCache(max_entries=int(os.getenv("REPLY_CACHE_SIZE", "1024")), ttl=None)
+_reply_cache_version = None
+metrics.register_cache("reply", REPLY_CACHE)
+
+MESSAGES = metrics.counter("chat_messages_total", "Chat messages handled, by intent")
+MESSAGE_SECONDS = metrics.histogram("chat_message_seconds", "ChatEngine.handle latency, by intent")
+
+
+def new_state() -> Dict[str, Any]:
+    """State of a fresh chat session."""
+    return {"show_properties": False, "booking_flow": None}
+
+
+class Turn(NamedTuple):
+    reply: str
+    actions: List[str]
+    state: Dict[str, Any]
+    # True when ``reply`` is an unpolished property detail the client may
+    # polish (or stream) itself; only set when the engine does not polish.
+    polish: bool = False
+    # Matching listings (``CARD_FIELDS``, plus ``score`` for text searches) for clients to render as cards.
+    cards: Tuple[Dict[str, Any], ...] = ()
+
+
+def cached_reply(intent, entity, df, build):
+    """Memoize build() per (intent, entity) for the frame's dataset version.
+
+    The cache is emptied when a new dataset version shows up; frames without
+    a version (not from load_properties) are never cached.
+    """
+    global _reply_cache_version
+    version = dataset_version(df)
+    if version is None:
+        return build()
+    if version != _reply_cache_version:
+        REPLY_CACHE.clear()
+        _reply_cache_version = version
+    key = (intent, entity, version)
+    value = REPLY_CACHE.get(key)
+    if value is None:
+        value = build()
+        REPLY_CACHE.put(key, value)
+    return value
+
+
+def format_property_reply(prop):
+    """Single-property detail reply."""
+    return (
+        f"{prop['property_name']} — {int(prop['bedrooms']) if prop['bedrooms'] else 0} BHK "
+        f"({int(prop['area_sqft'])} sqft) in {prop['city']}. Price: {int(prop['price']):,} {prop['price_currency']}. "
+        f"Status: {prop['availability']}.\nShort: {prop['short_description']}\nContact: {prop['agent_email']}"
+    )
+
+
+def _amenities_list(df):
+    return ("🏠 " + df["property_name"].astype(str) + ": " + df["short_description"].astype(str)).str.cat(sep="\n")
+
+
+def _price_list(df):
+    prices = df["price"].astype("int64").map("{:,}".format)
+    return (df["property_name"].astype(str) + ": " + prices + " " + df["price_currency"].astype(str)).str.cat(sep="\n")
+
+
+def _cards(df, positions, scores=None):
+    """``CARD_FIELDS`` records of the rows at ``positions``, with ``score`` when given."""
+    matches = df.iloc[list(positions)][[c for c in CARD_FIELDS if c in df.columns]]
+    return _record_cards(matches.to_dict("records"), scores)
+
+
+def _record_cards(records, scores=None):
+    """``CARD_FIELDS`` of property ``records``, with ``score`` when given."""
+    cards = [{c: record[c] for c in CARD_FIELDS if c in record} for record in records]
+    if scores is None:
+        return tuple(cards)
+    return tuple(dict(card, score=round(score, 3)) for card, score in zip(cards, scores))
+
+
+def _card_lines(cards):
+    lines = []
+    for i, card in enumerate(cards, 1):
+        price = "price on request" if pd.isna(card["price"]) else f"{int(card['price']):,} {card['price_currency']}"
+        lines.append(f"{i}. {card['property_name']} — {card['property_type']} in {card['city']}, {price}\n"
+                     f"   {card['short_description']}")
+    return "\n".join(lines)
+
+
+def _search_reply(route, df):
+    """(reply, actions, cards) for a free-text search over descriptions.
+
+    Filters named in the message ("villa with a pool in Dubai under 2m")
+    restrict the ranking to the rows they match.
+    """
+    from bm25 import get_bm25_index
+    from facets import get_facet_index
+    from query import allowed_rows, parse_query
+
+    constraints = parse_query(route.entity, get_facet_index(df))
+    allowed = allowed_rows(df, constraints) if constraints.active else None
+    hits = get_bm25_index(df).search(route.entity, k=SEARCH_RESULTS, allowed=allowed)
+    if not hits:
+        if constraints.active:
+            return _filter_reply(constraints, df)
+        return NO_SEARCH_MATCHES, HELP_ACTIONS, ()
+    return _matches_reply(_cards(df, [h.position for h in hits], [h.score for h in hits]))
+
+
+def _sharded_search_reply(route, catalog):
+    """``_search_reply`` answered by a ``ShardedCatalog``."""
+    from query import parse_query
+
+    constraints = parse_query(route.entity, catalog.facets())
+    plan = constraints.plan() if constraints.active else None
+    hits = catalog.search(route.entity, k=SEARCH_RESULTS, plan=plan)
+    if not hits:
+        if constraints.active:
+            return _sharded_filter_reply(constraints, catalog)
+        return NO_SEARCH_MATCHES, HELP_ACTIONS, ()
+    return _matches_reply(_record_cards([h.record for h in hits], [h.score for h in hits]))
+
+
+def _matches_reply(cards):
+    reply = "Here are the best matches:\n\n" + _card_lines(cards)
+    return reply, [card["property_name"] for card in cards], cards
+
+
+def _filter_reply(constraints, df):
+    """(reply, actions, cards): the first ``SEARCH_RESULTS`` rows matching
+    ``constraints`` in their sort order, and how many match in all."""
+    from query import run_query
+
+    positions = run_query(df, constraints)
+    return _filtered_reply(constraints, len(positions), _cards(df, positions[:SEARCH_RESULTS]))
+
+
+def _sharded_filter_reply(constraints, catalog):
+    """``_filter_reply`` answered by a ``ShardedCatalog``."""
+    total, records = catalog.filter(**constraints.plan(), limit=SEARCH_RESULTS)
+    return _filtered_reply(constraints, total, _record_cards(records))
+
+
+def _filtered_reply(constraints, total, cards):
+    wanted = constraints.describe()
+    if not total:
+        return f"No properties match your filters ({wanted}). Try a wider price range or another city.", HELP_ACTIONS, ()
+    noun = "property matches" if total == 1 else "properties match"
+    reply = f"{total} {noun} your filters ({wanted}):\n\n" + _card_lines(cards)
+    actions = [card["property_name"] for card in cards]
+    if total > len(cards):
+        reply += f"\n\n…and {total - len(cards)} more in the property list."
+        actions.append("Show all properties")
+    return reply, actions, cards
+
+
+def _detail_reply(route, index):
+    """Detail reply for the first of ``route.lookups`` naming a property, or None.
+
+    A search ("P003 with parking", "find marina studio") is only answered
+    by an exact listing id or name, so "villa with pool" still searches.
+    """
+    for query in route.lookups:
+        prop = index.find_exact(query) if route.intent == "search" else _find(index, query)
+        if prop:
+            return format_property_reply(prop)
+    return None
+
+
+def _lookup_reply(route, df, text):
+    """(reply, actions, is_detail, cards) for a price/unrecognised message
+    that names no listing id or property."""
+    from facets import get_facet_index
+    from query import parse_query
+    from search import get_trigram_index, is_confident
+
+    # Filters named in the message ("2 BHK in Dubai under 300k") answer it,
+    # unless the words left over clearly name a property ("marina studios").
+    constraints = parse_query(text, get_facet_index(df))
+    entity = constraints.rest if constraints.active else route.entity
+
+    # Typo-tolerant fallback: answer a clear winner, otherwise offer choices.
+    if entity:
+        hits = get_trigram_index(df).search(entity, k=3)
+        if is_confident(hits):
+            prop = df.iloc[hits[0].position].to_dict()
+            return format_property_reply(prop), DETAIL_ACTIONS, True, ()
+        suggestions = list(dict.fromkeys(
+            df.iloc[h.position]["property_name"] for h in hits if h.score >= SUGGEST_SCORE
+        ))
+        if suggestions and not constraints.active:
+            return "Did you mean one of these properties?", suggestions, False, ()
+
+    if constraints.active:
+        reply, actions, cards = _filter_reply(constraints, df)
+        return reply, actions, False, cards
+
+    if route.intent == "price":
+        # If no specific property found, show all prices
+        prices = cached_reply("prices", "", df, lambda: _price_list(df))
+        return f"Here are the property prices:\n\n{prices}", [], False, ()
+
+    return "I didn't understand that. Please try again.", HELP_ACTIONS, False, ()
+
+
+def _sharded_lookup_reply(route, catalog, text):
+    """``_lookup_reply`` answered by a ``ShardedCatalog``; None where it
+    would list every price, which needs the frame."""
+    from query import parse_query
+    from search import is_confident
+
+    constraints = parse_query(text, catalog.facets())
+    entity = constraints.rest if constraints.active else route.entity
+    if entity:
+        hits = catalog.fuzzy_search(entity, k=3)
+        if is_confident(hits):
+            return format_property_reply(hits[0].record), DETAIL_ACTIONS, True, ()
+        suggestions = list(dict.fromkeys(h.record["property_name"] for h in hits if h.score >= SUGGEST_SCORE))
+        if suggestions and not constraints.active:
+            return "Did you mean one of these properties?", suggestions, False, ()
+    if constraints.active:
+        reply, actions, cards = _sharded_filter_reply(constraints, catalog)
+        return reply, actions, False, cards
+    if route.intent == "price":
+        return None
+    return "I didn't understand that. Please try again.", HELP_ACTIONS, False, ()
+
+
+def _source(index):
+    """What a lookup index answers from, for the reply cache and dataset version."""
+    return index.df if isinstance(index, PropertyIndex) else index
+
+
+def _find(index, query):
+    """``find_property`` on a ``PropertyIndex`` or a ``ShardedCatalog``."""
+    return find_property(index, query) if isinstance(index, PropertyIndex) else index.find(query)
+
+
+class ChatEngine:
+    """Stateless request handler around the loaded properties.
+
+    ``handle`` never mutates the state it is given. With ``polish=True`` the
+    engine runs the optional LLM polish itself (when ``LLM_API_KEY`` is set);
+    otherwise detail replies come back raw with ``Turn.polish`` set.
+    ``catalog`` is an optional started ``ShardedCatalog`` for the same CSV;
+    turns given an explicit frame still use that frame.
+    """
+
+    def __init__(self, properties_path: Optional[str] = None, bookings_path: Optional[str] = None, polish: bool = True,
+                 fast_startup: Optional[bool] = None, catalog=None):
+        self.properties_path = properties_path
+        self.bookings_path = bookings_path
+        self.polish = polish
+        self.fast_startup = FAST_STARTUP if fast_startup is None else fast_startup
+        self.catalog = catalog
+
+    def properties(self) -> pd.DataFrame:
+        return load_properties(self.properties_path)
+
+    def _frame(self, df: Optional[pd.DataFrame]) -> pd.DataFrame:
+        return df if df is not None else self.properties()
+
+    def _lookup_index(self, df: Optional[pd.DataFrame]):
+        """Index for id/name lookups: the sharded catalog, or the compact
+        catalog's in fast-startup mode (unless a frame is given), else the frame's."""
+        if df is None and self.catalog is not None:
+            return self.catalog
+        if df is None and self.fast_startup:
+            catalog = load_compact_catalog(self.properties_path)
+            if catalog is not None:
+                return catalog.index
+        return get_property_index(self._frame(df))
+
+    def handle(self, state: Optional[Dict[str, Any]], message: str, df: Optional[pd.DataFrame] = None,
+               quick_action: bool = False, polish: Optional[bool] = None) -> Turn:
+        """Answer ``message`` for a session in ``state``.
+
+        Quick-action buttons (``quick_action=True``) bypass an open booking
+        flow, as they always have in the UI. ``polish`` overrides the
+        engine's polish setting for this turn.
+        """
+        if not metrics.is_enabled():
+            with metrics.profile("chat"):
+                return self._handle(state, message, df, quick_action, polish)[0]
+        start = time.perf_counter()
+        with metrics.profile("chat"):
+            turn, intent = self._handle(state, message, df, quick_action, polish)
+        MESSAGES.inc(intent=intent)
+        MESSAGE_SECONDS.observe(time.perf_counter() - start, intent=intent)
+        return turn
+
+    def _handle(self, state, message, df, quick_action, polish):
+        state = copy.deepcopy(state) if state else new_state()
+        polish = self.polish if polish is None else polish
+        if state.get("booking_flow") and not quick_action:
+            return self._booking_step(state, message, df, polish), "booking_flow"
+        route = ROUTER.route(message.lower())
+        return self.respond(state, message, df, polish, route), route.intent
+
+    def respond(self, state: Dict[str, Any], message: str, df: Optional[pd.DataFrame] = None, polish: bool = True,
+                route: Optional[Route] = None) -> Turn:
+        user_text = message.lower()
+        route = route or ROUTER.route(user_text)
+        intent = route.intent
+
+        if intent == "greeting":
+            return Turn(WELCOME, list(WELCOME_ACTIONS), state)
+
+        elif intent == "show_properties":
+            # Signal UI to render the property grid instead of long text
+            state["show_properties"] = True
+            return Turn("Here are the available properties:", ["Book a visit", "Check amenities"], state)
+
+        elif intent == "book":
+            state["booking_flow"] = {"step": "ask_name", "buffer": {}}
+            return Turn("Sure! Let's schedule a visit. Please share your full name:", [], state)
+
+        elif intent == "search":
+            index = self._lookup_index(df)
+            source = _source(index)
+            reply = cached_reply("detail", user_text, source, lambda: _detail_reply(route, index))
+            if reply is not None:
+                return self._detail_turn(state, reply, source, polish)
+            if index is self.catalog:
+                reply, actions, cards = cached_reply(
+                    intent, user_text, source, lambda: _sharded_search_reply(route, self.catalog))
+                return Turn(reply, list(actions), state, cards=cards)
+            df = self._frame(df)
+            reply, actions, cards = cached_reply(intent, user_text, df, lambda: _search_reply(route, df))
+            return Turn(reply, list(actions), state, cards=cards)
+
+        elif intent == "amenities":
+            state["show_properties"] = False
+            df = self._frame(df)
+            amenities = cached_reply("amenities", "", df, lambda: _amenities_list(df))
+            return Turn(f"Here are the amenities for each property:\n\n{amenities}", [], state)
+
+        elif intent == "faq":
+            return Turn(FAQ_REPLY, list(HELP_ACTIONS), state)
+
+        elif intent == "faq_office":
+            return Turn(FAQS["office"], list(HELP_ACTIONS), state)
+
+        elif intent == "faq_hours":
+            return Turn(FAQS["hours"], list(HELP_ACTIONS), state)
+
+        # "price" and unrecognised messages: listing id or property name lookup
+        index = self._lookup_index(df)
+        source = _source(index)
+        reply = cached_reply("detail", user_text, source, lambda: _detail_reply(route, index))
+        if reply is None and index is self.catalog:
+            answer = cached_reply(intent, user_text, source, lambda: _sharded_lookup_reply(route, index, user_text))
+            if answer is not None:
+                reply, actions, is_detail, cards = answer
+                if not is_detail:
+                    return Turn(reply, list(actions), state, cards=cards)
+        if reply is None:
+            source = df = self._frame(df)
+            reply, actions, is_detail, cards = cached_reply(
+                intent, user_text, df, lambda: _lookup_reply(route, df, user_text))
+            if not is_detail:
+                return Turn(reply, list(actions), state, cards=cards)
+        return self._detail_turn(state, reply, source, polish)
+
+    def _detail_turn(self, state: Dict[str, Any], reply: str, source, polish: bool) -> Turn:
+        """Turn for a single-property detail reply, polished here or by the client."""
+        api_key = os.getenv("LLM_API_KEY")
+        if api_key and polish:
+            polished = polish_with_llm(reply, api_key, dataset_version=dataset_version(source))
+            return Turn(polished, list(DETAIL_ACTIONS), state)
+        return Turn(reply, list(DETAIL_ACTIONS), state, polish=bool(api_key))
+
+    def _booking_step(self, state: Dict[str, Any], message: str, df: Optional[pd.DataFrame], polish: bool) -> Turn:
+        flow = state["booking_flow"]
+        step = flow.get("step")
+        buf = flow.get("buffer", {})
+        if step == "ask_name":
+            buf["name"] = message.strip()
+            state["booking_flow"] = {"step": "ask_phone", "buffer": buf}
+            return Turn("Thanks! Please share your phone number:", [], state)
+        elif step == "ask_phone":
+            buf["phone"] = message.strip()
+            state["booking_flow"] = {"step": "ask_property", "buffer": buf}
+            return Turn("Which property? You can send listing id like P003 or name (optional, type 'skip').", [], state)
+        elif step == "ask_property":
+            listing_id = None
+            property_name = None
+            if message.strip().lower() != "skip":
+                prop = _find(self._lookup_index(df), message)
+                if prop:
+                    listing_id = prop.get("listing_id")
+                    property_name = prop.get("property_name")
+            save_visit_booking(
+                listing_id=listing_id,
+                property_name=property_name,
+                name=buf.get("name", ""),
+                phone=buf.get("phone", ""),
+                user_message=message,
+                out_path=self.bookings_path,
+            )
+            state["booking_flow"] = None
+            return Turn("✅ Booking captured. Our team will reach out shortly.", ["Show all properties"], state)
+        else:
+            state["booking_flow"] = None
+            return self.respond(state, message, df, polish)
+
+
+# ---------------- Session stores ---------------- #
+class SessionStore:
+    """Where chat session state lives between requests."""
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def put(self, session_id: str, state: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+
+class MemorySessionStore(SessionStore):
+    """Per-process store; the least recently used sessions beyond
+    ``max_sessions`` are dropped."""
+
+    def __init__(self, max_sessions: int = 100_000):
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is not None:
+                self._sessions.move_to_end(session_id)
+            return copy.deepcopy(state)
+
+    def put(self, session_id, state):
+        with self._lock:
+            self._sessions[session_id] = copy.deepcopy(state)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions as JSON rows in SQLite (WAL), shareable by worker processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id):
+        row = self._connect().execute("SELECT state FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, session_id, state):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO sessions (session_id, state, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+                (session_id, json.dumps(state), time.time()),
+            )
+
+    def delete(self, session_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
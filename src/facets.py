@@ -0,0 +1,206 @@
+"""Precomputed facets and sort orders for the property grid filters."""
+import bisect
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from helpers import get_property_index
+
+# Sort option -> (columns, ascending), as offered in the Filters & Sorting panel.
+SORT_OPTIONS: Dict[str, Tuple[List[str], List[bool]]] = {
+    "Price (low→high)": (["price", "property_name"], [True, True]),
+    "Price (high→low)": (["price", "property_name"], [False, True]),
+    "Area (high→low)": (["area_sqft", "property_name"], [False, True]),
+    "Bedrooms (high→low)": (["bedrooms", "property_name"], [False, True]),
+}
+
+
+def _category_bitmaps(values: pd.Series) -> Dict[str, np.ndarray]:
+    """One boolean mask per distinct non-null value, compared on category codes."""
+    categorical = values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype("category")
+    codes = categorical.cat.codes.to_numpy()
+    present = np.bincount(codes[codes >= 0], minlength=len(categorical.cat.categories))
+    return {value: codes == i for i, value in enumerate(categorical.cat.categories) if present[i]}
+
+
+def range_bitmap(values: np.ndarray, low: float, high: float) -> np.ndarray:
+    """Rows with ``low <= value <= high``; missing values never match."""
+    return (values >= low) & (values <= high)
+
+
+def _sort_key(df: pd.DataFrame, columns: List[str], ascending: List[bool]):
+    """Key function of a row position that orders rows like a stable
+    ``sort_values(columns, ascending)`` (NaN last), or None if a descending
+    column isn't numeric."""
+    arrays = [df[c].to_numpy() for c in columns]
+    for values, asc in zip(arrays, ascending):
+        if not asc and not np.issubdtype(values.dtype, np.number):
+            return None
+
+    def key(pos):
+        parts = []
+        for values, asc in zip(arrays, ascending):
+            value = values[pos]
+            parts.append((1, 0) if pd.isna(value) else (0, value if asc else -value))
+        return (*parts, pos)
+
+    return key
+
+
+class FacetIndex:
+    """Filter structures built once per loaded dataset.
+
+    Holds a row bitmap per city, property type and availability, row
+    positions sorted by price for ``searchsorted`` range cuts, bedroom and
+    area columns for range masks, and one precomputed permutation per sort
+    option. ``filter`` intersects bitmaps and slices the chosen
+    permutation instead of masking and re-sorting the frame.
+    """
+
+    def __init__(self, df: pd.DataFrame, cache_size: int = 64):
+        self._build_facets(df, cache_size)
+        ordered = df.reset_index(drop=True)
+        self.permutations = {
+            name: ordered.sort_values(by=columns, ascending=ascending, kind="stable").index.to_numpy()
+            for name, (columns, ascending) in SORT_OPTIONS.items()
+        }
+        self._build_price_order()
+
+    def _build_facets(self, df: pd.DataFrame, cache_size: int) -> None:
+        self.df = df
+        self.size = len(df)
+        self.city_bitmaps = _category_bitmaps(df["city"])
+        self.type_bitmaps = _category_bitmaps(df["property_type"])
+        self.availability_bitmaps = _category_bitmaps(df["availability"])
+        self.cities = sorted(self.city_bitmaps)
+        self.types = sorted(self.type_bitmaps)
+        self.availabilities = sorted(self.availability_bitmaps)
+        self._bedrooms = df["bedrooms"].to_numpy(dtype=float, na_value=np.nan)
+        self._area = df["area_sqft"].to_numpy(dtype=float, na_value=np.nan)
+        # An empty frame (or one without prices) gets a 0..0 price range.
+        prices = df["price"].dropna()
+        self.min_price = int(prices.min()) if len(prices) else 0
+        self.max_price = int(prices.max()) if len(prices) else 0
+        self._cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._cache_size = cache_size
+        # Sessions and server threads share one index and its cache.
+        self._cache_lock = threading.Lock()
+
+    def _build_price_order(self) -> None:
+        # Priced rows in price order, cut with searchsorted by price_bitmap.
+        prices = self.df["price"].to_numpy(dtype=float)
+        by_price = self.permutations["Price (low→high)"]
+        self._price_order = by_price[~np.isnan(prices[by_price])]
+        self._sorted_prices = prices[self._price_order]
+
+    def updated(self, df: pd.DataFrame, delta) -> "FacetIndex":
+        """Index for ``df``, a reload of this index's frame (see ``helpers.reload_frame``).
+
+        Bitmaps are recomputed with NumPy; each sort permutation keeps its
+        surviving rows in order and has the re-parsed rows inserted by binary
+        search, matching a fresh stable sort. A reordered file is re-sorted.
+        """
+        m = delta.old_to_new
+        kept = np.flatnonzero(m >= 0)
+        if np.any(np.diff(m[kept]) < 0):
+            return FacetIndex(df, self._cache_size)
+        index = FacetIndex.__new__(FacetIndex)
+        index._build_facets(df, self._cache_size)
+        index.permutations = {}
+        for name, (columns, ascending) in SORT_OPTIONS.items():
+            key = _sort_key(df, columns, ascending)
+            survivors = m[self.permutations[name]]
+            survivors = survivors[survivors >= 0]
+            if key is None:
+                index.permutations[name] = df.reset_index(drop=True).sort_values(
+                    by=columns, ascending=ascending, kind="stable").index.to_numpy()
+                continue
+            fresh = sorted(delta.fresh.tolist(), key=key)
+            at = [bisect.bisect_left(survivors, key(pos), key=key) for pos in fresh]
+            index.permutations[name] = np.insert(survivors, at, fresh).astype(survivors.dtype)
+        index._build_price_order()
+        return index
+
+    def price_bitmap(self, low: float, high: float) -> np.ndarray:
+        """Rows with ``low <= price <= high``."""
+        lo = np.searchsorted(self._sorted_prices, low, side="left")
+        hi = np.searchsorted(self._sorted_prices, high, side="right")
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self._price_order[lo:hi]] = True
+        return mask
+
+    def search_bitmap(self, term: str) -> np.ndarray:
+        """Rows whose name contains ``term``, via the PropertyIndex."""
+        mask = np.zeros(self.size, dtype=bool)
+        mask[get_property_index(self.df).positions_containing(term)] = True
+        return mask
+
+    @metrics.timed("facets.filter")
+    def filter(
+        self,
+        city: str = "All",
+        property_type: str = "All",
+        price: Optional[Tuple[float, float]] = None,
+        sort_by: str = "Price (low→high)",
+        search: str = "",
+        bedrooms: Optional[Tuple[float, float]] = None,
+        area: Optional[Tuple[float, float]] = None,
+        availability: str = "All",
+    ) -> np.ndarray:
+        """Row positions matching the filters, in ``sort_by`` order.
+
+        ``bedrooms`` and ``area`` are inclusive ranges like ``price``; the
+        chat's structured queries (``query.py``) use them on top of the
+        grid's filters.
+        """
+        key = (city, property_type, tuple(price) if price else None, sort_by, search,
+               tuple(bedrooms) if bedrooms else None, tuple(area) if area else None, availability)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+        metrics.cache_lookup("facets", cached is not None)
+        if cached is not None:
+            return cached
+
+        masks = []
+        if search:
+            masks.append(self.search_bitmap(search))
+        if city != "All":
+            masks.append(self.city_bitmaps.get(city, np.zeros(self.size, dtype=bool)))
+        if property_type != "All":
+            masks.append(self.type_bitmaps.get(property_type, np.zeros(self.size, dtype=bool)))
+        if price is not None:
+            masks.append(self.price_bitmap(*price))
+        if bedrooms is not None:
+            masks.append(range_bitmap(self._bedrooms, *bedrooms))
+        if area is not None:
+            masks.append(range_bitmap(self._area, *area))
+        if availability != "All":
+            masks.append(self.availability_bitmaps.get(availability, np.zeros(self.size, dtype=bool)))
+
+        permutation = self.permutations[sort_by]
+        if masks:
+            mask = np.logical_and.reduce(masks) if len(masks) > 1 else masks[0]
+            result = permutation[mask[permutation]]
+        else:
+            result = permutation
+        with self._cache_lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+
+def get_facet_index(df: pd.DataFrame) -> FacetIndex:
+    """Return the FacetIndex for ``df``, building it on first use."""
+    index = getattr(df, "_facet_index", None)
+    if index is None:
+        index = FacetIndex(df)
+        object.__setattr__(df, "_facet_index", index)
+    return index
@@ -1,36 +1,760 @@
-import pandas as pd
+from __future__ import annotations
+
 import os
+import bisect
+import csv
+import io
+import itertools
+import heapq
+import pickle
+import queue
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional, Dict, Any
-import requests
+from functools import lru_cache
+from typing import Optional, Dict, Any, Iterable, Iterator, List, NamedTuple, Tuple
 import json
+import logging
+
+from lazy import lazy_import
+
+# Imported on first use: the FAQ, compact-catalog lookup and booking paths
+# never need them, and requests only matters when LLM_API_KEY is set.
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+requests = lazy_import("requests")
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 # File paths
 PROPERTIES_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "properties.csv")
 BOOKINGS_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "visits.csv")
 
 
-def load_properties(path: Optional[str] = None) -> pd.DataFrame:
-    """Load properties data from CSV. If path is provided, load from there."""
-    csv_path = path if path is not None else PROPERTIES_FILE
-    if os.path.exists(csv_path):
-        return pd.read_csv(csv_path)
-    else:
+# Typed schema applied when the properties CSV is loaded. Low-cardinality text
+# columns become categories, counts become narrow ints (kept as floats if a
+# value is missing or not a whole number), free text stays object.
+CATEGORY_COLUMNS = ["city", "property_type", "availability", "price_currency", "agent_email"]
+INTEGER_COLUMNS = {"id": "int32", "area_sqft": "int32", "bedrooms": "int8", "bathrooms": "int8", "price": "int64"}
+TEXT_COLUMNS = ["listing_id", "property_name", "address", "short_description"]
+# Columns looked up case-insensitively, and how their keys are normalized.
+LOOKUP_COLUMNS = {"listing_id": "upper", "property_name": "lower"}
+PROPERTIES_CHUNK_ROWS = int(os.getenv("PROPERTIES_CHUNK_ROWS", "100000"))
+# Bump when the schema changes so stale snapshots are rebuilt.
+SCHEMA_VERSION = 2
+
+# Process-wide cache shared by every Streamlit session:
+# abspath -> (stat key, frame, dataset version)
+_PROPERTIES_CACHE: Dict[str, Tuple[Tuple[int, int], pd.DataFrame, str]] = {}
+_PROPERTIES_LOCK = threading.Lock()
+
+
+def _stat_key(path: str) -> Tuple[int, int]:
+    stat_result = os.stat(path)
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+
+def snapshot_path(csv_path: str) -> str:
+    """Binary snapshot written next to the CSV, e.g. properties.snapshot.pkl."""
+    return os.path.splitext(csv_path)[0] + ".snapshot.pkl"
+
+
+def _read_snapshot(path: str, source_key: Tuple[int, int]) -> Optional[pd.DataFrame]:
+    try:
+        with open(path, "rb") as fh:
+            snapshot = pickle.load(fh)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("source") != source_key:
+        return None
+    if snapshot.get("schema") != SCHEMA_VERSION:
+        return None
+    df = snapshot.get("frame")
+    if df is not None and snapshot.get("lookup_keys") is not None:
+        object.__setattr__(df, "_lookup_keys", snapshot["lookup_keys"])
+    if df is not None and "line_fingerprints" in snapshot:
+        object.__setattr__(df, "_line_fingerprints", snapshot["line_fingerprints"])
+    return df
+
+
+def _write_snapshot(path: str, source_key: Tuple[int, int], df: pd.DataFrame) -> None:
+    """Atomically write the snapshot; a read-only data dir just skips it.
+
+    The frame's line fingerprints are stored too when it has them, so a
+    cold start from the snapshot doesn't re-read the CSV to hash it.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    snapshot = {"source": source_key, "schema": SCHEMA_VERSION, "frame": df, "lookup_keys": lookup_keys(df)}
+    if hasattr(df, "_line_fingerprints"):
+        snapshot["line_fingerprints"] = df._line_fingerprints
+    try:
+        with open(tmp_path, "wb") as fh:
+            pickle.dump(snapshot, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def _write_compact(csv_path: str, source_key: Tuple[int, int], df: pd.DataFrame) -> None:
+    """Refresh the pandas-free lookup snapshot (``lookup.py``) if it is stale."""
+    from lookup import write_compact_catalog  # lookup builds on this module
+
+    write_compact_catalog(csv_path, source_key, df)
+
+
+def _write_snapshots(csv_path: str, source_key: Tuple[int, int], df: pd.DataFrame) -> None:
+    _write_snapshot(snapshot_path(csv_path), source_key, df)
+    _write_compact(csv_path, source_key, df)
+    index = getattr(df, "_bm25_index", None)
+    if index is not None:
+        # Patched on reload; save it so other processes don't rebuild it.
+        from bm25 import index_path
+
+        index.save(index_path(csv_path), source_version(source_key))
+
+
+def source_version(source_key: Tuple[int, int]) -> str:
+    """Dataset version token of a CSV with stat key ``(mtime_ns, size)``."""
+    return f"{source_key[0]:x}-{source_key[1]:x}"
+
+
+def _normalized_keys(values: pd.Series, how: str) -> np.ndarray:
+    """Upper/lower-cased copies of the string values; None for anything else."""
+    if values.dtype != object:
+        return np.full(len(values), None, dtype=object)
+    keys = values.str.upper() if how == "upper" else values.str.lower()
+    return keys.astype(object).where(keys.notna(), None).to_numpy()
+
+
+def lookup_keys(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Pre-normalized ``LOOKUP_COLUMNS`` of ``df``, computed once per frame."""
+    keys = getattr(df, "_lookup_keys", None)
+    if keys is None:
+        keys = {col: _normalized_keys(df[col], how) for col, how in LOOKUP_COLUMNS.items() if col in df.columns}
+        object.__setattr__(df, "_lookup_keys", keys)
+    return keys
+
+
+def _narrow_int(values: pd.Series, dtype: str) -> pd.Series:
+    """``values`` as ``dtype`` when every value is a whole number that fits."""
+    if values.dtype == dtype:
+        return values
+    numbers = values.to_numpy(dtype=float)
+    info = np.iinfo(dtype)
+    if (
+        len(numbers)
+        and np.isfinite(numbers).all()
+        and (numbers == np.round(numbers)).all()
+        and numbers.min() >= info.min
+        and numbers.max() <= info.max
+    ):
+        return values.astype(dtype)
+    return values
+
+
+def normalize_properties(chunk: pd.DataFrame, errors: Optional[Dict[str, int]] = None) -> pd.DataFrame:
+    """Validate and convert one batch of raw CSV rows to the typed schema.
+
+    Unparseable numbers become NaN and are counted per column in ``errors``.
+    """
+    for col, dtype in INTEGER_COLUMNS.items():
+        if col not in chunk.columns:
+            continue
+        raw = chunk[col]
+        numbers = pd.to_numeric(raw, errors="coerce")
+        if errors is not None:
+            bad = int((numbers.isna() & raw.notna()).sum())
+            if bad:
+                errors[col] = errors.get(col, 0) + bad
+        chunk[col] = _narrow_int(numbers, dtype)
+    for col in CATEGORY_COLUMNS:
+        if col in chunk.columns:
+            chunk[col] = chunk[col].astype("category")
+    return chunk
+
+
+def _read_dtypes() -> Dict[str, Any]:
+    dtypes: Dict[str, Any] = {col: object for col in TEXT_COLUMNS}
+    dtypes.update({col: "category" for col in CATEGORY_COLUMNS})
+    return dtypes
+
+
+def iter_property_chunks(path: str, chunksize: int = PROPERTIES_CHUNK_ROWS, errors: Optional[Dict[str, int]] = None):
+    """Yield typed batches of at most ``chunksize`` rows from a properties CSV."""
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype=_read_dtypes()):
+        yield normalize_properties(chunk, errors)
+
+
+def concat_property_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """One typed frame from typed batches: categories are unified across
+    batches and integer columns narrowed once every batch has been seen."""
+    categories = {
+        col: sorted(set().union(*(c[col].cat.categories for c in chunks)), key=str)
+        for col in CATEGORY_COLUMNS
+        if col in chunks[0].columns
+    }
+    for chunk in chunks:
+        for col, cats in categories.items():
+            chunk[col] = chunk[col].cat.set_categories(cats)
+    df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+    for col, dtype in INTEGER_COLUMNS.items():
+        if col in df.columns:
+            df[col] = _narrow_int(df[col], dtype)
+    return df
+
+
+def read_properties(path: str, chunksize: int = PROPERTIES_CHUNK_ROWS) -> pd.DataFrame:
+    """Stream a properties CSV into one typed frame in bounded memory.
+
+    Only one raw batch is held at a time (see ``concat_property_chunks``).
+    Counts of coerced values are kept in ``df.attrs["schema_errors"]``.
+    """
+    errors: Dict[str, int] = {}
+    chunks: List[pd.DataFrame] = []
+    keys: Dict[str, List[np.ndarray]] = {}
+    for chunk in iter_property_chunks(path, chunksize, errors):
+        for col, how in LOOKUP_COLUMNS.items():
+            if col in chunk.columns:
+                keys.setdefault(col, []).append(_normalized_keys(chunk[col], how))
+        chunks.append(chunk)
+    df = concat_property_chunks(chunks)
+    del chunks
+    df.attrs["schema_errors"] = errors
+    object.__setattr__(df, "_lookup_keys", {col: np.concatenate(parts) for col, parts in keys.items()})
+    return df
+
+
+# ---------------- Incremental reload ---------------- #
+# With hot reload on, every loaded frame remembers a hash per CSV line. When
+# the CSV changes, only lines whose hash is new are parsed; the new frame is
+# assembled in file order from the old rows and the re-parsed ones, and the
+# indexes attached to the old frame are patched (copy-on-write) for it.
+HOT_RELOAD = os.getenv("PROPERTIES_HOT_RELOAD", "1") == "1"
+# Attributes of lazily built per-frame indexes; each has ``updated(df, delta)``.
+DERIVED_INDEXES = ("_property_index", "_trigram_index", "_facet_index", "_bm25_index")
+RELOADS = metrics.counter("properties_reloads_total", "properties.csv reloads, by kind")
+RELOAD_FAILURES = metrics.counter("properties_reload_failures_total", "Background properties.csv reloads that failed")
+
+
+class FrameDelta(NamedTuple):
+    """How a reloaded frame relates to the frame it replaced."""
+
+    old_to_new: np.ndarray  # new position of each old row; -1 if its line changed or went away
+    fresh: np.ndarray  # ascending new positions of re-parsed (changed or added) rows
+    added: List[str]  # listing ids
+    changed: List[str]
+    removed: List[str]
+
+
+LINE_BLOCK_BYTES = 1 << 24
+
+
+def _line_blocks(path: str):
+    """Yield the header, then lists of non-empty data lines, reading in blocks.
+
+    Splitting and filtering stay in C, so fingerprinting a large file costs
+    little more than reading it.
+    """
+    with open(path, "rb") as fh:
+        yield fh.readline().rstrip(b"\r\n")
+        tail = b""
+        while True:
+            block = fh.read(LINE_BLOCK_BYTES)
+            if not block:
+                break
+            lines = (tail + block).split(b"\n")
+            tail = lines.pop()
+            yield list(filter(None, lines))
+        if tail:
+            yield [tail]
+
+
+def _stable_hashes(lines: List[bytes]) -> np.ndarray:
+    """64-bit hash per line (CRC-32 and Adler-32 side by side), the same in every process."""
+    crc = np.fromiter(map(zlib.crc32, lines), dtype=np.uint64, count=len(lines))
+    adler = np.fromiter(map(zlib.adler32, lines), dtype=np.uint64, count=len(lines))
+    return ((crc << np.uint64(32)) | adler).view(np.int64)
+
+
+def _line_hashes(path: str) -> Tuple[bytes, np.ndarray]:
+    """Header and one hash per non-empty data line of a CSV."""
+    blocks = _line_blocks(path)
+    header = next(blocks)
+    hashes = [_stable_hashes(lines) for lines in blocks]
+    return header, np.concatenate(hashes) if hashes else np.empty(0, dtype=np.int64)
+
+
+def _select_lines(path: str, wanted: np.ndarray) -> List[bytes]:
+    """The data lines at the ascending ordinals ``wanted``."""
+    blocks = _line_blocks(path)
+    next(blocks)
+    selected, offset = [], 0
+    for lines in blocks:
+        lo, hi = np.searchsorted(wanted, [offset, offset + len(lines)])
+        selected.extend(lines[i - offset] for i in wanted[lo:hi].tolist())
+        offset += len(lines)
+    return selected
+
+
+def line_fingerprints(path: str, rows: int) -> Optional[Tuple[bytes, np.ndarray]]:
+    """Header and per-line hashes of ``path``, or None if lines aren't rows.
+
+    Hashes don't depend on the process, so they are kept in the snapshot
+    with the frame they describe. A quoted field that spans lines makes the
+    line count differ from ``rows``.
+    """
+    header, hashes = _line_hashes(path)
+    if len(hashes) != rows or not pd.Index(hashes).is_unique:
+        return None  # multi-line records or duplicate lines: reload in full
+    return header, hashes
+
+
+def _fresh_rows(header: bytes, lines: List[bytes]) -> Optional[pd.DataFrame]:
+    if any(line.count(b'"') % 2 for line in lines):
+        return None  # a quoted field spanning lines
+    buffer = io.BytesIO(header + b"\n" + b"\n".join(lines) + b"\n")
+    errors: Dict[str, int] = {}
+    fresh = normalize_properties(pd.read_csv(buffer, dtype=_read_dtypes()), errors)
+    fresh.attrs["schema_errors"] = errors
+    return fresh if len(fresh) == len(lines) else None
+
+
+def reload_frame(csv_path: str, old: pd.DataFrame) -> Optional[Tuple[pd.DataFrame, FrameDelta]]:
+    """Build the frame for the changed ``csv_path`` from ``old`` and the changed lines.
+
+    Returns None when an incremental reload isn't possible (no fingerprints,
+    changed header, duplicate or multi-line records); the caller then parses
+    the whole file. ``old`` and its indexes are left untouched.
+    """
+    fingerprints = getattr(old, "_line_fingerprints", None)
+    if fingerprints is None:
+        return None
+    old_header, old_hashes = fingerprints
+    header, new_hashes = _line_hashes(csv_path)
+    new_index = pd.Index(new_hashes)
+    if header != old_header or not len(new_hashes) or not new_index.is_unique:
+        return None
+
+    # Match unchanged lines: old position -> new position.
+    old_to_new = new_index.get_indexer(old_hashes).astype(np.int64)
+    found = old_to_new >= 0
+    is_kept = np.zeros(len(new_hashes), bool)
+    is_kept[old_to_new[found]] = True
+    fresh = np.flatnonzero(~is_kept)
+
+    fresh_lines = _select_lines(csv_path, fresh)
+    if len(fresh_lines) != len(fresh):
+        return None  # file changed while reading
+    fresh_df = _fresh_rows(header, fresh_lines) if len(fresh) else old.iloc[:0]
+    if fresh_df is None:
+        return None
+
+    # Assemble in file order: old rows for kept lines, parsed rows otherwise.
+    categories = {
+        col: sorted(set(old[col].cat.categories) | set(fresh_df[col].cat.categories), key=str)
+        for col in CATEGORY_COLUMNS
+        if col in old.columns and isinstance(old[col].dtype, pd.CategoricalDtype) and col in fresh_df.columns
+    }
+    parts = [old, fresh_df.reset_index(drop=True)]
+    for i, part in enumerate(parts):
+        if categories:
+            part = part.copy(deep=False)
+            for col, cats in categories.items():
+                part[col] = part[col].cat.set_categories(cats)
+            parts[i] = part
+    gather = np.empty(len(new_hashes), dtype=np.int64)
+    gather[old_to_new[found]] = np.flatnonzero(found)
+    gather[fresh] = len(old) + np.arange(len(fresh))
+    df = pd.concat(parts, ignore_index=True).take(gather).reset_index(drop=True)
+    for col in categories:
+        df[col] = df[col].cat.remove_unused_categories()
+    for col, dtype in INTEGER_COLUMNS.items():
+        if col in df.columns:
+            df[col] = _narrow_int(df[col], dtype)
+    old_keys, fresh_keys = lookup_keys(old), lookup_keys(fresh_df)
+    object.__setattr__(df, "_lookup_keys", {
+        col: np.concatenate([old_keys[col], fresh_keys[col]])[gather] for col in old_keys if col in fresh_keys
+    })
+    object.__setattr__(df, "_line_fingerprints", (header, new_hashes))
+    df.attrs["schema_errors"] = fresh_df.attrs.get("schema_errors", {})
+
+    fresh_ids = set(fresh_df["listing_id"].dropna()) if "listing_id" in fresh_df.columns else set()
+    gone_ids = set(old["listing_id"].iloc[np.flatnonzero(~found)].dropna()) if "listing_id" in old.columns else set()
+    delta = FrameDelta(
+        old_to_new=old_to_new,
+        fresh=fresh,
+        added=sorted(fresh_ids - gone_ids),
+        changed=sorted(fresh_ids & gone_ids),
+        removed=sorted(gone_ids - fresh_ids),
+    )
+    for attr in DERIVED_INDEXES:
+        index = getattr(old, attr, None)
+        if index is not None:
+            object.__setattr__(df, attr, index.updated(df, delta))
+    return df, delta
+
+
+@metrics.timed("load_properties")
+def load_properties_versioned(path: Optional[str] = None) -> Tuple[pd.DataFrame, str]:
+    """Load properties and return ``(frame, dataset_version)``.
+
+    Frames are cached per process keyed on the CSV's path, mtime and size, so
+    repeated calls do no parsing. On a cache miss the pickled snapshot next to
+    the CSV is used when it was built from the same CSV; otherwise the CSV is
+    parsed and the snapshot rewritten. The returned frame is shared and must be
+    treated as read-only.
+    """
+    csv_path = os.path.abspath(path if path is not None else PROPERTIES_FILE)
+    try:
+        source_key = _stat_key(csv_path)
+    except FileNotFoundError:
         raise FileNotFoundError(f"{csv_path} not found.")
 
+    cached = _PROPERTIES_CACHE.get(csv_path)
+    if cached is not None and cached[0] == source_key:
+        return cached[1], cached[2]
+
+    with _PROPERTIES_LOCK:
+        cached = _PROPERTIES_CACHE.get(csv_path)
+        if cached is not None and cached[0] == source_key:
+            return cached[1], cached[2]
+        snap_path = snapshot_path(csv_path)
+        df = None
+        if cached is not None and HOT_RELOAD:
+            with metrics.span("load_properties.incremental"):
+                reloaded = reload_frame(csv_path, cached[1])
+            if reloaded is not None:
+                df = reloaded[0]
+                RELOADS.inc(kind="incremental")
+                # Keep the snapshots current without holding up the reload.
+                threading.Thread(target=_write_snapshots, args=(csv_path, source_key, df), daemon=True).start()
+        if df is None:
+            df = _read_snapshot(snap_path, source_key)
+            if df is None:
+                with metrics.span("load_properties.parse_csv"):
+                    df = read_properties(csv_path)
+                if HOT_RELOAD:
+                    fingerprints = line_fingerprints(csv_path, len(df))
+                    # Hashes of a file that changed while being parsed don't describe this frame.
+                    if _stat_key(csv_path) != source_key:
+                        fingerprints = None
+                    object.__setattr__(df, "_line_fingerprints", fingerprints)
+                _write_snapshot(snap_path, source_key, df)
+            elif HOT_RELOAD and not hasattr(df, "_line_fingerprints"):
+                # A snapshot written with hot reload off: hash the lines now.
+                object.__setattr__(df, "_line_fingerprints", line_fingerprints(csv_path, len(df)))
+            _write_compact(csv_path, source_key, df)
+            if cached is not None:
+                RELOADS.inc(kind="full")
+        if _stat_key(csv_path) != source_key:
+            # Changed again while we were reading: don't trust the fingerprints.
+            object.__setattr__(df, "_line_fingerprints", None)
+        version = source_version(source_key)
+        df.attrs["dataset_version"] = version
+        df.attrs["source_path"] = csv_path
+        _PROPERTIES_CACHE[csv_path] = (source_key, df, version)
+        return df, version
+
+
+def load_properties(path: Optional[str] = None) -> pd.DataFrame:
+    """Load properties data from CSV. If path is provided, load from there.
+
+    Served from the process-wide cache; see ``load_properties_versioned``.
+    """
+    return load_properties_versioned(path)[0]
+
+
+def dataset_version(df: pd.DataFrame) -> Optional[str]:
+    """Version token of a frame returned by ``load_properties``."""
+    return df.attrs.get("dataset_version")
+
+
+class PropertiesWatcher:
+    """Polls properties.csv and reloads it in the background when it changes.
+
+    Requests keep calling ``load_properties``, which then finds the new
+    version already published instead of paying for the reload themselves.
+    With ``fast_startup`` nothing is loaded until a request has loaded the
+    frame: the watcher only stats the file and picks up a current compact
+    catalog (``lookup.py``), so an idle fast-startup worker never imports pandas.
+    """
+
+    def __init__(self, path: Optional[str] = None, interval: float = 2.0, fast_startup: bool = False):
+        self.path = path
+        self.interval = interval
+        self.fast_startup = fast_startup
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def check(self) -> Optional[str]:
+        """Reload now if the file changed; return the current dataset version."""
+        csv_path = os.path.abspath(self.path if self.path is not None else PROPERTIES_FILE)
+        if self.fast_startup and csv_path not in _PROPERTIES_CACHE:
+            from lookup import load_compact_catalog  # lookup builds on this module
+
+            try:
+                source_key = _stat_key(csv_path)
+            except FileNotFoundError as e:
+                RELOAD_FAILURES.inc()
+                log.warning("properties reload failed: %s", e)
+                return None
+            load_compact_catalog(csv_path)
+            return source_version(source_key)
+        try:
+            return load_properties_versioned(self.path)[1]
+        except (FileNotFoundError, ValueError, pd.errors.ParserError) as e:
+            # A half-written file: keep serving the last good version.
+            RELOAD_FAILURES.inc()
+            log.warning("properties reload failed: %s", e)
+            return None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self) -> "PropertiesWatcher":
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="properties-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+VISIT_COLUMNS = ["timestamp", "listing_id", "property_name", "name", "phone", "user_message"]
+
+# fsync every booking write; off by default, enable with BOOKINGS_FSYNC=1.
+BOOKINGS_FSYNC = os.getenv("BOOKINGS_FSYNC", "0") == "1"
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Exclusive inter-process lock on a ``<path>.lock`` sidecar file."""
+    with open(path + ".lock", "a+b") as lock_fh:
+        if fcntl is not None:
+            fcntl.flock(lock_fh.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_fh.seek(0)
+            msvcrt.locking(lock_fh.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_fh.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_fh.seek(0)
+                msvcrt.locking(lock_fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+BOOKING_REWRITES = metrics.counter("booking_csv_rewrites_total", "visits.csv rewrites to add missing columns")
+
+
+def _read_header(csv_path: str) -> Optional[List[str]]:
+    try:
+        with open(csv_path, newline="", encoding="utf-8") as fh:
+            return next(csv.reader(fh), None)
+    except FileNotFoundError:
+        return None
+
+
+@metrics.timed()
+def append_rows(
+    csv_path: str,
+    rows: List[Dict[str, Any]],
+    columns: List[str],
+    fsync: Optional[bool] = None,
+) -> None:
+    """Append ``rows`` to ``csv_path`` under an exclusive file lock.
+
+    Writes the header when the file is new. Rows are laid out in the existing
+    header's column order; if that header is missing some of ``columns`` the
+    file is rewritten once with the union of both (as the old pandas concat
+    did) and later appends are plain appends again.
+    """
+    if not rows:
+        return
+    if fsync is None:
+        fsync = BOOKINGS_FSYNC
+    with _file_lock(csv_path):
+        header = _read_header(csv_path)
+        if header and not set(columns) <= set(header):
+            BOOKING_REWRITES.inc()
+            df_existing = pd.read_csv(csv_path)
+            df_updated = pd.concat([df_existing, pd.DataFrame(rows)], ignore_index=True)
+            tmp_path = csv_path + ".tmp"
+            df_updated.to_csv(tmp_path, index=False)
+            os.replace(tmp_path, csv_path)
+            return
+        with open(csv_path, "a", newline="", encoding="utf-8") as fh:
+            writer = csv.writer(fh, lineterminator="\n")
+            if not header:
+                header = list(columns)
+                writer.writerow(header)
+            writer.writerows([[row.get(col, "") for col in header] for row in rows])
+            fh.flush()
+            if fsync:
+                os.fsync(fh.fileno())
+
 
-def save_booking(name: str, property_name: str, date) -> None:
-    """Legacy simple booking saver used by form UI (kept for compatibility)."""
+# user_message of bookings made through the form; the date is parsed back out
+# by the booking store.
+FORM_BOOKING_MESSAGE = "Booking form, preferred date {date}"
+
+
+def save_booking(name: str, property_name: str, date, listing_id: Optional[str] = None,
+                 out_path: Optional[str] = None) -> None:
+    """Save a booking from the form UI as a visits.csv row (same schema as the chat flow)."""
+    save_visit_booking(listing_id, property_name, name, "", FORM_BOOKING_MESSAGE.format(date=date), out_path=out_path)
+
+
+def _visit_row(
+    listing_id: Optional[str],
+    property_name: Optional[str],
+    name: str,
+    phone: str,
+    user_message: str,
+    timestamp: Optional[str] = None,
+) -> Dict[str, Any]:
+    return {
+        "timestamp": timestamp or datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "listing_id": listing_id or "",
+        "property_name": property_name or "",
+        "name": name,
+        "phone": phone,
+        "user_message": user_message,
+    }
+
+
+class GroupCommitWriter:
+    """Background writer that coalesces concurrent bookings into one append.
+
+    ``submit`` queues rows and returns a Future that resolves once they are on
+    disk. Each commit takes everything queued while the previous write was in
+    flight, optionally waiting up to ``max_delay`` seconds for more, capped at
+    ``max_batch`` rows.
+    """
+
+    def __init__(self, max_delay: float = 0.0, max_batch: int = 1024, fsync: Optional[bool] = None):
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="booking-group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, csv_path: str, rows: List[Dict[str, Any]]) -> Future:
+        future: Future = Future()
+        self._queue.put((csv_path, rows, future))
+        return future
+
+    def close(self) -> None:
+        """Flush everything queued so far and stop the worker."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            size = len(item[1])
+            deadline = time.monotonic() + self.max_delay
+            stop = False
+            while size < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                size += len(item[1])
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch) -> None:
+        by_path: Dict[str, list] = {}
+        for csv_path, rows, future in batch:
+            by_path.setdefault(csv_path, []).append((rows, future))
+        for csv_path, entries in by_path.items():
+            try:
+                append_rows(csv_path, [r for rows, _ in entries for r in rows], VISIT_COLUMNS, fsync=self.fsync)
+            except Exception as exc:
+                for _, future in entries:
+                    future.set_exception(exc)
+            else:
+                for _, future in entries:
+                    future.set_result(None)
+
+
+_group_writer: Optional[GroupCommitWriter] = None
+
+
+def enable_group_commit(max_delay: float = 0.0, max_batch: int = 1024, fsync: Optional[bool] = None) -> GroupCommitWriter:
+    """Route visit bookings through a shared GroupCommitWriter."""
+    global _group_writer
+    disable_group_commit()
+    _group_writer = GroupCommitWriter(max_delay=max_delay, max_batch=max_batch, fsync=fsync)
+    return _group_writer
+
+
+def disable_group_commit() -> None:
+    """Flush pending bookings and go back to direct appends."""
+    global _group_writer
+    writer, _group_writer = _group_writer, None
+    if writer is not None:
+        writer.close()
+
+
+def save_visit_bookings(bookings: Iterable[Dict[str, Any]], out_path: Optional[str] = None) -> int:
+    """Append many bookings in one locked write. Returns the number written.
+
+    Each booking is a dict with the keyword arguments of ``save_visit_booking``
+    (``timestamp`` may be given to override the current time).
+    """
     os.makedirs(os.path.join(os.path.dirname(__file__), "..", "data"), exist_ok=True)
-    new_booking = pd.DataFrame([
-        {"Name": name, "Property Name": property_name, "Date": str(date)}
-    ])
-    if os.path.exists(BOOKINGS_FILE):
-        df_existing = pd.read_csv(BOOKINGS_FILE)
-        df_updated = pd.concat([df_existing, new_booking], ignore_index=True)
+    csv_path = out_path if out_path is not None else BOOKINGS_FILE
+    rows = [
+        _visit_row(
+            b.get("listing_id"),
+            b.get("property_name"),
+            b.get("name", ""),
+            b.get("phone", ""),
+            b.get("user_message", ""),
+            b.get("timestamp"),
+        )
+        for b in bookings
+    ]
+    writer = _group_writer
+    if writer is not None:
+        writer.submit(csv_path, rows).result()
     else:
-        df_updated = new_booking
-    df_updated.to_csv(BOOKINGS_FILE, index=False)
+        append_rows(csv_path, rows, VISIT_COLUMNS)
+    return len(rows)
 
 
 def save_visit_booking(
@@ -45,63 +769,301 @@ def save_visit_booking(
 
     Columns: timestamp, listing_id, property_name, name, phone, user_message
     """
-    os.makedirs(os.path.join(os.path.dirname(__file__), "..", "data"), exist_ok=True)
-    csv_path = out_path if out_path is not None else os.path.join(os.path.dirname(__file__), "..", "data", "visits.csv")
-    row = {
-        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
-        "listing_id": listing_id or "",
-        "property_name": property_name or "",
-        "name": name,
-        "phone": phone,
-        "user_message": user_message,
-    }
-    if os.path.exists(csv_path):
-        df_existing = pd.read_csv(csv_path)
-        df_updated = pd.concat([df_existing, pd.DataFrame([row])], ignore_index=True)
-    else:
-        df_updated = pd.DataFrame([row])
-    df_updated.to_csv(csv_path, index=False)
+    save_visit_bookings(
+        [{
+            "listing_id": listing_id,
+            "property_name": property_name,
+            "name": name,
+            "phone": phone,
+            "user_message": user_message,
+        }],
+        out_path=out_path,
+    )
 
 
 def load_bookings():
-    """Load all bookings."""
+    """Load all bookings. For paged, filtered access use ``bookings.get_booking_store``."""
     if os.path.exists(BOOKINGS_FILE):
         return pd.read_csv(BOOKINGS_FILE)
     else:
-        return pd.DataFrame(columns=["Name", "Property Name", "Date"])
+        return pd.DataFrame(columns=VISIT_COLUMNS)
+
+
+class PropertyIndex:
+    """Hash-based lookup structures built once over a properties DataFrame.
+
+    Mirrors the matching order of the original column scans in
+    ``find_property`` (listing id, exact name, name substring, all words)
+    and returns the same first row, without touching every row per query.
+    Substring matching is literal rather than regex.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        keys = lookup_keys(df)
+        ids = keys["listing_id"].tolist() if "listing_id" in keys else [None] * len(df)
+        names = keys["property_name"].tolist() if "property_name" in keys else [None] * len(df)
+        self._build(df, ids, names)
+
+    def _build(self, df, ids: List[Optional[str]], names: List[Optional[str]]) -> None:
+        """Index the normalized ``ids`` and ``names`` of the rows of ``df``."""
+        self._build_exact(df, ids, names)
+        self._build_words()
+
+    def _build_exact(self, df, ids: List[Optional[str]], names: List[Optional[str]]) -> None:
+        self.df = df
+        self._by_id: Dict[str, int] = {}
+        self._by_name: Dict[str, int] = {}
+        self._names: List[Optional[str]] = list(names)
+        for pos, listing_id in enumerate(ids):
+            if listing_id is not None:
+                self._by_id.setdefault(listing_id, pos)
+        for pos, name_lower in enumerate(self._names):
+            if name_lower is not None:
+                self._by_name.setdefault(name_lower, pos)
+
+    def _build_words(self) -> None:
+        # token -> ascending row positions whose name contains that token
+        self._postings: Dict[str, List[int]] = {}
+        # trigram -> tokens containing it, to resolve word fragments
+        self._token_trigrams: Dict[str, set] = {}
+        self._fragment_tokens = lru_cache(maxsize=4096)(self._scan_fragment)
+        for pos, name_lower in enumerate(self._names):
+            if name_lower is not None:
+                for token in set(name_lower.split()):
+                    self._postings.setdefault(token, []).append(pos)
+        for token in self._postings:
+            for i in range(len(token) - 2):
+                self._token_trigrams.setdefault(token[i:i + 3], set()).add(token)
+        self._first_named = next((i for i, n in enumerate(self._names) if n is not None), None)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def updated(self, df: pd.DataFrame, delta: FrameDelta) -> "PropertyIndex":
+        """Index for ``df``, a reload of this index's frame, patched from this one.
+
+        Only the rows in ``delta`` are tokenized; if rows were removed, the
+        surviving positions are shifted with NumPy. A reordered file is
+        indexed from scratch. ``self`` is not modified.
+        """
+        m = delta.old_to_new
+        kept = np.flatnonzero(m >= 0)
+        if np.any(np.diff(m[kept]) < 0):
+            return PropertyIndex(df)
+        shifted = not np.array_equal(m[kept], kept)
+        gone = np.flatnonzero(m < 0).tolist()
+        fresh = delta.fresh.tolist()
+
+        index = PropertyIndex.__new__(PropertyIndex)
+        index.df = df
+        index._fragment_tokens = lru_cache(maxsize=4096)(index._scan_fragment)
+        keys = lookup_keys(df)
+        ids = keys["listing_id"] if "listing_id" in keys else np.full(len(df), None, dtype=object)
+        names = keys["property_name"] if "property_name" in keys else np.full(len(df), None, dtype=object)
+        index._names = names.tolist()
+        old_ids = lookup_keys(self.df).get("listing_id")
+
+        def remap(mapping: Dict[str, int]) -> Dict[str, int]:
+            if not shifted:
+                return dict(mapping)
+            values = m[np.fromiter(mapping.values(), dtype=np.int64, count=len(mapping))]
+            return dict(zip(mapping, values.tolist()))
+
+        # Copy-on-write postings: only the lists of touched tokens are copied.
+        if shifted:
+            tokens = list(self._postings)
+            lengths = np.fromiter(map(len, self._postings.values()), dtype=np.int64, count=len(tokens))
+            flat = m[np.fromiter(itertools.chain.from_iterable(self._postings.values()), dtype=np.int64,
+                                 count=int(lengths.sum()))]
+            ends = np.cumsum(lengths)
+            live = np.concatenate([[0], np.cumsum(flat >= 0)])
+            counts = live[ends] - live[ends - lengths]
+            lists = np.split(flat[flat >= 0], np.cumsum(counts)[:-1]) if tokens else []
+            index._postings = {t: rows.tolist() for t, rows in zip(tokens, lists)}
+            owned = set(index._postings)
+        else:
+            index._postings = dict(self._postings)
+            owned = set()
+
+        def own(token: str) -> List[int]:
+            if token not in owned:
+                index._postings[token] = list(index._postings.get(token, ()))
+                owned.add(token)
+            return index._postings[token]
+
+        if not shifted:
+            removed: Dict[str, set] = {}
+            for pos in gone:
+                if self._names[pos] is not None:
+                    for token in set(self._names[pos].split()):
+                        removed.setdefault(token, set()).add(pos)
+            for token, positions in removed.items():
+                index._postings[token] = [p for p in self._postings[token] if p not in positions]
+                owned.add(token)
+        new_tokens = set()
+        for pos in fresh:
+            if names[pos] is not None:
+                for token in set(names[pos].split()):
+                    if token not in index._postings:
+                        new_tokens.add(token)
+                    bisect.insort(own(token), pos)
+
+        index._token_trigrams = dict(self._token_trigrams)
+        for token in new_tokens:
+            for i in range(len(token) - 2):
+                gram = token[i:i + 3]
+                index._token_trigrams[gram] = set(index._token_trigrams.get(gram, ())) | {token}
+
+        # First position per id / name: drop entries that pointed at a gone
+        # row, rescan for those keys, then let fresh rows claim earlier spots.
+        index._by_id, index._by_name = remap(self._by_id), remap(self._by_name)
+        gone_set = set(gone)
+        for mapping, old_mapping, old_values, new_values in (
+            (index._by_id, self._by_id, old_ids, ids),
+            (index._by_name, self._by_name, self._names, names),
+        ):
+            if old_values is None:
+                continue
+            lost = {old_values[pos] for pos in gone if old_values[pos] is not None}
+            lost = {key for key in lost if old_mapping.get(key) in gone_set}
+            for key in lost:
+                mapping.pop(key, None)
+            if lost:
+                for pos in np.flatnonzero(pd.Series(new_values).isin(lost)).tolist():
+                    mapping.setdefault(new_values[pos], pos)
+            for pos in fresh:
+                key = new_values[pos]
+                if key is not None and mapping.get(key, pos + 1) > pos:
+                    mapping[key] = pos
+        index._first_named = next((i for i, n in enumerate(index._names) if n is not None), None)
+        return index
+
+    def _scan_fragment(self, fragment: str) -> tuple:
+        """Tokens containing ``fragment`` and the cost of merging their rows."""
+        if len(fragment) >= 3:
+            grams = [self._token_trigrams.get(fragment[i:i + 3], ()) for i in range(len(fragment) - 2)]
+            pool = min(grams, key=len)
+        else:
+            pool = self._postings
+        tokens = [t for t in pool if fragment in t]
+        rows = sum(len(self._postings[t]) for t in tokens)
+        return tokens, rows * max(1, len(tokens)).bit_length()
+
+    def _candidate_rows(self, words: List[str]):
+        """Yield, in ascending order, rows matching the cheapest word."""
+        best = None
+        for word in set(words):
+            tokens, count = self._fragment_tokens(word)
+            if count == 0:
+                return
+            if best is None or count < best[1]:
+                best = (tokens, count)
+        last = -1
+        for pos in heapq.merge(*(self._postings[t] for t in best[0])):
+            if pos != last:
+                last = pos
+                yield pos
 
+    # Match rules of ``match``, in the order ``find_position`` tries them.
+    MATCH_ID, MATCH_NAME, MATCH_SUBSTRING, MATCH_ALL_WORDS = range(4)
 
+    def match(self, query: str) -> Optional[Tuple[int, int]]:
+        """``(rule, position)`` of the first matching property, or None.
+
+        Lower rules win; within a rule the earliest row does. Comparing
+        these pairs across several indexes (e.g. shards, with positions made
+        global) picks the row ``find_position`` would pick over all of them.
+        """
+        if not query:
+            return None
+        q = str(query).strip()
+        exact = self._match_exact(q)
+        if exact is not None:
+            return exact
+
+        q_lower = q.lower()
+        words = q_lower.split()
+        if not words:
+            # Empty substring matches every named row, as str.contains("") did.
+            return None if self._first_named is None else (self.MATCH_SUBSTRING, self._first_named)
+
+        # Any name containing the whole query also contains each of its words,
+        # so rows of the rarest word are checked in order for both rules.
+        first_all_words = None
+        for pos in self._candidate_rows(words):
+            name = self._names[pos]
+            if q_lower in name:
+                return self.MATCH_SUBSTRING, pos
+            if first_all_words is None and len(words) > 1 and all(w in name for w in words):
+                first_all_words = pos
+        return None if first_all_words is None else (self.MATCH_ALL_WORDS, first_all_words)
+
+    def _match_exact(self, q: str) -> Optional[Tuple[int, int]]:
+        # exact listing match
+        pos = self._by_id.get(q.upper())
+        if pos is not None:
+            return self.MATCH_ID, pos
+
+        # exact name match
+        pos = self._by_name.get(q.lower())
+        if pos is not None:
+            return self.MATCH_NAME, pos
+        return None
+
+    def find_position(self, query: str) -> Optional[int]:
+        """Return the row position of the first matching property, or None."""
+        matched = self.match(query)
+        return None if matched is None else matched[1]
+
+    def positions_containing(self, text: str) -> List[int]:
+        """Ascending positions of every row whose name contains ``text``
+        (case-insensitive, literal)."""
+        t_lower = str(text).lower()
+        words = t_lower.split()
+        if not words:
+            return [pos for pos, name in enumerate(self._names) if name is not None and t_lower in name]
+        if words == [t_lower]:
+            # A single fragment lies inside one token: no per-row check needed.
+            tokens, _cost = self._fragment_tokens(t_lower)
+            return sorted(set().union(*(self._postings[t] for t in tokens)))
+        return [pos for pos in self._candidate_rows(words) if t_lower in self._names[pos]]
+
+    def find_exact(self, query: str) -> Optional[Dict[str, Any]]:
+        """The property whose listing id or whole name is ``query``, or None."""
+        matched = self._match_exact(str(query).strip()) if query else None
+        return None if matched is None else self.record(matched[1])
+
+    def find(self, query: str) -> Optional[Dict[str, Any]]:
+        pos = self.find_position(query)
+        if pos is None:
+            return None
+        return self.record(pos)
+
+    def record(self, pos: int) -> Dict[str, Any]:
+        """Row ``pos`` of the indexed frame as a dict."""
+        return self.df.iloc[pos].to_dict()
+
+
+def get_property_index(df: pd.DataFrame) -> PropertyIndex:
+    """Return the PropertyIndex for ``df``, building it on first use.
+
+    The index is stored on the frame itself so it lives exactly as long as
+    the frame; mutating a frame in place after indexing it is not supported.
+    """
+    index = getattr(df, "_property_index", None)
+    if index is None:
+        index = PropertyIndex(df)
+        # object.__setattr__ bypasses pandas' column-attribute handling.
+        object.__setattr__(df, "_property_index", index)
+    return index
+
+
+@metrics.timed()
 def find_property(df: pd.DataFrame, query: str) -> Optional[Dict[str, Any]]:
     """Find property by exact listing_id or case-insensitive substring of property_name."""
-    if not query:
-        return None
-    q = str(query).strip()
-    
-    # exact listing match
-    hit = df[df["listing_id"].str.upper() == q.upper()]
-    if not hit.empty:
-        return hit.iloc[0].to_dict()
-    
-    # name contains - more robust matching
-    # Try exact match first
-    hit = df[df["property_name"].str.lower() == q.lower()]
-    if not hit.empty:
-        return hit.iloc[0].to_dict()
-    
-    # Try contains match
-    hit = df[df["property_name"].str.contains(q, case=False, na=False)]
-    if not hit.empty:
-        return hit.iloc[0].to_dict()
-    
-    # Try word-by-word matching for multi-word queries
-    query_words = q.split()
-    if len(query_words) > 1:
-        for _, row in df.iterrows():
-            property_name_lower = row["property_name"].lower()
-            if all(word.lower() in property_name_lower for word in query_words):
-                return row.to_dict()
-    
-    return None
+    if isinstance(df, PropertyIndex):
+        return df.find(query)
+    return get_property_index(df).find(query)
 
 
 FAQS = {
@@ -119,36 +1081,293 @@ def get_faq_answer(text: str) -> Optional[str]:
     return None
 
 
-def polish_with_llm(text: str, api_key: Optional[str] = None) -> str:
-    """Optional LLM polish for replies. Returns original text if no API key."""
+LLM_API_URL = os.getenv("LLM_API_URL", "https://openrouter.ai/api/v1/chat/completions")
+LLM_MODEL = os.getenv("LLM_MODEL", "openrouter/auto")
+# Seconds allowed per polish request before falling back to the raw text.
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "10"))
+# Seconds a streamed polish may take before the raw reply is shown instead.
+LLM_STREAM_DEADLINE = float(os.getenv("LLM_STREAM_DEADLINE", str(LLM_TIMEOUT)))
+LLM_SYSTEM_PROMPT = (
+    "You are a helpful real estate assistant. Rewrite the following property information in a friendly, "
+    "natural way. Keep all facts accurate and don't add information not present in the original text."
+)
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with per-entry TTL and optional JSONL persistence.
+
+    Keys are tuples of strings. With ``path`` set, every ``put`` is appended
+    to the file and the file is replayed (and compacted) on construction, so
+    entries survive restarts.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: Optional[float] = 86400.0, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[tuple, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def get(self, key: tuple) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or self._expired(entry[0], time.time()):
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._data[key] = (now, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+            if self.path:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as fh:
+                        fh.write(json.dumps([list(key), now, value]) + "\n")
+                except OSError:
+                    pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _load(self) -> None:
+        now = time.time()
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        key, stored_at, value = json.loads(line)
+                    except ValueError:
+                        continue  # torn final line from a crash
+                    if not self._expired(stored_at, now):
+                        self._data[tuple(key)] = (stored_at, value)
+                        self._data.move_to_end(tuple(key))
+        except FileNotFoundError:
+            return
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+        # Rewrite with only the live entries so the file stays bounded.
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            for key, (stored_at, value) in self._data.items():
+                fh.write(json.dumps([list(key), stored_at, value]) + "\n")
+        os.replace(tmp_path, self.path)
+
+
+LLM_CACHE = ResponseCache(
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("LLM_CACHE_TTL", "86400")),
+    path=os.getenv("LLM_CACHE_FILE") or None,
+)
+metrics.register_cache("llm", LLM_CACHE)
+LLM_FALLBACKS = metrics.counter("llm_fallbacks_total", "Polish requests answered with the unpolished text")
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """Shared keep-alive ``requests.Session`` with a connection pool."""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _http_session = session
+    return _http_session
+
+
+def _llm_payload(text: str, model: str, stream: bool = False) -> Dict[str, Any]:
+    data = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": LLM_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Please polish this property description: {text}"},
+        ],
+        "max_tokens": 200,
+        "temperature": 0.3,
+    }
+    if stream:
+        data["stream"] = True
+    return data
+
+
+class _BudgetExceeded(Exception):
+    """An LLM call ran past its total time budget."""
+
+
+def _body_chunks(response, started: float, budget: float) -> Iterator[bytes]:
+    """Body bytes of a streamed ``response`` as they arrive, within ``budget``
+    seconds of ``started``; raises ``_BudgetExceeded`` past it.
+
+    ``requests`` timeouts bound each socket read, not the whole call, so a
+    server trickling bytes could hold a call open far past the budget. Each
+    read here waits at most for the time that is left.
+    """
+    sock = getattr(getattr(response.raw, "connection", None), "sock", None)
+    while True:
+        left = started + budget - time.monotonic()
+        if left <= 0:
+            raise _BudgetExceeded()
+        if sock is not None:
+            sock.settimeout(left)
+        chunk = response.raw.read1(65536, decode_content=True)
+        if not chunk:
+            if time.monotonic() - started > budget:
+                raise _BudgetExceeded()
+            return
+        yield chunk
+
+
+def _lines(chunks: Iterator[bytes]) -> Iterator[str]:
+    """Decoded lines of a byte stream, without line endings."""
+    buffer = b""
+    for chunk in chunks:
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r").decode("utf-8")
+    if buffer:
+        yield buffer.rstrip(b"\r").decode("utf-8")
+
+
+@metrics.timed()
+def polish_with_llm(
+    text: str,
+    api_key: Optional[str] = None,
+    dataset_version: Optional[str] = None,
+    model: Optional[str] = None,
+    timeout: Optional[float] = None,
+    api_url: Optional[str] = None,
+    cache: Optional[ResponseCache] = None,
+) -> str:
+    """Optional LLM polish for replies. Returns original text if no API key.
+
+    Successful rewrites are cached on (text, model, dataset_version). Requests
+    go through a pooled session and fall back to ``text`` on any error or when
+    the whole call takes longer than ``timeout`` (default ``LLM_TIMEOUT``).
+    """
     if not api_key:
         return text
+    model = model or LLM_MODEL
+    cache = cache if cache is not None else LLM_CACHE
+    key = (text, model, dataset_version or "")
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    budget = timeout if timeout is not None else LLM_TIMEOUT
+    started = time.monotonic()
     try:
-        url = "https://openrouter.ai/api/v1/chat/completions"
         headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json",
         }
-        data = {
-            "model": "openrouter/auto",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "You are a helpful real estate assistant. Rewrite the following property information in a friendly, natural way. Keep all facts accurate and don't add information not present in the original text."
-                },
-                {
-                    "role": "user",
-                    "content": f"Please polish this property description: {text}"
-                }
-            ],
-            "max_tokens": 200,
-            "temperature": 0.3,
-        }
-        response = requests.post(url, headers=headers, json=data, timeout=10)
-        if response.status_code == 200:
-            result = response.json()
-            return result["choices"][0]["message"]["content"].strip()
-        else:
-            return text
+        with get_http_session().post(
+            api_url or LLM_API_URL,
+            headers=headers,
+            json=_llm_payload(text, model),
+            timeout=budget,
+            stream=True,
+        ) as response:
+            if response.status_code != 200:
+                LLM_FALLBACKS.inc(reason="status")
+                return text
+            result = json.loads(b"".join(_body_chunks(response, started, budget)))
+        polished = result["choices"][0]["message"]["content"].strip()
+        cache.put(key, polished)
+        return polished
+    except _BudgetExceeded:
+        LLM_FALLBACKS.inc(reason="deadline")
+        return text
     except Exception:
+        LLM_FALLBACKS.inc(reason="error")
         return text
+
+
+def stream_polish_with_llm(
+    text: str,
+    api_key: Optional[str] = None,
+    dataset_version: Optional[str] = None,
+    model: Optional[str] = None,
+    deadline: Optional[float] = None,
+    api_url: Optional[str] = None,
+    cache: Optional[ResponseCache] = None,
+) -> Iterator[str]:
+    """Streaming variant of ``polish_with_llm``.
+
+    Yields the reply accumulated so far each time a token arrives over the
+    SSE stream, so the caller can re-render one chat bubble in place. The last
+    value yielded is the final reply: the polished text, or ``text`` itself
+    when there is no API key, the request fails, or the stream has not
+    finished within ``deadline`` seconds (default ``LLM_STREAM_DEADLINE``).
+    """
+    if not api_key:
+        yield text
+        return
+    model = model or LLM_MODEL
+    cache = cache if cache is not None else LLM_CACHE
+    key = (text, model, dataset_version or "")
+    cached = cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    deadline = deadline if deadline is not None else LLM_STREAM_DEADLINE
+    started = time.monotonic()
+    parts: List[str] = []
+    try:
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+        }
+        with get_http_session().post(
+            api_url or LLM_API_URL,
+            headers=headers,
+            json=_llm_payload(text, model, stream=True),
+            timeout=deadline,
+            stream=True,
+        ) as response:
+            if response.status_code != 200:
+                yield text
+                return
+            for line in _lines(_body_chunks(response, started, deadline)):
+                if not line or not line.startswith("data:"):
+                    continue  # blank separators and ": keep-alive" comments
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    yield "".join(parts).lstrip()
+    except Exception:
+        yield text
+        return
+    polished = "".join(parts).strip()
+    if not polished:
+        yield text
+        return
+    cache.put(key, polished)
+    yield polished
@@ -0,0 +1,171 @@
+"""Bounded per-session chat history with a spill-to-disk archive.
+
+``ChatHistory`` keeps the most recent messages of one chat session in a ring
+buffer capped by message count and by total text size. Older messages are
+appended to the session's archive file in compressed blocks, so memory per
+session stays flat however long the conversation runs. ``window`` returns
+the last N messages for rendering and reads archived blocks only when the
+window reaches back past what is in memory ("show earlier").
+
+Archive layout: a sequence of blocks, each a ``<II`` header (compressed
+length, message count) followed by zlib-compressed JSON ``[[role, text], ...]``.
+Block offsets are kept in memory (two ints per block) and rebuilt from the
+headers when a history is reopened.
+"""
+import json
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+import metrics
+
+HISTORY_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "chat_history")
+# Messages (user and assistant each count) and text bytes kept in memory per session.
+HISTORY_MESSAGES = int(os.getenv("CHAT_HISTORY_MESSAGES", "100"))
+HISTORY_BYTES = int(os.getenv("CHAT_HISTORY_BYTES", str(256 * 1024)))
+# Messages shown before "show earlier" is used, and added per click.
+HISTORY_WINDOW = int(os.getenv("CHAT_HISTORY_WINDOW", "20"))
+
+_HEADER = struct.Struct("<II")
+
+SPILLED = metrics.counter("chat_history_spilled_messages_total", "Chat messages moved out of memory, by outcome")
+
+Message = Tuple[str, str]
+
+
+def _size(message: Message) -> int:
+    return len(message[1].encode("utf-8"))
+
+
+class ChatHistory:
+    """Messages of one chat session: recent ones in memory, the rest on disk.
+
+    Over ``max_messages`` or ``max_bytes`` the oldest messages are spilled
+    until the buffer is back to three quarters of both limits, so spills
+    happen in batches rather than one message per turn. The newest message
+    always stays in memory, even if it alone is over ``max_bytes``.
+    """
+
+    def __init__(self, session_id: str, max_messages: int = HISTORY_MESSAGES, max_bytes: int = HISTORY_BYTES,
+                 directory: Optional[str] = None):
+        self.path = os.path.join(directory or HISTORY_DIR, f"{session_id}.chatlog")
+        self.max_messages = max(1, max_messages)
+        self.max_bytes = max_bytes
+        self._recent: Deque[Message] = deque()
+        self._bytes = 0
+        # (offset, message count) of each archived block, oldest first
+        self._blocks: List[Tuple[int, int]] = []
+        self.archived = 0
+        self._scan()
+
+    def _scan(self) -> None:
+        try:
+            with open(self.path, "rb") as fh:
+                offset = 0
+                while True:
+                    header = fh.read(_HEADER.size)
+                    if len(header) < _HEADER.size:
+                        break
+                    length, count = _HEADER.unpack(header)
+                    self._blocks.append((offset, count))
+                    self.archived += count
+                    offset += _HEADER.size + length
+                    fh.seek(offset)
+        except FileNotFoundError:
+            pass
+
+    def __len__(self) -> int:
+        return self.archived + len(self._recent)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Text bytes held in memory."""
+        return self._bytes
+
+    def append(self, role: str, text: str) -> None:
+        message = (role, str(text))
+        self._recent.append(message)
+        self._bytes += _size(message)
+        if len(self._recent) > self.max_messages or self._bytes > self.max_bytes:
+            self._spill()
+
+    def _spill(self) -> None:
+        keep_messages = max(1, self.max_messages * 3 // 4)
+        keep_bytes = self.max_bytes * 3 // 4
+        batch = []
+        while len(self._recent) > 1 and (len(self._recent) > keep_messages or self._bytes > keep_bytes):
+            message = self._recent.popleft()
+            self._bytes -= _size(message)
+            batch.append(message)
+        if not batch:
+            return
+        payload = zlib.compress(json.dumps(batch, ensure_ascii=False).encode("utf-8"))
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "ab") as fh:
+                offset = fh.tell()
+                fh.write(_HEADER.pack(len(payload), len(batch)) + payload)
+        except OSError:
+            # The memory cap wins over keeping old messages on a full or read-only disk.
+            SPILLED.inc(len(batch), outcome="dropped")
+            return
+        self._blocks.append((offset, len(batch)))
+        self.archived += len(batch)
+        SPILLED.inc(len(batch), outcome="archived")
+
+    def _read_archived(self, start: int) -> List[Message]:
+        """Archived messages from index ``start`` (oldest is 0) to the end of the archive."""
+        first = len(self._blocks)
+        seen = self.archived
+        while first > 0 and seen > start:
+            first -= 1
+            seen -= self._blocks[first][1]
+        skip = start - seen
+        messages: List[Message] = []
+        with open(self.path, "rb") as fh:
+            for offset, _count in self._blocks[first:]:
+                fh.seek(offset)
+                length, _ = _HEADER.unpack(fh.read(_HEADER.size))
+                messages.extend(tuple(m) for m in json.loads(zlib.decompress(fh.read(length))))
+        return messages[skip:]
+
+    def window(self, count: int) -> List[Message]:
+        """The last ``count`` messages, oldest first."""
+        count = max(0, min(count, len(self)))
+        if count <= len(self._recent):
+            return list(self._recent)[len(self._recent) - count:]
+        return self._read_archived(len(self) - count) + list(self._recent)
+
+    def clear(self) -> None:
+        """Forget every message and delete the archive."""
+        self._recent.clear()
+        self._bytes = 0
+        self._blocks = []
+        self.archived = 0
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def prune_archives(max_age: float = 7 * 86400, directory: Optional[str] = None) -> int:
+    """Delete archives untouched for ``max_age`` seconds; return how many."""
+    directory = directory or HISTORY_DIR
+    cutoff = time.time() - max_age
+    removed = 0
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            if name.endswith(".chatlog") and os.stat(path).st_mtime < cutoff:
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
@@ -0,0 +1,102 @@
+"""Declarative intent table for the chatbot, compiled once into one matcher."""
+import re
+from typing import List, NamedTuple
+
+GREETINGS = frozenset(["hi", "hello", "hey"])
+
+# (intent, keywords) in priority order. A message belongs to the first intent
+# that has any keyword anywhere in it, like the original if/elif chain of
+# substring checks in handle_message.
+INTENTS = [
+    ("show_properties", ["properties"]),
+    ("book", ["book", "visit"]),
+    ("amenities", ["amenities"]),
+    ("faq", ["faq"]),
+    ("price", ["price"]),
+    ("faq_office", ["where is your office", "office location", "address"]),
+    ("faq_hours", ["working hours", "hours", "timings"]),
+    # Free-text searches over descriptions ("villa with private pool", "near
+    # metro"). Last, as these words also turn up in the questions above.
+    ("search", ["with ", "near ", "looking for", "search", "find "]),
+]
+
+# Phrases stripped from a message to leave just the property name.
+FILLER_PHRASES = [
+    "show details for", "details for", "information about", "tell me about", "what is", "price of",
+    "property", "apartment", "villa", "studio", "office", "house",
+]
+
+# Words dropped before fuzzy-matching what is left as a property name.
+ENTITY_STOPWORDS = frozenset([
+    "a", "an", "the", "of", "for", "in", "at", "is", "are", "me", "my", "i", "to", "see", "show", "about",
+    "details", "detail", "tell", "what", "whats", "how", "much", "does", "cost", "please", "price", "prices",
+])
+
+LISTING_ID_RE = re.compile(r"p\d+")
+# Splits a search message around its keywords: "marina studio with parking".
+SEARCH_SPLIT_RE = re.compile("|".join(re.escape(k) for k in dict(INTENTS)["search"]))
+WORD_RE = re.compile(r"[a-z0-9]+")
+FILLER_RE = re.compile("|".join(re.escape(p) for p in FILLER_PHRASES))
+
+
+class Route(NamedTuple):
+    intent: str
+    # Property lookups to try in order; the first hit answers the message.
+    # Those of a search only answer it on an exact listing id or name.
+    lookups: List[str]
+    # Remaining name-like words for fuzzy search when every lookup misses.
+    entity: str = ""
+
+
+class IntentRouter:
+    """Classifies a lowercased message with a single compiled regex.
+
+    The table becomes one anchored alternation of lookaheads, one per intent
+    in priority order, each ending in an empty group named after the intent.
+    ``match`` tries them in order inside the regex engine, so the first
+    intent with a keyword anywhere in the message wins.
+    """
+
+    def __init__(self, intents=INTENTS):
+        branches = "|".join(
+            f"(?=.*?(?:{'|'.join(re.escape(k) for k in keywords)}))(?P<{name}>)" for name, keywords in intents
+        )
+        self._matcher = re.compile(f"(?s){branches}")
+
+    def classify(self, text: str) -> str:
+        if text in GREETINGS:
+            return "greeting"
+        match = self._matcher.match(text)
+        return match.lastgroup if match else "unknown"
+
+    def route(self, text: str) -> Route:
+        """Classify ``text`` (already lowercased) and extract its lookups."""
+        intent = self.classify(text)
+        lookups: List[str] = []
+        entity = ""
+        if intent == "search":
+            entity = text
+            listing_id = LISTING_ID_RE.search(text)
+            if listing_id:
+                lookups.append(listing_id.group())
+            lookups.extend(part.strip(" ?!.,") for part in SEARCH_SPLIT_RE.split(text) if part.strip(" ?!.,"))
+        if intent in ("price", "unknown"):
+            words = WORD_RE.findall(FILLER_RE.sub(" ", text))
+            entity = " ".join(w for w in words if w not in ENTITY_STOPWORDS)
+        if intent == "price":
+            listing_id = LISTING_ID_RE.search(text)
+            if listing_id:
+                lookups.append(listing_id.group())
+            lookups.append(text)
+        elif intent == "unknown":
+            lookups.append(text)
+            cleaned = FILLER_RE.sub("", text).strip()
+            if cleaned and cleaned != text:
+                lookups.append(cleaned)
+        if intent in ("price", "unknown"):
+            # "price of sunrise apartments with parking": the name comes before the search words.
+            head = SEARCH_SPLIT_RE.split(text, maxsplit=1)
+            name = " ".join(w for w in WORD_RE.findall(head[0]) if w not in ENTITY_STOPWORDS)
+            if len(head) > 1 and name:
+                lookups.append(name)
+        return Route(intent, lookups, entity)
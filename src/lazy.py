@@ -0,0 +1,26 @@
+"""Deferred imports of heavy dependencies.
+
+``pd = lazy_import("pandas")`` binds a stand-in module that imports pandas
+on first attribute access. Paths that never touch it (FAQ answers, id/name
+lookups from the compact catalog, booking appends) then start without
+paying for the import; ``benchmarks/bench_startup.py`` tracks that cost.
+"""
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Placeholder for a module that is imported when first used."""
+
+    def __getattr__(self, name):
+        module = importlib.import_module(self.__name__)
+        # Later lookups hit the copied attributes and skip __getattr__.
+        self.__dict__.update(module.__dict__)
+        return getattr(module, name)
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """``name`` if it is already imported, else a module importing it on first use."""
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
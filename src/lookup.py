@@ -0,0 +1,177 @@
+"""Pandas-free lookup core for fast starts.
+
+    python src/lookup.py [data/properties.csv]   # precompile the snapshot
+
+``load_properties`` also writes ``properties.lookup.pkl`` next to the CSV:
+every column as a plain Python list (missing values as None) plus the
+normalized listing-id and name keys. ``load_compact_catalog`` reads it back
+with nothing but the standard library, so a fresh worker can answer id/name
+lookups (and resolve the property of a booking) before numpy or pandas are
+imported. The snapshot carries the CSV's ``(mtime_ns, size)``; once the CSV
+changes it is ignored until the next full load rewrites it.
+"""
+import os
+import pickle
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+from helpers import PROPERTIES_FILE, PropertyIndex, _stat_key, lookup_keys, source_version
+
+# Bump when the layout changes so old snapshots are ignored.
+COMPACT_FORMAT = 1
+
+# abspath -> (stat key, catalog)
+_COMPACT_CACHE: Dict[str, Tuple[Tuple[int, int], "CompactCatalog"]] = {}
+_COMPACT_LOCK = threading.Lock()
+
+
+def compact_path(csv_path: str) -> str:
+    """Lookup snapshot written next to the CSV, e.g. properties.lookup.pkl."""
+    return os.path.splitext(csv_path)[0] + ".lookup.pkl"
+
+
+class CompactIndex(PropertyIndex):
+    """``PropertyIndex`` over a ``CompactCatalog``: same rules, plain-dict rows.
+
+    Only the exact id/name maps are built up front; the word postings that
+    substring matches need are built by the first query that gets that far.
+    """
+
+    def __init__(self, catalog: "CompactCatalog"):
+        self._build_exact(catalog, catalog.keys["listing_id"], catalog.keys["property_name"])
+        self._words_lock = threading.Lock()
+        self._words_built = False
+
+    def _ensure_words(self) -> None:
+        if not self._words_built:
+            with self._words_lock:
+                if not self._words_built:
+                    self._build_words()
+                    self._words_built = True
+
+    def match(self, query: str) -> Optional[Tuple[int, int]]:
+        if query:
+            exact = self._match_exact(str(query).strip())
+            if exact is not None:
+                return exact
+        self._ensure_words()
+        return super().match(query)
+
+    def positions_containing(self, text: str) -> List[int]:
+        self._ensure_words()
+        return super().positions_containing(text)
+
+    def record(self, pos: int) -> Dict[str, Any]:
+        return self.df.record(pos)
+
+
+class CompactCatalog:
+    """The properties table as per-column lists, with a lazily built index.
+
+    ``attrs`` mirrors the frame's, so ``dataset_version`` (and the reply
+    cache keyed on it) treats a catalog and its frame as the same data.
+    """
+
+    def __init__(self, columns: List[str], data: List[list], keys: Dict[str, list], attrs: Dict[str, Any]):
+        self.columns = columns
+        self._data = data
+        self.keys = keys
+        self.attrs = attrs
+        self._index: Optional[CompactIndex] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data[0]) if self._data else 0
+
+    def record(self, pos: int) -> Dict[str, Any]:
+        return {col: values[pos] for col, values in zip(self.columns, self._data)}
+
+    @property
+    def index(self) -> CompactIndex:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = CompactIndex(self)
+        return self._index
+
+
+def _read_header(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "rb") as fh:
+            header = pickle.load(fh)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    return header if isinstance(header, dict) and header.get("format") == COMPACT_FORMAT else None
+
+
+def write_compact_catalog(csv_path: str, source_key: Tuple[int, int], df) -> None:
+    """Write the lookup snapshot of ``df`` (loaded from ``csv_path`` at
+    ``source_key``) unless a current one exists; a read-only dir skips it."""
+    path = compact_path(csv_path)
+    header = _read_header(path)
+    if header is not None and tuple(header["source"]) == source_key:
+        return
+    keys = lookup_keys(df)
+    payload = {
+        "columns": list(df.columns),
+        "data": [df[col].astype(object).where(df[col].notna(), None).tolist() for col in df.columns],
+        "keys": {col: keys[col].tolist() if col in keys else [None] * len(df) for col in ("listing_id", "property_name")},
+    }
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as fh:
+            pickle.dump({"format": COMPACT_FORMAT, "source": source_key, "rows": len(df)}, fh)
+            pickle.dump(payload, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+@metrics.timed("load_compact_catalog")
+def load_compact_catalog(path: Optional[str] = None) -> Optional[CompactCatalog]:
+    """The catalog of the CSV at ``path`` from its lookup snapshot, or None
+    if there is no snapshot for the CSV as it is now. Cached per process."""
+    csv_path = os.path.abspath(path if path is not None else PROPERTIES_FILE)
+    try:
+        source_key = _stat_key(csv_path)
+    except FileNotFoundError:
+        return None
+    cached = _COMPACT_CACHE.get(csv_path)
+    if cached is not None and cached[0] == source_key:
+        return cached[1]
+    with _COMPACT_LOCK:
+        cached = _COMPACT_CACHE.get(csv_path)
+        if cached is not None and cached[0] == source_key:
+            return cached[1]
+        try:
+            with open(compact_path(csv_path), "rb") as fh:
+                header = pickle.load(fh)
+                if (not isinstance(header, dict) or header.get("format") != COMPACT_FORMAT
+                        or tuple(header.get("source", ())) != source_key):
+                    return None
+                payload = pickle.load(fh)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        attrs = {"dataset_version": source_version(source_key), "source_path": csv_path}
+        catalog = CompactCatalog(payload["columns"], payload["data"], payload["keys"], attrs)
+        _COMPACT_CACHE[csv_path] = (source_key, catalog)
+        return catalog
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from helpers import load_properties
+
+    args = sys.argv[1:] if argv is None else argv
+    csv_path = os.path.abspath(args[0] if args else PROPERTIES_FILE)
+    df = load_properties(csv_path)
+    write_compact_catalog(csv_path, _stat_key(csv_path), df)
+    print(f"lookup snapshot: {len(df)} rows -> {compact_path(csv_path)}")
+
+
+if __name__ == "__main__":
+    main()
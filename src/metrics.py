@@ -0,0 +1,377 @@
+"""Lightweight in-process metrics: counters, latency histograms and spans.
+
+Instrumentation is off unless ``METRICS_ENABLED=1`` (or ``enable()`` is
+called); while off, ``timed`` wrappers and ``span`` cost one global lookup
+and record nothing. Counters on rare paths (fallbacks, rewrites) always count. Export with ``render_prometheus()``
+(Prometheus text format) or ``snapshot()`` (JSON-friendly dict).
+
+Setting ``PROFILE_SLOW_MS`` turns on a sampling profiler for code run inside
+``profile()``: a background thread samples the request's stack every
+``PROFILE_INTERVAL_MS`` and, if the request took longer than the threshold,
+writes the samples as folded stacks (``frame;frame;frame count``) to
+``PROFILE_DIR`` for flamegraph.pl or speedscope.
+"""
+import functools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_enabled = os.getenv("METRICS_ENABLED", "0").lower() in ("1", "true", "yes")
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: Iterable[Tuple[str, str]]) -> str:
+    pairs = list(key)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self) -> List[Tuple[str, tuple, float]]:
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def to_dict(self) -> Dict[str, float]:
+        return {_format_labels(key) or "": value for _, key, value in self.samples()}
+
+
+class Histogram:
+    """Latency histogram (seconds) with fixed cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        # label key -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += value
+
+    def count(self, **labels) -> int:
+        row = self._values.get(_label_key(labels))
+        return int(sum(row[:-1])) if row else 0
+
+    def samples(self) -> List[Tuple[str, tuple, float]]:
+        out = []
+        with self._lock:
+            rows = [(key, list(row)) for key, row in self._values.items()]
+        for key, row in rows:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                out.append((f"{self.name}_bucket", key + (("le", le),), cumulative))
+            out.append((f"{self.name}_sum", key, row[-1]))
+            out.append((f"{self.name}_count", key, cumulative))
+        return out
+
+    def to_dict(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            rows = [(key, list(row)) for key, row in self._values.items()]
+        result = {}
+        for key, row in rows:
+            count = int(sum(row[:-1]))
+            result[_format_labels(key) or ""] = {
+                "count": count,
+                "sum": row[-1],
+                "buckets": dict(zip([repr(b) for b in self.buckets] + ["+Inf"], row[:-1])),
+            }
+        return result
+
+
+_METRICS: Dict[str, object] = {}
+_COLLECTORS: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]] = []
+_registry_lock = threading.Lock()
+
+
+def counter(name: str, help_text: str) -> Counter:
+    """Return the registered counter ``name``, creating it on first use."""
+    with _registry_lock:
+        metric = _METRICS.get(name)
+        if metric is None:
+            metric = _METRICS[name] = Counter(name, help_text)
+        return metric
+
+
+def histogram(name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    """Return the registered histogram ``name``, creating it on first use."""
+    with _registry_lock:
+        metric = _METRICS.get(name)
+        if metric is None:
+            metric = _METRICS[name] = Histogram(name, help_text, buckets)
+        return metric
+
+
+def register_collector(collect: Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]) -> None:
+    """Add a callback read at export time.
+
+    It yields ``(name, kind, help, labels, value)`` tuples, for values that
+    are already counted elsewhere (cache hit counters, sizes) and so cost
+    nothing on the hot path.
+    """
+    _COLLECTORS.append(collect)
+
+
+def register_cache(name: str, cache) -> None:
+    """Export ``hits``/``misses``/size of a ``ResponseCache`` or an ``lru_cache`` function."""
+
+    def collect():
+        if hasattr(cache, "cache_info"):
+            info = cache.cache_info()
+            hits, misses, size = info.hits, info.misses, info.currsize
+        else:
+            hits, misses, size = cache.hits, cache.misses, len(cache)
+        labels = {"cache": name}
+        yield "cache_hits_total", "counter", "Cache lookups answered from the cache", labels, hits
+        yield "cache_misses_total", "counter", "Cache lookups that missed", labels, misses
+        yield "cache_entries", "gauge", "Entries currently cached", labels, size
+
+    register_collector(collect)
+
+
+def reset() -> None:
+    """Zero every registered metric (collectors are left alone)."""
+    with _registry_lock:
+        for metric in _METRICS.values():
+            with metric._lock:
+                metric._values.clear()
+
+
+SPAN_SECONDS = histogram("span_seconds", "Time spent in instrumented functions")
+CACHE_HITS = counter("cache_hits_total", "Cache lookups answered from the cache")
+CACHE_MISSES = counter("cache_misses_total", "Cache lookups that missed")
+
+
+def cache_lookup(name: str, hit: bool) -> None:
+    """Count a lookup in a cache that does not keep its own counters."""
+    if _enabled:
+        (CACHE_HITS if hit else CACHE_MISSES).inc(cache=name)
+
+
+@contextmanager
+def span(name: str):
+    """Time the enclosed block into ``span_seconds{span=name}``."""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_SECONDS.observe(time.perf_counter() - start, span=name)
+
+
+def timed(name: Optional[str] = None):
+    """Decorator form of ``span``; the span defaults to the function name."""
+
+    def decorate(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                SPAN_SECONDS.observe(time.perf_counter() - start, span=label)
+
+        return wrapper
+
+    return decorate
+
+
+def _collected():
+    for collect in list(_COLLECTORS):
+        yield from collect()
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    families: Dict[str, List] = {}
+    with _registry_lock:
+        metrics = list(_METRICS.values())
+    for metric in metrics:
+        samples = metric.samples()
+        if samples:
+            families[metric.name] = [metric.kind, metric.help, samples]
+    # Collected values may share a name with a registered counter (e.g.
+    # cache_hits_total), so they are merged into one family.
+    for name, kind, help_text, labels, value in _collected():
+        family = families.setdefault(name, [kind, help_text, []])
+        family[2].append((name, _label_key(labels), value))
+    lines = []
+    for name, (kind, help_text, samples) in families.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f"{sample}{_format_labels(key)} {value}" for sample, key, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> Dict[str, object]:
+    """All metrics as a JSON-serialisable dict."""
+    with _registry_lock:
+        metrics = list(_METRICS.values())
+    result: Dict[str, object] = {"pid": os.getpid(), "enabled": _enabled, "time": time.time()}
+    for metric in metrics:
+        values = metric.to_dict()
+        if values:
+            result[metric.name] = values
+    for name, _kind, _help, labels, value in _collected():
+        result.setdefault(name, {})[_format_labels(_label_key(labels))] = value
+    return result
+
+
+# ---------------- Sampling profiler ---------------- #
+class SlowRequestProfiler:
+    """Samples the stacks of threads inside ``profile()`` and keeps slow ones.
+
+    One daemon thread serves all requests; it only runs while at least one
+    profiled request is active.
+    """
+
+    def __init__(self, threshold: float, interval: float = 0.005, directory: Optional[str] = None):
+        self.threshold = threshold
+        self.interval = interval
+        self.directory = directory or os.path.join(os.path.dirname(__file__), "..", "data", "profiles")
+        self._active: Dict[int, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _fold(frame) -> str:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                if not self._active:
+                    self._wake.clear()
+                    continue
+                for thread_id, samples in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stack = self._fold(frame)
+                        samples[stack] = samples.get(stack, 0) + 1
+
+    @contextmanager
+    def profile(self, name: str):
+        thread_id = threading.get_ident()
+        samples: Dict[str, int] = {}
+        with self._lock:
+            self._active[thread_id] = samples
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._active.pop(thread_id, None)
+            if elapsed >= self.threshold and samples:
+                self.dump(name, elapsed, samples)
+
+    def dump(self, name: str, elapsed: float, samples: Dict[str, int]) -> Optional[str]:
+        safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
+        path = os.path.join(self.directory, f"{safe_name}-{int(time.time() * 1000)}-{os.getpid()}-{int(elapsed * 1000)}ms.folded")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as fh:
+                fh.writelines(f"{stack} {count}\n" for stack, count in samples.items())
+        except OSError:
+            return None
+        SLOW_PROFILES.inc(name=name)
+        return path
+
+
+SLOW_PROFILES = counter("slow_request_profiles_total", "Slow requests whose stacks were dumped")
+
+_profiler: Optional[SlowRequestProfiler] = None
+if os.getenv("PROFILE_SLOW_MS"):
+    _profiler = SlowRequestProfiler(
+        threshold=float(os.getenv("PROFILE_SLOW_MS")) / 1000,
+        interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000,
+        directory=os.getenv("PROFILE_DIR") or None,
+    )
+
+
+def set_profiler(profiler: Optional[SlowRequestProfiler]) -> None:
+    global _profiler
+    _profiler = profiler
+
+
+@contextmanager
+def profile(name: str):
+    """Sample the enclosed request if the slow-request profiler is on."""
+    if _profiler is None:
+        yield
+        return
+    with _profiler.profile(name):
+        yield
@@ -0,0 +1,234 @@
+"""Structured property filters parsed out of chat messages.
+
+``parse_query`` turns a message like "2 BHK in Dubai under 300k" into
+``Constraints`` (bedrooms, city, property type, availability, price and
+area ranges, a sort order). ``Constraints.plan`` compiles them into the
+keyword arguments of ``FacetIndex.filter``, the same category bitmaps,
+range masks and precomputed sort permutations behind the grid's Filters &
+Sorting panel, so the chat answers with the top few rows of a filtered
+permutation instead of formatting the whole catalog.
+
+City, type and availability words come from the loaded data (plurals
+allowed: "villas"); numbers take ``k``/``m``/``lakh``/``cr`` suffixes and
+are read as area when followed by a unit ("over 1500 sqft").
+"""
+import math
+import re
+from functools import lru_cache
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from facets import get_facet_index
+from intents import ENTITY_STOPWORDS, WORD_RE
+
+Range = Tuple[float, float]
+
+DEFAULT_SORT = "Price (low→high)"
+
+# Words that connect constraints ("2 bhk *in* dubai *under* 300k") and say
+# nothing about which property is meant.
+QUERY_STOPWORDS = ENTITY_STOPWORDS | frozenset([
+    "and", "or", "with", "any", "all", "some", "which", "that", "want", "need", "looking", "list", "give",
+    "options", "listings", "listing", "property", "properties", "homes", "home", "units", "unit", "budget",
+    "around", "only", "have", "you", "do", "can", "get", "find", "under", "over", "than", "between",
+])
+
+# Other names for property types, used when the type exists in the data.
+TYPE_SYNONYMS = {"flat": "apartment", "flats": "apartment", "condo": "apartment", "condos": "apartment",
+                 "bungalow": "villa", "bungalows": "villa", "shop": "commercial", "shops": "commercial"}
+
+MULTIPLIERS = {"k": 1e3, "thousand": 1e3, "m": 1e6, "mn": 1e6, "million": 1e6, "lakh": 1e5, "lakhs": 1e5,
+               "lac": 1e5, "lacs": 1e5, "cr": 1e7, "crore": 1e7, "crores": 1e7}
+
+_NUMBER = r"(?<![\w.,])\$?\s*(\d+(?:,\d{2,3})*(?:\.\d+)?)\s*"
+_SUFFIX = "(" + "|".join(sorted(MULTIPLIERS, key=len, reverse=True)) + ")"
+_AMOUNT = _NUMBER + _SUFFIX + r"?\b"
+_SUFFIXED = _NUMBER + _SUFFIX + r"\b"
+_SPAN = r"\s*(?:-|to)\s*"
+_AREA_UNIT = r"\s*(?:sq\.?\s*ft|sqft|sft|square\s+f(?:ee|oo)t)\b"
+_BELOW = r"(?:\b(?:under|below|less\s+than|cheaper\s+than|smaller\s+than|up\s*to|within|max(?:imum)?|at\s+most)|<=?)\s*"
+_ABOVE = r"(?:\b(?:over|above|more\s+than|bigger\s+than|larger\s+than|at\s+least|min(?:imum)?|from)|>=?)\s*"
+_BETWEEN = r"\b(?:between|from)\s+" + _AMOUNT + r"\s*(?:and|to|-)\s*" + _AMOUNT
+
+# (pattern, kind), most specific first. Area needs its unit; a bare price
+# range needs a suffix ("300k-500k"), so "2-3" alone never becomes a price.
+AREA_PATTERNS = [(re.compile(p), kind) for p, kind in [
+    (_BETWEEN + _AREA_UNIT, "between"),
+    (_AMOUNT + _SPAN + _AMOUNT + _AREA_UNIT, "between"),
+    (_BELOW + _AMOUNT + _AREA_UNIT, "below"),
+    (_ABOVE + _AMOUNT + _AREA_UNIT, "above"),
+    (_AMOUNT + r"\s*\+" + _AREA_UNIT, "above"),
+]]
+PRICE_PATTERNS = [(re.compile(p), kind) for p, kind in [
+    (_BETWEEN, "between"),
+    (_SUFFIXED + _SPAN + _AMOUNT, "between"),
+    (_BELOW + _AMOUNT, "below"),
+    (_ABOVE + _AMOUNT, "above"),
+    (_SUFFIXED + r"\s*\+", "above"),
+]]
+
+BEDROOMS_RE = re.compile(
+    r"(?:(at\s+least|min(?:imum)?|over|more\s+than)\s+|(up\s*to|at\s+most|max(?:imum)?|under|less\s+than)\s+)?"
+    r"\b(\d+)(?:\s*(?:-|to|or)\s*(\d+))?\s*(\+|\s*or\s+more)?\s*(?:bhk|bed(?:room)?s?|br|bd)\b"
+)
+
+# (pattern, sort option); the first hint in this list wins.
+SORT_HINTS = [
+    (re.compile(r"\b(?:most\s+expensive|priciest|luxury|premium|highest\s+price)\b"), "Price (high→low)"),
+    (re.compile(r"\b(?:cheapest|cheaper|least\s+expensive|lowest\s+price|affordable)\b"), "Price (low→high)"),
+    (re.compile(r"\b(?:largest|biggest|most\s+spacious|spacious)\b"), "Area (high→low)"),
+    (re.compile(r"\bmost\s+bed(?:room)?s\b"), "Bedrooms (high→low)"),
+]
+
+
+class Constraints(NamedTuple):
+    city: str = "All"
+    property_type: str = "All"
+    availability: str = "All"
+    # Inclusive (low, high) ranges; an open end is +-inf.
+    bedrooms: Optional[Range] = None
+    price: Optional[Range] = None
+    area: Optional[Range] = None
+    sort_by: Optional[str] = None
+    # Words of the message no constraint used, e.g. part of a property name.
+    rest: str = ""
+
+    @property
+    def active(self) -> bool:
+        """True if the message asked for anything the filters can answer."""
+        return (self.city, self.property_type, self.availability) != ("All", "All", "All") or any(
+            value is not None for value in (self.bedrooms, self.price, self.area, self.sort_by))
+
+    def plan(self) -> Dict[str, Any]:
+        """Keyword arguments of ``FacetIndex.filter`` for these constraints."""
+        return {"city": self.city, "property_type": self.property_type, "price": self.price,
+                "sort_by": self.sort_by or DEFAULT_SORT, "bedrooms": self.bedrooms, "area": self.area,
+                "availability": self.availability}
+
+    def describe(self) -> str:
+        """Short human summary, e.g. "2 BHK · Villa · in Dubai · price up to 300,000"."""
+        parts = []
+        if self.bedrooms is not None:
+            parts.append(_range_text(self.bedrooms, "", " BHK"))
+        if self.property_type != "All":
+            parts.append(self.property_type)
+        if self.city != "All":
+            parts.append(f"in {self.city}")
+        if self.availability != "All":
+            parts.append(self.availability)
+        if self.price is not None:
+            parts.append(_range_text(self.price, "price "))
+        if self.area is not None:
+            parts.append(_range_text(self.area, "area ", " sqft"))
+        return " · ".join(parts) or "your search"
+
+
+def _range_text(bounds: Range, label: str = "", unit: str = "") -> str:
+    low, high = bounds
+    if low == high:
+        return f"{label}{low:,.0f}{unit}"
+    if math.isinf(high):
+        return f"{label}{low:,.0f}+{unit}" if unit == " BHK" else f"{label}from {low:,.0f}{unit}"
+    if low <= 0:
+        return f"{label}up to {high:,.0f}{unit}"
+    return f"{label}{low:,.0f}–{high:,.0f}{unit}"
+
+
+def _amount(number: str, suffix: Optional[str]) -> float:
+    return float(number.replace(",", "")) * MULTIPLIERS.get(suffix or "", 1.0)
+
+
+def _to_range(kind: str, groups: Sequence[Optional[str]]) -> Range:
+    if kind == "between":
+        low, high = sorted((_amount(groups[0], groups[1] or groups[3]), _amount(groups[2], groups[3])))
+        return low, high
+    value = _amount(groups[0], groups[1])
+    return (0.0, value) if kind == "below" else (value, math.inf)
+
+
+def _take_range(text: str, patterns) -> Tuple[Optional[Range], str]:
+    """First range any of ``patterns`` finds in ``text``, and ``text`` with it blanked out."""
+    for pattern, kind in patterns:
+        match = pattern.search(text)
+        if match:
+            return _to_range(kind, match.groups()), text[:match.start()] + " " + text[match.end():]
+    return None, text
+
+
+def _take_bedrooms(text: str) -> Tuple[Optional[Range], str]:
+    match = BEDROOMS_RE.search(text)
+    if not match:
+        return None, text
+    at_least, at_most, first, second, plus = match.groups()
+    low = float(first)
+    if second is not None:
+        bounds = tuple(sorted((low, float(second))))
+    elif at_least or plus:
+        bounds = (low + 1 if at_least and " ".join(at_least.split()) in ("over", "more than") else low, math.inf)
+    elif at_most:
+        bounds = (0.0, low - 1 if " ".join(at_most.split()) in ("under", "less than") else low)
+    else:
+        bounds = (low, low)
+    return bounds, text[:match.start()] + " " + text[match.end():]
+
+
+@lru_cache(maxsize=64)
+def _vocabulary(values: Tuple[str, ...]) -> Tuple[Optional["re.Pattern"], Dict[str, str]]:
+    """Whole-word matcher for ``values`` (singular or plural) and lowercase -> value."""
+    lookup = {str(v).lower(): v for v in values if str(v).strip()}
+    if not lookup:
+        return None, lookup
+    words = sorted(lookup, key=len, reverse=True)
+    return re.compile(r"\b(" + "|".join(re.escape(w) for w in words) + r")(?:e?s)?\b"), lookup
+
+
+def _take_word(text: str, values: Sequence[str], synonyms: Optional[Dict[str, str]] = None) -> Tuple[str, str]:
+    """First of ``values`` named in ``text`` ("All" if none), and ``text`` without it."""
+    pattern, lookup = _vocabulary(tuple(values))
+    if pattern is not None:
+        match = pattern.search(text)
+        if match:
+            return lookup[match.group(1)], text[:match.start()] + " " + text[match.end():]
+    for word, target in (synonyms or {}).items():
+        if target in lookup:
+            match = re.search(rf"\b{word}\b", text)
+            if match:
+                return lookup[target], text[:match.start()] + " " + text[match.end():]
+    return "All", text
+
+
+def parse_query(text: str, facets) -> Constraints:
+    """Constraints named in ``text`` (lowercased) for the data behind ``facets``.
+
+    Quantities with a unit are taken first (bedrooms, then area), so the
+    price comparators only see the numbers left over.
+    """
+    text = text.lower()
+    sort_by = None
+    for pattern, option in SORT_HINTS:
+        match = pattern.search(text)
+        if match:
+            sort_by = option
+            text = text[:match.start()] + " " + text[match.end():]
+            break
+    bedrooms, text = _take_bedrooms(text)
+    area, text = _take_range(text, AREA_PATTERNS)
+    price, text = _take_range(text, PRICE_PATTERNS)
+    availability, text = _take_word(text, facets.availabilities)
+    city, text = _take_word(text, facets.cities)
+    property_type, text = _take_word(text, facets.types, TYPE_SYNONYMS)
+    rest = " ".join(w for w in WORD_RE.findall(text) if w not in QUERY_STOPWORDS and not w.isdigit())
+    return Constraints(city, property_type, availability, bedrooms, price, area, sort_by, rest)
+
+
+def run_query(df, constraints: Constraints) -> np.ndarray:
+    """Row positions of ``df`` matching ``constraints``, best first."""
+    return get_facet_index(df).filter(**constraints.plan())
+
+
+def allowed_rows(df, constraints: Constraints) -> np.ndarray:
+    """Boolean row mask of ``run_query``, e.g. to restrict a text search."""
+    mask = np.zeros(len(df), dtype=bool)
+    mask[run_query(df, constraints)] = True
+    return mask
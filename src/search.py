@@ -0,0 +1,235 @@
+"""Typo-tolerant property search over character trigrams."""
+import re
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD_RE.findall((text or "").lower())
+
+
+def trigrams(word: str) -> List[str]:
+    """Distinct trigrams of ``word`` padded like pg_trgm ("  w", " wo", ..., "rd ")."""
+    padded = f"  {word} "
+    return list(dict.fromkeys(padded[i:i + 3] for i in range(len(padded) - 2)))
+
+
+class SearchHit(NamedTuple):
+    position: int
+    score: float
+    # Share of the query words that matched a word of the row (trigram search).
+    coverage: float = 1.0
+
+
+class TrigramIndex:
+    """Ranks properties by trigram similarity between query and name words.
+
+    Query words are matched against the distinct token vocabulary (Jaccard
+    over padded trigrams), so misspellings still find their token. A row
+    scores ``2 * sum(best word similarity) / (query words + row words)``,
+    i.e. 1.0 for an exact name. Only rows posted under the matched tokens are
+    considered, rarest word first, and at most ``max_candidates`` of them are
+    scored, so a query never walks the whole catalog.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        fields: Sequence[str] = ("property_name",),
+        word_threshold: float = 0.3,
+        max_candidates: int = 1000,
+        max_row_tokens: int = 16,
+    ):
+        self.df = df
+        self.fields = tuple(fields)
+        self.word_threshold = word_threshold
+        self.max_candidates = max_candidates
+        self.max_row_tokens = max_row_tokens
+
+        self._token_ids: Dict[str, int] = {}
+        row_tokens = self._tokenize_rows(df, np.arange(len(df)))
+        self.vocabulary = list(self._token_ids)
+
+        # Padded row -> token id matrix (-1 = no token) and per-row word counts.
+        width = max((len(r) for r in row_tokens), default=0) or 1
+        self._row_tok = np.full((len(row_tokens), width), -1, dtype=np.int32)
+        self._row_len = np.zeros(len(row_tokens), dtype=np.int32)
+        for pos, ids in enumerate(row_tokens):
+            self._row_tok[pos, :len(ids)] = ids
+            self._row_len[pos] = len(ids)
+        self._build_postings()
+
+        # Trigram -> token ids, for resolving (misspelled) query words.
+        gram_tokens: Dict[str, List[int]] = defaultdict(list)
+        gram_counts = np.zeros(len(self.vocabulary), dtype=np.int32)
+        for token, tid in self._token_ids.items():
+            grams = trigrams(token)
+            gram_counts[tid] = len(grams)
+            for gram in grams:
+                gram_tokens[gram].append(tid)
+        self._gram_tokens = {g: np.array(ids, dtype=np.int32) for g, ids in gram_tokens.items()}
+        self._gram_counts = gram_counts
+        self.similar_tokens = lru_cache(maxsize=4096)(self._similar_tokens)
+
+    def _tokenize_rows(self, df: pd.DataFrame, positions: np.ndarray) -> List[List[int]]:
+        """Token ids of the given rows, adding unseen tokens to ``_token_ids``."""
+        token_ids = self._token_ids
+        columns = [df[f].iloc[positions].tolist() for f in self.fields if f in df.columns]
+        if not columns:
+            return [[] for _ in positions]
+        row_tokens = []
+        for values in zip(*columns):
+            text = " ".join(v for v in values if isinstance(v, str))
+            ids = list(dict.fromkeys(token_ids.setdefault(t, len(token_ids)) for t in tokenize(text)))
+            row_tokens.append(ids[:self.max_row_tokens])
+        return row_tokens
+
+    def _build_postings(self) -> None:
+        # CSR postings: rows of token t are _post_rows[_post_ptr[t]:_post_ptr[t + 1]], ascending.
+        rows, width = self._row_tok.shape
+        flat_tok = self._row_tok.ravel()
+        flat_row = np.repeat(np.arange(rows, dtype=np.int32), width)
+        keep = flat_tok >= 0
+        flat_tok, flat_row = flat_tok[keep], flat_row[keep]
+        order = np.argsort(flat_tok, kind="stable")
+        self._post_rows = flat_row[order]
+        self._post_ptr = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(flat_tok, minlength=len(self.vocabulary)), out=self._post_ptr[1:])
+
+    def updated(self, df: pd.DataFrame, delta) -> "TrigramIndex":
+        """Index for ``df``, a reload of this index's frame (see ``helpers.reload_frame``).
+
+        Only re-parsed rows are tokenized; surviving rows keep their token
+        ids and the postings are rebuilt from the row matrix with NumPy.
+        Tokens whose rows all went away stay in the vocabulary with no rows.
+        """
+        m = delta.old_to_new
+        kept = np.flatnonzero(m >= 0)
+        index = TrigramIndex.__new__(TrigramIndex)
+        index.df = df
+        index.fields = self.fields
+        index.word_threshold = self.word_threshold
+        index.max_candidates = self.max_candidates
+        index.max_row_tokens = self.max_row_tokens
+        index._token_ids = dict(self._token_ids)
+        fresh_tokens = index._tokenize_rows(df, delta.fresh)
+        index.vocabulary = self.vocabulary + list(index._token_ids)[len(self.vocabulary):]
+
+        old_width = self._row_tok.shape[1]
+        width = max([old_width] + [len(ids) for ids in fresh_tokens])
+        index._row_tok = np.full((len(df), width), -1, dtype=np.int32)
+        index._row_tok[m[kept], :old_width] = self._row_tok[kept]
+        index._row_len = np.zeros(len(df), dtype=np.int32)
+        index._row_len[m[kept]] = self._row_len[kept]
+        for pos, ids in zip(delta.fresh.tolist(), fresh_tokens):
+            index._row_tok[pos, :len(ids)] = ids
+            index._row_len[pos] = len(ids)
+        index._build_postings()
+
+        index._gram_tokens = dict(self._gram_tokens)
+        new_counts = []
+        for tid in range(len(self.vocabulary), len(index.vocabulary)):
+            grams = trigrams(index.vocabulary[tid])
+            new_counts.append(len(grams))
+            for gram in grams:
+                previous = index._gram_tokens.get(gram)
+                added = np.array([tid], dtype=np.int32)
+                index._gram_tokens[gram] = added if previous is None else np.concatenate([previous, added])
+        index._gram_counts = np.concatenate([self._gram_counts, np.array(new_counts, dtype=np.int32)])
+        index.similar_tokens = lru_cache(maxsize=4096)(index._similar_tokens)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._row_len)
+
+    def _similar_tokens(self, word: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Sorted ids of vocabulary tokens similar to ``word``, and their scores."""
+        grams = trigrams(word)
+        postings = [self._gram_tokens[g] for g in grams if g in self._gram_tokens]
+        if not postings:
+            return np.empty(0, dtype=np.int32), np.empty(0)
+        ids, shared = np.unique(np.concatenate(postings), return_counts=True)
+        scores = shared / (len(grams) + self._gram_counts[ids] - shared)
+        keep = scores >= self.word_threshold
+        return ids[keep], scores[keep]
+
+    def _candidates(self, matched) -> np.ndarray:
+        """Up to ``max_candidates`` distinct rows, best tokens of rarest words first."""
+        chunks, remaining = [], self.max_candidates
+        for _rows, ids, scores in matched:
+            ordered = ids[np.argsort(-scores, kind="stable")]
+            starts = self._post_ptr[ordered]
+            lengths = self._post_ptr[ordered + 1] - starts
+            # Only the tokens needed to fill the remaining budget.
+            used = int(np.searchsorted(np.cumsum(lengths), remaining)) + 1
+            starts, lengths = starts[:used], lengths[:used]
+            offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+            rows = self._post_rows[offsets + np.arange(len(offsets))][:remaining]
+            chunks.append(rows)
+            remaining -= len(rows)
+            if remaining <= 0:
+                break
+        return np.unique(np.concatenate(chunks))
+
+    @metrics.timed("trigram_search")
+    def search(self, query: str, k: int = 5) -> List[SearchHit]:
+        """Top ``k`` rows for ``query``, best first (ties keep catalog order)."""
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words:
+            return []
+        matched = []
+        for word in words:
+            ids, scores = self.similar_tokens(word)
+            if len(ids):
+                rows = int((self._post_ptr[ids + 1] - self._post_ptr[ids]).sum())
+                matched.append((rows, ids, scores))
+        if not matched:
+            return []
+        matched.sort(key=lambda m: m[0])
+        candidates = self._candidates(matched)
+
+        tokens = self._row_tok[candidates]
+        total = np.zeros(len(candidates))
+        hit_words = np.zeros(len(candidates))
+        for _rows, ids, scores in matched:
+            at = np.minimum(np.searchsorted(ids, tokens), len(ids) - 1)
+            best_word = np.where(ids[at] == tokens, scores[at], 0.0).max(axis=1)
+            total += best_word
+            hit_words += best_word > 0
+        score = 2 * total / (len(words) + self._row_len[candidates])
+        coverage = hit_words / len(words)
+        best = np.lexsort((candidates, -score))[:k]
+        return [SearchHit(int(candidates[i]), float(score[i]), float(coverage[i])) for i in best]
+
+    def records(self, hits: List[SearchHit]) -> List[Dict]:
+        return [dict(self.df.iloc[h.position].to_dict(), score=h.score) for h in hits]
+
+
+def is_confident(hits: List[SearchHit], min_score: float = 0.45, sure_score: float = 0.8, margin: float = 0.15) -> bool:
+    """Whether the top hit is clear enough to answer without offering choices.
+
+    Every query word must match a word of the top hit's name, so a query
+    that only half-matches ("Sunrise Towers") gets suggestions instead.
+    """
+    if not hits or hits[0].score < min_score or hits[0].coverage < 1:
+        return False
+    if hits[0].score >= sure_score or len(hits) == 1:
+        return True
+    return hits[0].score - hits[1].score >= margin
+
+
+def get_trigram_index(df: pd.DataFrame) -> TrigramIndex:
+    """Return the TrigramIndex for ``df``, building it on first use."""
+    index: Optional[TrigramIndex] = getattr(df, "_trigram_index", None)
+    if index is None:
+        index = TrigramIndex(df)
+        object.__setattr__(df, "_trigram_index", index)
+    return index
@@ -0,0 +1,298 @@
+"""Asyncio HTTP API in front of the headless ChatEngine.
+
+    python src/server.py --port 8080 --workers 4 --sessions data/sessions.db
+
+Endpoints:
+
+* ``POST /chat`` with ``{"message": "...", "session_id": "...", "quick_action": false}``
+  returns ``{"session_id", "reply", "actions", "cards", "state"}``. Omit ``session_id``
+  to start a new session.
+* ``GET /health`` returns ``{"status": "ok"}``.
+* ``GET /metrics`` returns this worker's metrics in Prometheus text format,
+  ``GET /metrics.json`` the same as JSON (see ``metrics.py``).
+
+Each worker process runs one event loop serving many connections (HTTP/1.1
+keep-alive). With ``--workers`` > 1 the workers share one listening socket
+and session state goes through a shared SQLite store. Each worker checks
+properties.csv every ``--watch`` seconds and reloads it incrementally.
+With ``--fast-startup`` (or ``FAST_STARTUP=1``) workers answer id/name
+lookups from the compact catalog and import pandas only for the first
+message that needs the full frame; until then their properties.csv
+watcher only stats the file. With ``--shards N`` (or
+``PROPERTIES_SHARDS=N``) each worker starts a ``ShardedCatalog`` of N
+processes of its own (``--workers W`` runs W x N shard processes; ``auto``
+splits the cores between the workers) and answers lookups, filters and
+searches through it; the shards
+are built once at startup, so restart the server to pick up CSV changes.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+import metrics
+from engine import ChatEngine, MemorySessionStore, SessionStore, SQLiteSessionStore
+from helpers import PropertiesWatcher
+
+MAX_BODY = 64 * 1024
+HTTP_REQUESTS = metrics.counter("http_requests_total", "HTTP requests served, by path and status")
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           500: "Internal Server Error"}
+
+log = logging.getLogger(__name__)
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ChatServer:
+    """Minimal HTTP/1.1 server; engine turns run on a small thread pool so
+    slow steps (LLM polish, SQLite) never block the event loop."""
+
+    def __init__(self, engine: ChatEngine, store: SessionStore, threads: int = 8):
+        self.engine = engine
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="chat")
+        self._session_locks: Dict[str, asyncio.Lock] = {}
+        self._connections: set = set()
+
+    def chat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        message = payload.get("message")
+        if not isinstance(message, str):
+            raise HTTPError(400, "'message' must be a string")
+        session_id = payload.get("session_id") or SessionStore.new_id()
+        turn = self.engine.handle(self.store.get(session_id), message, quick_action=bool(payload.get("quick_action")))
+        self.store.put(session_id, turn.state)
+        return {"session_id": session_id, "reply": turn.reply, "actions": turn.actions, "cards": list(turn.cards),
+                "state": turn.state}
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Any]:
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/metrics":
+            return 200, metrics.render_prometheus()
+        if path == "/metrics.json":
+            return 200, metrics.snapshot()
+        if path != "/chat":
+            raise HTTPError(404, f"no route for {path}")
+        if method != "POST":
+            raise HTTPError(405, "use POST")
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "body must be JSON")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "body must be a JSON object")
+        session_id = payload.get("session_id")
+        if session_id is not None and not isinstance(session_id, str):
+            raise HTTPError(400, "'session_id' must be a string")
+        loop = asyncio.get_running_loop()
+        if not session_id:
+            return 200, await loop.run_in_executor(self._executor, self.chat, payload)
+        # Turns of one session run one at a time (within this worker).
+        lock = self._session_locks.setdefault(session_id, asyncio.Lock())
+        try:
+            async with lock:
+                return 200, await loop.run_in_executor(self._executor, self.chat, payload)
+        finally:
+            if not lock.locked() and not getattr(lock, "_waiters", None):
+                self._session_locks.pop(session_id, None)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as exc:
+                    # The rest of the request can't be trusted: answer and hang up.
+                    self._write_response(writer, exc.status, {"error": str(exc)}, keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                try:
+                    status, payload = await self.dispatch(method, path, body)
+                except HTTPError as exc:
+                    status, payload = exc.status, {"error": str(exc)}
+                except Exception:
+                    log.exception("error handling %s %s", method, path)
+                    status, payload = 500, {"error": "internal server error"}
+                if metrics.is_enabled():
+                    HTTP_REQUESTS.inc(path=path if status != 404 else "other", status=status)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    @staticmethod
+    async def _readline(reader: asyncio.StreamReader) -> bytes:
+        try:
+            return await reader.readline()
+        except ValueError:  # longer than the stream limit
+            raise HTTPError(413, "request line or header too long")
+
+    @classmethod
+    async def _read_request(cls, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        line = await cls._readline(reader)
+        if not line:
+            return None
+        try:
+            method, target, _version = line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "bad request line")
+        headers: Dict[str, str] = {}
+        while True:
+            header = await cls._readline(reader)
+            if header in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = header.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HTTPError(400, "bad Content-Length")
+        if length < 0:
+            raise HTTPError(400, "bad Content-Length")
+        if length > MAX_BODY:
+            raise HTTPError(413, "body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: int, payload: Any, keep_alive: bool) -> None:
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json"
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\n"
+            f"Content-Type: {content_type}; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+
+    async def serve(self, sock: socket.socket) -> None:
+        server = await asyncio.start_server(self.handle_connection, sock=sock, limit=MAX_BODY)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            # Idle keep-alive connections would otherwise outlive the server.
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+
+
+def make_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.setblocking(False)
+    return sock
+
+
+def shard_count(value: str, workers: int) -> int:
+    """Shard processes per worker for ``--shards``: a count, or ``auto`` for
+    an equal share of the cores, so all workers together use about one
+    process per core."""
+    if value == "auto":
+        return max(1, (os.cpu_count() or 1) // max(workers, 1))
+    count = int(value)
+    if count < 0:
+        raise ValueError(f"--shards must be 'auto' or >= 0, not {value!r}")
+    return count
+
+
+def run_worker(sock: socket.socket, sessions: Optional[str], properties: Optional[str], watch: float = 0.0,
+               fast_startup: Optional[bool] = None, shards: int = 0, shard_by: str = "hash") -> None:
+    store = SQLiteSessionStore(sessions) if sessions else MemorySessionStore()
+    catalog = None
+    if shards > 0:
+        from shards import ShardedCatalog  # imports pandas; only for sharded workers
+
+        catalog = ShardedCatalog(properties, shards, shard_by).start()
+    engine = ChatEngine(properties_path=properties, fast_startup=fast_startup, catalog=catalog)
+    server = ChatServer(engine, store)
+    watcher = PropertiesWatcher(properties, watch, engine.fast_startup).start() if watch > 0 else None
+    try:
+        asyncio.run(server.serve(sock))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        if catalog is not None:
+            catalog.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Real estate chatbot HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes sharing the socket")
+    parser.add_argument("--sessions", help="SQLite session database (required to share sessions across workers)")
+    parser.add_argument("--properties", help="properties CSV (defaults to data/properties.csv)")
+    parser.add_argument("--watch", type=float, default=2.0,
+                        help="seconds between properties.csv change checks (0 disables background reloads)")
+    parser.add_argument("--fast-startup", action="store_true", default=None,
+                        help="answer id/name lookups from the compact catalog until the frame is needed")
+    parser.add_argument("--shards", metavar="N", default=os.getenv("PROPERTIES_SHARDS", "0"),
+                        help="shard processes per worker answering lookups, filters and search: --workers W runs "
+                             "W x N of them, each holding part of the catalog; 'auto' splits the cores between "
+                             "the workers (default 0: off)")
+    parser.add_argument("--shard-by", choices=["hash", "city"], default="hash", help="how rows are split over shards")
+    parser.add_argument("--no-metrics", action="store_true", help="serve /metrics without recording timings")
+    args = parser.parse_args()
+
+    if not args.no_metrics:
+        metrics.enable()
+    sessions = args.sessions
+    if args.workers > 1 and not hasattr(os, "fork"):
+        print("Multiple workers need fork(); falling back to a single worker")
+        args.workers = 1
+    if args.workers > 1 and not sessions:
+        sessions = os.path.join(os.path.dirname(__file__), "..", "data", "sessions.db")
+    try:
+        args.shards = shard_count(args.shards, args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    sock = make_socket(args.host, args.port)
+    print(f"Serving on http://{args.host}:{sock.getsockname()[1]} with {args.workers} worker(s)")
+    if args.workers <= 1:
+        run_worker(sock, sessions, args.properties, args.watch, args.fast_startup, args.shards, args.shard_by)
+        return
+    # Forked workers inherit the bound socket and the kernel spreads accepts.
+    ctx = multiprocessing.get_context("fork")
+    worker_args = (sock, sessions, args.properties, args.watch, args.fast_startup, args.shards, args.shard_by)
+    workers = [ctx.Process(target=run_worker, args=worker_args) for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+
+
+if __name__ == "__main__":
+    main()
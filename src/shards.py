@@ -0,0 +1,561 @@
+"""Optional sharded mode: the catalog split across worker processes.
+
+    python src/shards.py --shards 4 --by hash      # partition and query once
+
+``ShardedCatalog`` partitions properties.csv by a hash of ``listing_id`` or
+by ``city`` (whole cities, balanced by row count) over a pool of worker
+processes. Each worker streams the CSV once, keeps only its rows, and writes
+them as columnar files (``.npy`` per numeric/category column, one UTF-8 blob
+plus offsets per text column) under ``properties.shards/``. Numeric and
+category columns are then memory-mapped, so a restart on an unchanged CSV
+just maps the files again and no process ever holds the whole catalog.
+
+Catalogs started at the same time (one per server worker) share the files:
+each shard is built under a file lock and published by renaming a finished
+directory into place, and a catalog holds a shared lock on its layout's
+``in-use`` marker while it runs, so layouts of older CSV versions are only
+deleted once no catalog uses them.
+
+Queries are scattered to the shards and gathered with a merged ranking that
+matches what a single process would answer:
+
+* ``find`` (``find_property``): the lowest ``(rule, global position)`` of the
+  per-shard ``PropertyIndex.match``; with hash sharding a listing id goes
+  straight to the shard that owns it. ``find_exact`` only takes id and
+  whole-name matches.
+* ``filter`` (grid filters and the chat's ``query.py`` constraints): each
+  shard's first ``limit`` rows in sort order, merged on the sort columns and
+  then catalog position.
+* ``search`` (BM25, optionally within a filter) and ``fuzzy_search``
+  (trigram names): per-shard top k, merged on score then position. BM25
+  weights use corpus-wide statistics gathered from every shard, so scores
+  are comparable across shards.
+
+``ChatEngine(catalog=...)`` (``server.py --shards N``) answers chat lookups,
+filters and searches this way.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: old layouts are kept instead of swept
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+import bm25
+from facets import SORT_OPTIONS, get_facet_index
+from helpers import (
+    PROPERTIES_FILE,
+    _file_lock,
+    concat_property_chunks,
+    get_property_index,
+    iter_property_chunks,
+    source_version,
+)
+from search import get_trigram_index
+
+SHARD_BY = ("hash", "city")
+# Shared-locked by every catalog reading a layout directory.
+IN_USE = "in-use"
+
+
+class ShardHit(NamedTuple):
+    position: int  # row position in the whole catalog
+    score: float
+    record: Dict[str, Any]
+    coverage: float = 1.0  # as in ``search.SearchHit``
+
+
+class CatalogFacets(NamedTuple):
+    """Filter options of the whole catalog, named like ``FacetIndex``'s."""
+    cities: List[str]
+    types: List[str]
+    availabilities: List[str]
+    min_price: float
+    max_price: float
+
+
+# ---------------- Partitioning ---------------- #
+def shard_of(key: Any, shards: int) -> int:
+    """Stable shard of a listing id or city (the same in every process)."""
+    return zlib.crc32(str(key).strip().upper().encode("utf-8")) % shards
+
+
+def city_shards(counts: Dict[str, int], shards: int) -> Dict[str, int]:
+    """Whole cities to shards, largest first onto the least-loaded shard."""
+    loads = [0] * shards
+    mapping = {}
+    for city, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+        target = min(range(shards), key=lambda i: (loads[i], i))
+        mapping[city] = target
+        loads[target] += count
+    return mapping
+
+
+def count_cities(csv_path: str) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for chunk in pd.read_csv(csv_path, usecols=["city"], chunksize=200_000, dtype={"city": "category"}):
+        for city, count in chunk["city"].value_counts().items():
+            counts[city] = counts.get(city, 0) + int(count)
+    return counts
+
+
+class ShardSpec(NamedTuple):
+    csv_path: str
+    directory: str  # this shard's columnar files
+    index: int
+    shards: int
+    by: str
+    cities: Dict[str, int]
+
+    def owns(self, chunk: pd.DataFrame) -> np.ndarray:
+        """Mask of the chunk's rows that belong to this shard."""
+        if self.by == "city":
+            keys = chunk["city"].astype(object)
+            owner = [self.cities.get(c, shard_of(c, self.shards)) if isinstance(c, str) else 0 for c in keys]
+        else:
+            owner = [shard_of(k, self.shards) if isinstance(k, str) else 0 for k in chunk["listing_id"]]
+        return np.asarray(owner, dtype=np.int64) == self.index
+
+
+# ---------------- Columnar shard files ---------------- #
+def write_columns(df: pd.DataFrame, positions: np.ndarray, directory: str) -> None:
+    """Write ``df`` (and each row's global position) as one file per column, atomically.
+
+    ``directory`` only ever appears complete; if another process published
+    it first, that copy is kept and this one discarded.
+    """
+    tmp = f"{directory}.{os.getpid()}.{threading.get_ident()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "positions.npy"), positions.astype(np.int64))
+    columns = []
+    for i, name in enumerate(df.columns):
+        values = df[name]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(tmp, f"{i}.codes.npy"), values.cat.codes.to_numpy())
+            columns.append({"name": name, "kind": "category", "categories": [str(c) for c in values.cat.categories]})
+        elif values.dtype.kind in "iufb":
+            np.save(os.path.join(tmp, f"{i}.npy"), values.to_numpy())
+            columns.append({"name": name, "kind": "numeric"})
+        else:
+            present = values.notna().to_numpy()
+            encoded = [str(v).encode("utf-8") if ok else b"" for v, ok in zip(values.tolist(), present)]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+            with open(os.path.join(tmp, f"{i}.bin"), "wb") as fh:
+                fh.write(b"".join(encoded))
+            np.save(os.path.join(tmp, f"{i}.offsets.npy"), offsets)
+            np.save(os.path.join(tmp, f"{i}.present.npy"), present)
+            columns.append({"name": name, "kind": "text"})
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as fh:
+        json.dump({"rows": len(df), "columns": columns}, fh)
+    try:
+        os.replace(tmp, directory)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.exists(os.path.join(directory, "meta.json")):
+            raise
+
+
+def read_columns(directory: str) -> Tuple[pd.DataFrame, np.ndarray]:
+    """The frame written by ``write_columns``; numeric and category codes stay memory-mapped."""
+    with open(os.path.join(directory, "meta.json"), encoding="utf-8") as fh:
+        meta = json.load(fh)
+    data: Dict[str, Any] = {}
+    for i, column in enumerate(meta["columns"]):
+        name, kind = column["name"], column["kind"]
+        if kind == "category":
+            codes = np.load(os.path.join(directory, f"{i}.codes.npy"), mmap_mode="r")
+            data[name] = pd.Categorical.from_codes(codes, categories=column["categories"], validate=False)
+        elif kind == "numeric":
+            data[name] = np.load(os.path.join(directory, f"{i}.npy"), mmap_mode="r")
+        else:
+            offsets = np.load(os.path.join(directory, f"{i}.offsets.npy")).tolist()
+            present = np.load(os.path.join(directory, f"{i}.present.npy")).tolist()
+            with open(os.path.join(directory, f"{i}.bin"), "rb") as fh:
+                blob = fh.read()
+            values = np.empty(meta["rows"], dtype=object)
+            values[:] = [
+                blob[start:end].decode("utf-8") if ok else None
+                for start, end, ok in zip(offsets, offsets[1:], present)
+            ]
+            data[name] = values
+    df = pd.DataFrame(data, copy=False)
+    return df, np.load(os.path.join(directory, "positions.npy"), mmap_mode="r")
+
+
+def open_shard(spec: ShardSpec) -> Tuple[pd.DataFrame, np.ndarray]:
+    """This shard's rows, from its columnar files (written first if missing).
+
+    Building is serialized by a lock next to the directory, so catalogs
+    starting together write each shard once and never replace files
+    another process is reading.
+    """
+    meta = os.path.join(spec.directory, "meta.json")
+    if not os.path.exists(meta):
+        with _file_lock(spec.directory):
+            if not os.path.exists(meta):  # built while we waited for the lock
+                chunks, positions = [], []
+                for chunk in iter_property_chunks(spec.csv_path):
+                    mine = np.flatnonzero(spec.owns(chunk))
+                    chunks.append(chunk.take(mine))
+                    positions.append(chunk.index.to_numpy()[mine])
+                df = concat_property_chunks(chunks).reset_index(drop=True)
+                write_columns(df, np.concatenate(positions), spec.directory)
+    return read_columns(spec.directory)
+
+
+def use_layout(directory: str):
+    """Create ``directory`` if needed and shared-lock its in-use marker.
+
+    The returned file holds the lock until it is closed. A marker deleted
+    by a sweep between opening and locking it is retried, so the lock is
+    always on the file that ``remove_unused_layout`` checks.
+    """
+    while True:
+        os.makedirs(directory, exist_ok=True)
+        fh = open(os.path.join(directory, IN_USE), "a+b")
+        if fcntl is None:
+            return fh
+        fcntl.flock(fh.fileno(), fcntl.LOCK_SH)
+        try:
+            if os.path.samestat(os.fstat(fh.fileno()), os.stat(fh.name)):
+                return fh
+        except FileNotFoundError:
+            pass
+        fh.close()
+
+
+def remove_unused_layout(directory: str) -> bool:
+    """Delete a layout directory unless a catalog holds its in-use marker."""
+    if fcntl is None:
+        return False
+    try:
+        fh = open(os.path.join(directory, IN_USE), "a+b")
+    except OSError:
+        return False
+    with fh:
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        shutil.rmtree(directory, ignore_errors=True)
+    return True
+
+
+# ---------------- Worker ---------------- #
+class Shard:
+    """One worker's rows and indexes; every answer carries global positions."""
+
+    def __init__(self, df: pd.DataFrame, positions: np.ndarray):
+        self.df = df
+        self.positions = positions
+        self._postings: Optional[bm25.Postings] = None
+        self.bm25: Optional[bm25.BM25Index] = None
+        if len(df):  # an empty shard is stopped by the coordinator, never queried
+            get_property_index(df)
+            get_facet_index(df)
+            get_trigram_index(df)
+
+    def _record(self, pos: int) -> Dict[str, Any]:
+        return self.df.iloc[pos].to_dict()
+
+    def _hits(self, hits) -> List[ShardHit]:
+        return [ShardHit(int(self.positions[h.position]), h.score, self._record(h.position), h.coverage)
+                for h in hits]
+
+    def bm25_stats(self) -> bm25.CollectionStats:
+        self._postings = bm25.tokenize_rows(self.df)
+        return bm25.collection_stats(self._postings)
+
+    def bm25_index(self, stats: bm25.CollectionStats) -> None:
+        self.bm25 = bm25.BM25Index.from_postings(self._postings, stats=stats)
+        self._postings = None
+
+    def match(self, query: str, ids_only: bool = False, exact: bool = False):
+        index = get_property_index(self.df)
+        matched = index.match(query)
+        if matched is None or (ids_only and matched[0] != index.MATCH_ID):
+            return None
+        if exact and matched[0] not in (index.MATCH_ID, index.MATCH_NAME):
+            return None
+        rule, pos = matched
+        return rule, int(self.positions[pos]), self._record(pos)
+
+    def filter(self, city, property_type, price, sort_by, search, limit, bedrooms=None, area=None,
+               availability="All"):
+        local = get_facet_index(self.df).filter(city, property_type, price, sort_by, search, bedrooms, area,
+                                                availability)
+        top = local[:limit]
+        columns = SORT_OPTIONS[sort_by][0]
+        rows = self.df.iloc[top]
+        return len(local), self.positions[top].tolist(), rows[columns].to_dict("list"), rows.to_dict("records")
+
+    def search(self, query: str, k: int, plan: Optional[Dict[str, Any]] = None) -> List[ShardHit]:
+        allowed = None
+        if plan is not None:
+            allowed = np.zeros(len(self.df), dtype=bool)
+            allowed[get_facet_index(self.df).filter(**plan)] = True
+        return self._hits(self.bm25.search(query, k, allowed))
+
+    def fuzzy_search(self, query: str, k: int) -> List[ShardHit]:
+        return self._hits(get_trigram_index(self.df).search(query, k))
+
+    def facets(self):
+        index = get_facet_index(self.df)
+        return index.cities, index.types, index.availabilities, index.min_price, index.max_price, len(self.df)
+
+
+def _serve(conn, spec: ShardSpec) -> None:
+    """Worker loop: answer ``(request id, method, args)`` messages until None."""
+    try:
+        shard = Shard(*open_shard(spec))
+    except Exception as exc:  # report instead of leaving the coordinator waiting
+        conn.send((None, False, f"{type(exc).__name__}: {exc}"))
+        return
+    conn.send((None, True, len(shard.df)))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        request_id, method, args = message
+        try:
+            conn.send((request_id, True, getattr(shard, method)(*args)))
+        except Exception as exc:
+            conn.send((request_id, False, f"{type(exc).__name__}: {exc}"))
+
+
+class ShardError(RuntimeError):
+    pass
+
+
+class _Worker:
+    """Coordinator side of one shard process: pipelined requests, resolved by a reader thread."""
+
+    def __init__(self, ctx, spec: ShardSpec):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_serve, args=(child, spec), name=f"shard-{spec.index}", daemon=True)
+        self.process.start()
+        child.close()
+        self._ids = itertools.count()
+        self._pending: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self.rows: Optional[int] = None
+        self._reader: Optional[threading.Thread] = None
+
+    def wait_ready(self) -> None:
+        _, ok, value = self.conn.recv()
+        if not ok:
+            raise ShardError(value)
+        self.rows = value
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        while True:
+            try:
+                request_id, ok, value = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            future = self._pending.pop(request_id)
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(ShardError(value))
+        for future in list(self._pending.values()):
+            future.set_exception(ShardError("shard worker exited"))
+
+    def call(self, method: str, *args) -> Future:
+        future: Future = Future()
+        with self._lock:
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            self.conn.send((request_id, method, args))
+        return future
+
+    def stop(self) -> None:
+        try:
+            with self._lock:
+                self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=10)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+# ---------------- Coordinator ---------------- #
+class ShardedCatalog:
+    """Scatter-gather front for a catalog split over ``shards`` worker processes.
+
+    Thread-safe: requests from many threads are pipelined to the workers,
+    which answer them in parallel.
+    """
+
+    def __init__(self, path: Optional[str] = None, shards: Optional[int] = None, by: str = "hash",
+                 directory: Optional[str] = None):
+        if by not in SHARD_BY:
+            raise ValueError(f"shard by one of {SHARD_BY}, not {by!r}")
+        self.csv_path = os.path.abspath(path if path is not None else PROPERTIES_FILE)
+        self.shards = shards or os.cpu_count() or 1
+        self.by = by
+        self.directory = directory or os.path.splitext(self.csv_path)[0] + ".shards"
+        self._workers: List[_Worker] = []
+        self._facets: Optional[CatalogFacets] = None
+        # Shard index -> its worker, for the shards that have rows.
+        self._owners: Dict[int, _Worker] = {}
+        self._layout_lock = None
+        # Like a loaded frame's, so ``helpers.dataset_version`` and the chat's reply cache work on it.
+        self.attrs: Dict[str, Any] = {}
+
+    def start(self) -> "ShardedCatalog":
+        stat = os.stat(self.csv_path)
+        layout = f"{self.by}-{self.shards}-{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        self.attrs = {"dataset_version": source_version((stat.st_mtime_ns, stat.st_size)),
+                      "source_path": self.csv_path}
+        self._facets = None
+        cities = count_cities(self.csv_path) if self.by == "city" else {}
+        mapping = city_shards(cities, self.shards) if cities else {}
+        ctx = multiprocessing.get_context("fork" if hasattr(os, "fork") else "spawn")
+        self._layout_lock = use_layout(os.path.join(self.directory, layout))
+        specs = [
+            ShardSpec(self.csv_path, os.path.join(self.directory, layout, str(i)), i, self.shards, self.by, mapping)
+            for i in range(self.shards)
+        ]
+        self._workers = [_Worker(ctx, spec) for spec in specs]
+        try:
+            for worker in self._workers:
+                worker.wait_ready()
+            # More shards than cities (or than rows) leaves some empty; they
+            # would only add nothing to every merge.
+            for worker in [w for w in self._workers if not w.rows]:
+                worker.stop()
+            self._owners = {spec.index: worker for spec, worker in zip(specs, self._workers) if worker.rows}
+            self._workers = list(self._owners.values())
+            # BM25 weights from corpus-wide statistics, so shard scores compare.
+            stats = bm25.merge_stats(self._scatter("bm25_stats"))
+            self._scatter("bm25_index", stats)
+        except BaseException:
+            self.close()
+            raise
+        # Layouts of older CSV versions are no longer needed once no catalog reads them.
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name != layout and os.path.isdir(path):
+                remove_unused_layout(path)
+        return self
+
+    def close(self) -> None:
+        workers, self._workers, self._owners = self._workers, [], {}
+        for worker in workers:
+            worker.stop()
+        if self._layout_lock is not None:
+            self._layout_lock.close()
+            self._layout_lock = None
+
+    def __enter__(self) -> "ShardedCatalog":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return sum(w.rows or 0 for w in self._workers)
+
+    def _scatter(self, method: str, *args) -> List[Any]:
+        futures = [worker.call(method, *args) for worker in self._workers]
+        return [future.result() for future in futures]
+
+    def find(self, query: str, exact: bool = False) -> Optional[Dict[str, Any]]:
+        """``find_property`` over the whole catalog; ``exact`` takes only id and whole-name matches."""
+        if not query:
+            return None
+        owner = self._owners.get(shard_of(query, self.shards)) if self.by == "hash" else None
+        if owner is not None:
+            matched = owner.call("match", query, True).result()
+            if matched is not None:
+                return matched[2]
+        matches = [m for m in self._scatter("match", query, False, exact) if m is not None]
+        return min(matches, key=lambda m: (m[0], m[1]))[2] if matches else None
+
+    def find_exact(self, query: str) -> Optional[Dict[str, Any]]:
+        """``PropertyIndex.find_exact`` over the whole catalog."""
+        return self.find(str(query).strip(), exact=True) if query else None
+
+    def filter(self, city: str = "All", property_type: str = "All", price: Optional[Tuple[float, float]] = None,
+               sort_by: str = "Price (low→high)", search: str = "", limit: int = 50,
+               bedrooms: Optional[Tuple[float, float]] = None, area: Optional[Tuple[float, float]] = None,
+               availability: str = "All") -> Tuple[int, List[Dict]]:
+        """(matching rows, first ``limit`` of them in ``sort_by`` order), like ``FacetIndex.filter``."""
+        parts = self._scatter("filter", city, property_type, price, sort_by, search, limit, bedrooms, area,
+                              availability)
+        columns, ascending = SORT_OPTIONS[sort_by]
+        merged = pd.concat(
+            [pd.DataFrame(dict(keys, _position=positions)) for _, positions, keys, _ in parts], ignore_index=True
+        )
+        records = [record for *_, part_records in parts for record in part_records]
+        order = merged.sort_values(columns + ["_position"], ascending=ascending + [True], kind="stable").index
+        return sum(total for total, *_ in parts), [records[i] for i in order[:limit]]
+
+    def _top(self, method: str, *args) -> List[ShardHit]:
+        hits = [hit for part in self._scatter(method, *args) for hit in part]
+        return sorted(hits, key=lambda h: (-h.score, h.position))[:args[1]]
+
+    def search(self, query: str, k: int = 5, plan: Optional[Dict[str, Any]] = None) -> List[ShardHit]:
+        """BM25 description search over the whole catalog, within the rows
+        matching ``plan`` (``FacetIndex.filter`` keyword arguments) if given."""
+        return self._top("search", query, k, plan)
+
+    def fuzzy_search(self, query: str, k: int = 5) -> List[ShardHit]:
+        """Trigram name search over the whole catalog."""
+        return self._top("fuzzy_search", query, k)
+
+    def facets(self) -> CatalogFacets:
+        """Filter options of the whole catalog (cities, types, availabilities, price range)."""
+        if self._facets is None:
+            parts = self._scatter("facets")
+            self._facets = CatalogFacets(
+                cities=sorted(set().union(*(p[0] for p in parts))),
+                types=sorted(set().union(*(p[1] for p in parts))),
+                availabilities=sorted(set().union(*(p[2] for p in parts))),
+                min_price=min((p[3] for p in parts), default=0),
+                max_price=max((p[4] for p in parts), default=0),
+            )
+        return self._facets
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Partition the catalog and run a few sharded queries")
+    parser.add_argument("--properties", help="properties CSV (defaults to data/properties.csv)")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--by", choices=SHARD_BY, default="hash")
+    parser.add_argument("query", nargs="*", default=["P003", "villa with private pool"])
+    args = parser.parse_args()
+    start = time.perf_counter()
+    with ShardedCatalog(args.properties, args.shards, args.by) as catalog:
+        print(f"{len(catalog)} rows in {args.shards} shards by {args.by} ({time.perf_counter() - start:.1f}s)")
+        for query in args.query:
+            found = catalog.find(query)
+            print(f"find {query!r}: {found and found['property_name']}")
+            print(f"search {query!r}: {[h.record['property_name'] for h in catalog.search(query, 3)]}")
+
+
+if __name__ == "__main__":
+    main()
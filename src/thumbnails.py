@@ -0,0 +1,71 @@
+"""Local, pre-sized listing thumbnails generated on first use and cached on disk."""
+import colorsys
+import hashlib
+import os
+import re
+import threading
+from typing import Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+THUMBNAIL_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "thumbnails")
+THUMBNAIL_SIZE = (600, 360)
+
+_UNSAFE_RE = re.compile(r"[^A-Za-z0-9_-]+")
+
+
+def _palette(listing_id: str) -> Tuple[Tuple[int, int, int], Tuple[int, int, int]]:
+    """Two related colours derived deterministically from the listing id."""
+    hue = int(hashlib.md5(listing_id.encode("utf-8")).hexdigest()[:4], 16) / 0xFFFF
+    top = colorsys.hls_to_rgb(hue, 0.72, 0.45)
+    bottom = colorsys.hls_to_rgb(hue, 0.42, 0.5)
+    return tuple(int(c * 255) for c in top), tuple(int(c * 255) for c in bottom)
+
+
+def render_thumbnail(listing_id: str, label: str = "", size: Tuple[int, int] = THUMBNAIL_SIZE) -> Image.Image:
+    """Gradient card with a simple house outline and the listing id."""
+    width, height = size
+    top, bottom = _palette(listing_id)
+    image = Image.new("RGB", size, top)
+    draw = ImageDraw.Draw(image)
+    for y in range(height):
+        t = y / max(1, height - 1)
+        draw.line([(0, y), (width, y)], fill=tuple(int(a + (b - a) * t) for a, b in zip(top, bottom)))
+
+    # House silhouette centred in the card
+    cx, base, w = width // 2, int(height * 0.78), int(width * 0.28)
+    roof = int(height * 0.28)
+    body_top = base - int(height * 0.3)
+    draw.rectangle([cx - w // 2, body_top, cx + w // 2, base], fill=(255, 255, 255))
+    draw.polygon([(cx - w // 2 - 16, body_top), (cx, roof), (cx + w // 2 + 16, body_top)], fill=(250, 250, 250))
+    door_w = max(8, w // 6)
+    draw.rectangle([cx - door_w // 2, base - int(height * 0.16), cx + door_w // 2, base], fill=bottom)
+
+    draw.text((16, 12), listing_id, fill=(255, 255, 255))
+    if label:
+        draw.text((16, height - 24), label, fill=(255, 255, 255))
+    return image
+
+
+def thumbnail_path(
+    listing_id: str,
+    label: str = "",
+    size: Tuple[int, int] = THUMBNAIL_SIZE,
+    directory: Optional[str] = None,
+) -> str:
+    """Path of the cached JPEG for ``listing_id``, rendering it if missing.
+
+    The name carries a short hash of the raw id and the label, so a listing
+    whose type changes gets a new image and ids that sanitize alike
+    ("P/1", "P_1") don't share one.
+    """
+    directory = directory or THUMBNAIL_DIR
+    name = _UNSAFE_RE.sub("_", str(listing_id)) or "listing"
+    digest = hashlib.md5(f"{listing_id}\0{label}".encode("utf-8")).hexdigest()[:10]
+    path = os.path.join(directory, f"{name}_{digest}_{size[0]}x{size[1]}.jpg")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        render_thumbnail(str(listing_id), label, size).save(tmp_path, format="JPEG", quality=80, optimize=True)
+        os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,109 @@
+"""Local stand-in for an OpenAI/OpenRouter-compatible chat completions API.
+
+Used by the tests and benchmarks so nothing talks to the real service.
+Answers ``{"stream": true}`` requests with an SSE stream of word tokens and
+everything else with a single JSON completion.
+"""
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeLLMServer:
+    """Threaded HTTP server; ``url`` points at its chat completions route.
+
+    ``delay`` is slept before the first byte and ``token_delay`` between
+    streamed tokens. With ``byte_delay`` the body is sent one byte at a time,
+    like a server trickling its reply. ``calls`` counts requests received.
+    """
+
+    def __init__(self, delay: float = 0.0, token_delay: float = 0.0, byte_delay: float = 0.0):
+        self.delay = delay
+        self.token_delay = token_delay
+        self.byte_delay = byte_delay
+        self.calls = 0
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_POST(self):
+                owner.calls += 1
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                text = "polished: " + body["messages"][-1]["content"]
+                if owner.delay:
+                    time.sleep(owner.delay)
+                if body.get("stream"):
+                    self._stream(text)
+                else:
+                    self._complete(text)
+
+            def _complete(self, text):
+                # Simulate generating the whole completion before answering.
+                if owner.token_delay:
+                    time.sleep(owner.token_delay * (len(text.split(" ")) - 1))
+                payload = json.dumps({"choices": [{"message": {"content": f" {text} "}}]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                try:
+                    self._write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _stream(self, text):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                tokens = [w + " " for w in text.split(" ")]
+                tokens[-1] = tokens[-1].rstrip()
+                try:
+                    for i, token in enumerate(tokens):
+                        if i and owner.token_delay:
+                            time.sleep(owner.token_delay)
+                        chunk = {"choices": [{"delta": {"content": token}}]}
+                        self._chunk(f"data: {json.dumps(chunk)}\n\n")
+                    self._chunk("data: [DONE]\n\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _chunk(self, data):
+                raw = data.encode()
+                self._write(f"{len(raw):x}\r\n".encode() + raw + b"\r\n")
+
+            def _write(self, raw):
+                if not owner.byte_delay:
+                    self.wfile.write(raw)
+                    self.wfile.flush()
+                    return
+                for i in range(len(raw)):
+                    time.sleep(owner.byte_delay)
+                    self.wfile.write(raw[i:i + 1])
+                    self.wfile.flush()
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        # Clients hanging up early (timeouts, deadlines) are expected.
+        self._server.handle_error = lambda request, client_address: None
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/v1/chat/completions"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -1,5 +1,10 @@
 import os
-from src.helpers import load_properties, find_property
+import threading
+
+import pandas as pd
+
+from helpers import find_property, load_properties, save_visit_booking, save_visit_bookings
+
 
 def test_load_and_lookup():
     root = os.path.dirname(__file__)
@@ -9,3 +14,33 @@ def test_load_and_lookup():
     prop = find_property(df, "P003")
     assert prop is not None
     assert prop.get("property_name") == "Marina Studio"
+
+
+def test_lookup_by_name():
+    root = os.path.dirname(__file__)
+    data_dir = os.path.join(os.path.dirname(root), "data")
+    df = load_properties(os.path.join(data_dir, "properties.csv"))
+    assert find_property(df, "sunrise apartments")["listing_id"] == "P001"
+    assert find_property(df, "marina")["listing_id"] == "P003"
+    # multi-word queries match when every word appears in the name
+    assert find_property(df, "studio marina")["listing_id"] == "P003"
+    assert find_property(df, "no such place") is None
+
+
+def test_concurrent_bookings_are_not_lost(tmp_path):
+    out = str(tmp_path / "visits.csv")
+
+    def book(n):
+        for i in range(n):
+            save_visit_booking("P003", "Marina Studio", "Jane", "123", f"msg {i}", out_path=out)
+
+    threads = [threading.Thread(target=book, args=(50,)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    save_visit_bookings([{"name": "Bulk", "phone": "9", "user_message": "skip"}] * 10, out_path=out)
+
+    df = pd.read_csv(out)
+    assert list(df.columns) == ["timestamp", "listing_id", "property_name", "name", "phone", "user_message"]
+    assert len(df) == 210
@@ -0,0 +1,30 @@
+import os
+import random
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from bench_suite import compare, summarize, utterances  # noqa: E402
+from synthetic import generate_catalog, write_catalog  # noqa: E402
+from helpers import find_property, load_properties  # noqa: E402
+
+
+def test_synthetic_catalog_matches_dataset_schema(tmp_path):
+    path = write_catalog(str(tmp_path / "properties.csv"), 500)
+    df = load_properties(path)
+    assert list(df.columns) == list(pd.read_csv("data/properties.csv").columns)
+    assert len(df) == 500 and df["listing_id"].is_unique
+    assert find_property(df, "P003")["property_name"] == generate_catalog(500).loc[2, "property_name"]
+    assert len(utterances(df, 50, random.Random(1))) == 50
+
+
+def test_compare_flags_slower_percentiles():
+    baseline = {"results": {"10k": {"find": summarize([0.001] * 10)}}}
+    current = {"results": {"10k": {"find": summarize([0.002] * 10), "new": summarize([0.1])}}}
+    assert compare(current, baseline, 1.25) == [
+        "10k find p50_ms: 1.000 -> 2.000 ms",
+        "10k find p95_ms: 1.000 -> 2.000 ms",
+    ]
+    assert compare(baseline, baseline, 1.25) == []
@@ -0,0 +1,56 @@
+import os
+
+import pandas as pd
+
+from bm25 import BM25Index, get_bm25_index, index_path
+from engine import ChatEngine
+from helpers import load_properties
+from intents import IntentRouter
+
+
+def _names(df, hits):
+    return [df.iloc[h.position]["property_name"] for h in hits]
+
+
+def test_descriptions_rank_matching_listings():
+    df = load_properties()
+    index = BM25Index.build(df)
+    assert _names(df, index.search("villa with private pool"))[0] == "Desert View Villa"
+    assert _names(df, index.search("office in Mumbai", k=1)) == ["City Center Office"]
+    assert _names(df, index.search("near metro"))[0] == "Sunrise Apartments"
+    assert index.search("with the") == [] and index.search("zzz") == []
+
+
+def test_ties_keep_catalog_order_and_missing_fields_are_skipped():
+    df = pd.DataFrame({
+        "short_description": ["Garden flat", None, "Garden flat", "Sea view flat"],
+        "city": pd.Categorical(["Pune", "Pune", "Pune", None]),
+    })
+    index = BM25Index.build(df)
+    hits = index.search("garden", k=3)
+    assert [h.position for h in hits] == [0, 2] and hits[0].score == hits[1].score
+    assert [h.position for h in index.search("pune", k=2)] == [1, 0]  # the shortest row first
+    # the dense scoring path (postings over 1/8 of the rows) picks the same ties
+    assert [h.position for h in index.search("garden flat pune", k=2)] == [0, 2]
+
+
+def test_index_is_saved_for_its_dataset_version(tmp_path):
+    csv_path = tmp_path / "properties.csv"
+    load_properties().to_csv(csv_path, index=False)
+    df = load_properties(str(csv_path))
+    built = get_bm25_index(df)
+    assert os.path.exists(index_path(str(csv_path)))
+
+    loaded = BM25Index.load(index_path(str(csv_path)), df.attrs["dataset_version"], len(df))
+    assert loaded is not None and loaded.vocabulary == built.vocabulary
+    assert loaded.search("sea view") == built.search("sea view")
+    assert BM25Index.load(index_path(str(csv_path)), "other-version", len(df)) is None
+
+
+def test_search_intent_returns_cards():
+    router = IntentRouter()
+    assert router.classify("villa with private pool") == "search"
+    assert router.classify("list properties in dubai") == "show_properties"
+    turn = ChatEngine(polish=False).handle(None, "looking for something near metro")
+    assert turn.cards[0]["listing_id"] == "P001" and turn.cards[0]["score"] > 0
+    assert turn.actions[0] == "Sunrise Apartments" and "Sea-view 2BHK near metro" in turn.reply
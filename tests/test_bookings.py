@@ -0,0 +1,63 @@
+import pandas as pd
+
+from bookings import BookingStore, get_booking_store
+from helpers import save_booking, save_visit_booking, save_visit_bookings
+
+
+def _bookings(n, day="2024-05-01"):
+    return [
+        {"listing_id": f"P00{i % 3 + 1}", "property_name": f"Home {i % 3 + 1}", "name": f"User {i}",
+         "phone": f"555-{i:04d}", "user_message": "book", "timestamp": f"{day}T10:{i % 60:02d}:00Z"}
+        for i in range(n)
+    ]
+
+
+def test_existing_csv_is_imported_once_then_incrementally(tmp_path):
+    csv_path = tmp_path / "visits.csv"
+    save_visit_bookings(_bookings(30), out_path=str(csv_path))
+    store = BookingStore(str(tmp_path / "visits.db"), str(csv_path))
+    assert store.sync() == 30
+    assert store.sync() == 0
+
+    save_visit_booking("P003", "Home 3", "Late", "555-9999", "book", out_path=str(csv_path))
+    assert store.count() == 31 and store.sync() == 0
+    # A second process opening the same database doesn't import again.
+    assert BookingStore(str(tmp_path / "visits.db"), str(csv_path)).sync() == 0
+    assert store.query(phone="555-9999").rows.loc[0, "name"] == "Late"
+
+
+def test_pages_filters_and_daily_aggregates(tmp_path):
+    csv_path = tmp_path / "visits.csv"
+    save_visit_bookings(_bookings(25) + _bookings(5, day="2024-05-02"), out_path=str(csv_path))
+    store = get_booking_store(str(csv_path))
+
+    first = store.query(page=1, page_size=10)
+    assert (first.total, first.pages, len(first.rows)) == (30, 3, 10)
+    assert first.rows["timestamp"].is_monotonic_decreasing
+    assert store.query(page=9, page_size=10).page == 3  # clamped to the last page
+    pages = pd.concat([store.query(page=p, page_size=10).rows for p in (1, 2, 3)])
+    assert len(set(pages["name"] + pages["timestamp"])) == 30
+
+    p001 = store.query(listing_id="p001", until="2024-05-01", page_size=100)
+    assert p001.total == 9 and set(p001.rows["listing_id"]) == {"P001"}
+    assert store.count(since="2024-05-02") == 5
+    assert store.count(since="2024-05-01T10:20:00Z", until="2024-05-01") == 5
+
+    daily = store.daily_counts()
+    assert daily["bookings"].sum() == 30
+    assert daily.set_index(["day", "listing_id"]).loc[("2024-05-02", "P002"), "bookings"] == 2
+    assert store.listings() == ["P001", "P002", "P003"]
+
+
+def test_legacy_and_form_rows_share_one_schema(tmp_path):
+    csv_path = tmp_path / "visits.csv"
+    csv_path.write_text("Name,Property Name,Date\nOld Timer,Marina Studio,2023-12-24\n")
+    store = BookingStore(str(tmp_path / "visits.db"), str(csv_path))
+    assert store.query().rows.loc[0, "visit_date"] == "2023-12-24"
+
+    # The first unified row rewrites the file with both headers; it is re-imported whole.
+    save_booking("Form User", "Marina Studio", "2024-06-01", listing_id="P003", out_path=str(csv_path))
+    rows = store.query().rows.set_index("name")
+    assert store.count() == 2
+    assert rows.loc["Form User", "listing_id"] == "P003" and rows.loc["Form User", "visit_date"] == "2024-06-01"
+    assert rows.loc["Old Timer", "property_name"] == "Marina Studio"
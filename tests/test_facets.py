@@ -0,0 +1,57 @@
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from facets import SORT_OPTIONS, FacetIndex
+from helpers import load_properties
+
+
+def reference_filter(df, city, property_type, price, sort_by, search):
+    """The grid's original pandas filtering."""
+    properties = df.copy()
+    if search:
+        properties = properties[properties["property_name"].str.contains(search, case=False, na=False)]
+    if city != "All":
+        properties = properties[properties["city"] == city]
+    if property_type != "All":
+        properties = properties[properties["property_type"] == property_type]
+    properties = properties[(properties["price"] >= price[0]) & (properties["price"] <= price[1])]
+    columns, ascending = SORT_OPTIONS[sort_by]
+    return properties.sort_values(by=columns, ascending=ascending)
+
+
+df = load_properties()
+facets = FacetIndex(df)
+COMBOS = list(itertools.product(
+    ["All", "Dubai", "Pune"],
+    ["All", "Villa", "Studio"],
+    [(facets.min_price, facets.max_price), (100000, 400000)],
+    list(SORT_OPTIONS),
+    ["", "villa", "o"],
+))
+
+
+@pytest.mark.parametrize("city,property_type,price,sort_by,search", COMBOS)
+def test_filter_matches_pandas(city, property_type, price, sort_by, search):
+    expected = reference_filter(df, city, property_type, price, sort_by, search)["listing_id"].tolist()
+    positions = facets.filter(city, property_type, price, sort_by, search)
+    assert df.iloc[positions]["listing_id"].tolist() == expected
+
+
+def test_facet_values():
+    assert facets.cities == sorted(df["city"].unique())
+    assert (facets.min_price, facets.max_price) == (int(df["price"].min()), int(df["price"].max()))
+
+
+def test_small_cache_is_safe_under_concurrent_filters():
+    shared = FacetIndex(df, cache_size=2)
+    combos = COMBOS[:40]
+    expected = [shared.filter(*combo).tolist() for combo in combos]
+
+    def run(_):
+        return [shared.filter(*combo).tolist() for combo in combos] == expected
+
+    with ThreadPoolExecutor(8) as pool:
+        assert all(pool.map(run, range(32)))
+    assert len(shared._cache) <= 2
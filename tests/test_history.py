@@ -0,0 +1,50 @@
+import os
+
+from history import SPILLED, ChatHistory, prune_archives
+
+
+def _fill(history, count, size=10):
+    for i in range(count):
+        history.append("user" if i % 2 == 0 else "assistant", f"{i}:" + "x" * size)
+
+
+def test_old_messages_spill_in_batches_and_stay_readable(tmp_path):
+    history = ChatHistory("s1", max_messages=8, directory=str(tmp_path))
+    before = SPILLED.value(outcome="archived")
+    _fill(history, 30)
+    assert len(history) == 30 and len(history.window(8)) == 8
+    assert history.archived >= 22 and len(history._blocks) < history.archived  # batched, not one per message
+    assert SPILLED.value(outcome="archived") - before == history.archived
+
+    assert [m[1].split(":")[0] for m in history.window(3)] == ["27", "28", "29"]
+    everything = history.window(100)
+    assert [int(m[1].split(":")[0]) for m in everything] == list(range(30))
+    assert everything[0][0] == "user" and everything[1][0] == "assistant"
+    assert [int(m[1].split(":")[0]) for m in history.window(25)] == list(range(5, 30))
+
+    # A reopened session finds its archive again.
+    reopened = ChatHistory("s1", max_messages=8, directory=str(tmp_path))
+    assert reopened.archived == history.archived
+    assert reopened.window(100) == history.window(100)[:history.archived]
+
+
+def test_memory_cap_counts_text_bytes(tmp_path):
+    history = ChatHistory("s2", max_messages=1000, max_bytes=1000, directory=str(tmp_path))
+    _fill(history, 50, size=95)
+    assert history.memory_bytes <= 1000 and len(history) == 50
+    history.append("assistant", "y" * 5000)  # an oversized reply alone is still kept
+    assert history.window(1) == [("assistant", "y" * 5000)]
+    assert len(history.window(2)) == 2
+
+
+def test_clear_and_prune_remove_archives(tmp_path):
+    history = ChatHistory("s3", max_messages=2, directory=str(tmp_path))
+    _fill(history, 10)
+    assert os.path.exists(history.path)
+    history.clear()
+    assert len(history) == 0 and not os.path.exists(history.path)
+
+    _fill(history, 10)
+    os.utime(history.path, (0, 0))
+    assert prune_archives(max_age=60, directory=str(tmp_path)) == 1
+    assert prune_archives(directory=str(tmp_path / "missing")) == 0
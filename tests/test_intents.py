@@ -0,0 +1,51 @@
+import json
+import os
+
+import pytest
+
+from engine import ChatEngine, new_state
+from helpers import load_properties
+from intents import IntentRouter
+
+GOLDEN = os.path.join(os.path.dirname(__file__), "golden", "handle_message.json")
+
+
+with open(GOLDEN, encoding="utf-8") as fh:
+    CASES = json.load(fh)
+
+
+@pytest.mark.parametrize("case", CASES, ids=[c["text"] or "<empty>" for c in CASES])
+def test_handle_message_matches_golden(case, monkeypatch):
+    monkeypatch.delenv("LLM_API_KEY", raising=False)
+    turn = ChatEngine().handle(None, case["text"], load_properties(), quick_action=True)
+    # "state" holds the session keys the turn set; the rest keep their defaults
+    assert (turn.reply, turn.actions, turn.state) == (case["reply"], case["actions"], {**new_state(), **case["state"]})
+
+
+def test_router_extracts_lookups():
+    router = IntentRouter()
+    assert router.route("what is the price of p003?").lookups == ["p003", "what is the price of p003?"]
+    assert router.route("show details for sunrise").lookups == ["show details for sunrise", "sunrise"]
+    # earlier intents in the table win regardless of position in the message
+    assert router.classify("price of the properties") == "show_properties"
+    # search words only decide a message no specific intent claims
+    assert router.classify("where is your office near the station") == "faq_office"
+    assert router.route("price of sunrise with parking").lookups == ["price of sunrise with parking", "sunrise"]
+    assert router.classify("villa with private pool") == "search"
+
+
+def test_cached_replies_follow_dataset_changes(tmp_path):
+    csv_path = tmp_path / "properties.csv"
+    source = load_properties()
+    source.to_csv(csv_path, index=False)
+    engine = ChatEngine(properties_path=str(csv_path))
+    before = engine.handle(None, "amenities").reply
+
+    changed = source.copy()
+    changed.loc[0, "short_description"] = "Rooftop pool"
+    changed.to_csv(csv_path, index=False)
+    os.utime(csv_path, ns=(1, 1))  # make sure the stat key differs
+    after = engine.handle(None, "amenities").reply
+
+    assert "Sea-view 2BHK near metro" in before
+    assert "Rooftop pool" in after and "Sea-view 2BHK near metro" not in after
@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from src.helpers import ResponseCache, polish_with_llm, stream_polish_with_llm
+from tests.fake_llm import FakeLLMServer
+
+
+@pytest.fixture
+def llm():
+    with FakeLLMServer() as server:
+        yield server
+
+
+def test_polish_is_cached_per_text_model_and_version(llm):
+    cache = ResponseCache(max_entries=8)
+    first = polish_with_llm("P003 blurb", "key", dataset_version="v1", api_url=llm.url, cache=cache)
+    again = polish_with_llm("P003 blurb", "key", dataset_version="v1", api_url=llm.url, cache=cache)
+    assert first == again == "polished: Please polish this property description: P003 blurb"
+    assert llm.calls == 1
+    polish_with_llm("P003 blurb", "key", dataset_version="v2", api_url=llm.url, cache=cache)
+    assert llm.calls == 2
+
+
+def test_polish_falls_back_when_budget_exceeded(llm):
+    llm.delay = 0.5
+    cache = ResponseCache()
+    assert polish_with_llm("raw", "key", api_url=llm.url, timeout=0.05, cache=cache) == "raw"
+    assert len(cache) == 0
+
+
+def test_budget_covers_the_whole_call_not_each_read(llm):
+    # Every byte arrives well within a read timeout, but the body takes seconds.
+    llm.byte_delay = 0.02
+    start = time.monotonic()
+    assert polish_with_llm("raw", "key", api_url=llm.url, timeout=0.3, cache=ResponseCache()) == "raw"
+    parts = list(stream_polish_with_llm("raw reply", "key", api_url=llm.url, deadline=0.3, cache=ResponseCache()))
+    assert parts[-1] == "raw reply"
+    assert time.monotonic() - start < 1.5
+
+
+def test_cache_persists_across_instances(tmp_path):
+    path = str(tmp_path / "llm_cache.jsonl")
+    ResponseCache(path=path).put(("a", "m", "v"), "b")
+    assert ResponseCache(path=path).get(("a", "m", "v")) == "b"
+
+
+def test_stream_yields_growing_reply_and_caches_it(llm):
+    cache = ResponseCache()
+    parts = list(stream_polish_with_llm("Marina Studio", "key", api_url=llm.url, cache=cache))
+    assert len(parts) > 1
+    assert all(b.startswith(a) for a, b in zip(parts, parts[1:]))
+    assert parts[-1] == "polished: Please polish this property description: Marina Studio"
+    assert list(stream_polish_with_llm("Marina Studio", "key", api_url=llm.url, cache=cache)) == [parts[-1]]
+    assert llm.calls == 1
+
+
+def test_stream_shows_raw_reply_after_deadline(llm):
+    llm.token_delay = 0.2
+    parts = list(stream_polish_with_llm("raw reply", "key", api_url=llm.url, deadline=0.1, cache=ResponseCache()))
+    assert parts[-1] == "raw reply"
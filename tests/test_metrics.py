@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+import metrics
+from engine import ChatEngine
+from helpers import find_property, load_properties
+
+
+@pytest.fixture
+def enabled():
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.disable()
+    metrics.reset()
+
+
+def test_disabled_spans_record_nothing():
+    metrics.reset()
+    find_property(load_properties(), "P003")
+    with metrics.span("noop"):
+        pass
+    assert metrics.SPAN_SECONDS.count(span="find_property") == 0
+    assert metrics.SPAN_SECONDS.count(span="noop") == 0
+
+
+def test_histogram_buckets_are_cumulative(enabled):
+    hist = metrics.histogram("test_latency_seconds", "test")
+    for value in (0.0002, 0.003, 0.003, 20.0):
+        hist.observe(value, op="x")
+    text = metrics.render_prometheus()
+    assert 'test_latency_seconds_bucket{op="x",le="0.0005"} 1' in text
+    assert 'test_latency_seconds_bucket{op="x",le="0.005"} 3' in text
+    assert 'test_latency_seconds_bucket{op="x",le="+Inf"} 4' in text
+    assert 'test_latency_seconds_count{op="x"} 4' in text
+    assert "# TYPE test_latency_seconds histogram" in text
+
+
+def test_engine_counts_intents_and_spans(enabled):
+    engine = ChatEngine(polish=False)
+    df = load_properties()
+    for message in ["hi", "hi", "Show details for P003", "Where is your office?"]:
+        engine.handle(None, message, df)
+    snap = metrics.snapshot()
+    assert snap["chat_messages_total"] == {'{intent="greeting"}': 2, '{intent="unknown"}': 1, '{intent="faq_office"}': 1}
+    assert snap["chat_message_seconds"]['{intent="greeting"}']["count"] == 2
+    assert snap["span_seconds"]['{span="find_property"}']["count"] >= 1
+    assert '{cache="reply"}' in snap["cache_hits_total"]
+    assert "# TYPE cache_hits_total counter" in metrics.render_prometheus()
+
+
+def test_profiler_dumps_folded_stacks_for_slow_requests(tmp_path):
+    def busy_wait(seconds):
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            pass
+
+    metrics.set_profiler(metrics.SlowRequestProfiler(threshold=0.05, interval=0.002, directory=str(tmp_path)))
+    try:
+        with metrics.profile("fast"):
+            busy_wait(0.005)
+        with metrics.profile("slow"):
+            busy_wait(0.1)
+    finally:
+        metrics.set_profiler(None)
+    dumps = list(tmp_path.iterdir())
+    assert len(dumps) == 1 and dumps[0].name.startswith("slow-")
+    lines = dumps[0].read_text().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("test_metrics.py:busy_wait" in line for line in lines)
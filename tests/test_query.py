@@ -0,0 +1,87 @@
+import math
+
+import numpy as np
+import pytest
+
+from bm25 import BM25Index
+from engine import SEARCH_RESULTS, ChatEngine
+from facets import SORT_OPTIONS, FacetIndex
+from helpers import load_properties
+from query import Constraints, parse_query, run_query
+
+df = load_properties()
+facets = FacetIndex(df)
+INF = math.inf
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("2 BHK in Dubai under 300k", Constraints(city="Dubai", bedrooms=(2, 2), price=(0, 300_000))),
+    ("villas over 2000 sqft", Constraints(property_type="Villa", area=(2000, INF))),
+    ("cheapest available studio", Constraints(property_type="Studio", availability="Available",
+                                              sort_by="Price (low→high)")),
+    ("apartments between 100k and 3 lakh", Constraints(property_type="Apartment", price=(100_000, 300_000))),
+    ("3+ bedrooms in bangalore", Constraints(city="Bangalore", bedrooms=(3, INF))),
+    ("more than 2 bhk flats", Constraints(property_type="Apartment", bedrooms=(3, INF))),
+    ("2-3 bhk from $1.2m to 1,500,000", Constraints(bedrooms=(2, 3), price=(1_200_000, 1_500_000))),
+    ("1000-2000 sq ft under 400k", Constraints(price=(0, 400_000), area=(1000, 2000))),
+    ("largest villa on request", Constraints(property_type="Villa", availability="On Request",
+                                             sort_by="Area (high→low)")),
+    ("marina studios", Constraints(property_type="Studio", rest="marina")),
+    ("price of p999", Constraints(rest="p999")),
+])
+def test_parse_query(text, expected):
+    assert parse_query(text, facets) == expected
+
+
+@pytest.mark.parametrize("text", ["price", "prices please", "tell me about the moon", "2 of them", "p003"])
+def test_messages_without_filters_stay_inactive(text):
+    assert not parse_query(text, facets).active
+
+
+@pytest.mark.parametrize("bedrooms,area,availability", [
+    (None, None, "All"), ((2, 3), None, "All"), ((3, INF), (1000, 2000), "All"), (None, (0, 1000), "Available"),
+    ((0, 0), None, "On Request"), (None, None, "Nowhere"),
+])
+@pytest.mark.parametrize("sort_by", list(SORT_OPTIONS))
+def test_new_filters_match_pandas(bedrooms, area, availability, sort_by):
+    expected = df
+    if bedrooms is not None:
+        expected = expected[expected["bedrooms"].between(*bedrooms)]
+    if area is not None:
+        expected = expected[expected["area_sqft"].between(*area)]
+    if availability != "All":
+        expected = expected[expected["availability"] == availability]
+    columns, ascending = SORT_OPTIONS[sort_by]
+    expected = expected.sort_values(by=columns, ascending=ascending, kind="stable")
+    positions = facets.filter(sort_by=sort_by, bedrooms=bedrooms, area=area, availability=availability)
+    assert df.iloc[positions]["listing_id"].tolist() == expected["listing_id"].tolist()
+
+
+def test_chat_answers_filters_with_a_bounded_ranked_list(monkeypatch):
+    monkeypatch.delenv("LLM_API_KEY", raising=False)
+    engine = ChatEngine(polish=False)
+    turn = engine.handle(None, "2 BHK in Dubai under 300k")
+    assert [card["listing_id"] for card in turn.cards] == ["P001"]
+    assert turn.reply.startswith("1 property matches your filters (2 BHK · in Dubai · price up to 300,000)")
+
+    turn = engine.handle(None, "prices under 2m")
+    expected = df.iloc[run_query(df, parse_query("under 2m", facets))]["property_name"].tolist()
+    assert len(expected) > SEARCH_RESULTS
+    assert [card["property_name"] for card in turn.cards] == expected[:SEARCH_RESULTS]
+    assert turn.actions == expected[:SEARCH_RESULTS] + ["Show all properties"]
+    assert f"and {len(expected) - SEARCH_RESULTS} more" in turn.reply
+
+    assert engine.handle(None, "flats in pune").reply.startswith("No properties match your filters")
+    # Left-over words that name a property still get its details.
+    assert engine.handle(None, "marina studios").reply.startswith("Marina Studio — 0 BHK")
+
+
+def test_search_is_restricted_to_the_filtered_rows():
+    index = BM25Index.build(df)
+    allowed = (df["city"] == "Gurgaon").to_numpy()
+    hits = index.search("villa pool", k=5, allowed=allowed)
+    assert hits and all(allowed[h.position] for h in hits)
+    assert index.search("villa pool", k=5, allowed=np.zeros(len(df), dtype=bool)) == []
+
+    turn = ChatEngine(polish=False).handle(None, "villa with private pool in gurgaon")
+    assert [card["city"] for card in turn.cards] == ["Gurgaon"]
@@ -0,0 +1,136 @@
+import os
+
+import pandas as pd
+
+import helpers
+from bm25 import BM25Index, get_bm25_index
+from engine import ChatEngine
+from facets import get_facet_index
+from helpers import PropertiesWatcher, get_property_index, load_properties, read_properties
+from search import get_trigram_index
+
+SOURCE = "data/properties.csv"
+
+
+def _write(path, lines, stamp):
+    path.write_text("\n".join(lines) + "\n")
+    os.utime(path, ns=(stamp, stamp))  # make sure the stat key differs
+
+
+def _reloads(kind):
+    return helpers.RELOADS.value(kind=kind)
+
+
+def _edited(lines):
+    header, rows = lines[0], lines[1:]
+    rows[1] = rows[1].replace("1250000", "1300000")  # P002 re-priced
+    del rows[4]  # P005 withdrawn
+    rows.insert(2, rows[0].replace("1,P001,Sunrise Apartments", "99,P099,Harbour Lofts"))
+    return [header] + rows
+
+
+def test_incremental_reload_matches_full_read(tmp_path):
+    path = tmp_path / "properties.csv"
+    lines = open(SOURCE).read().splitlines()
+    _write(path, lines, 1)
+    old = load_properties(str(path))
+    old_index, old_trigrams, old_facets = get_property_index(old), get_trigram_index(old), get_facet_index(old)
+    old_bm25 = get_bm25_index(old)
+
+    before = _reloads("incremental")
+    _write(path, _edited(lines), 2)
+    new = load_properties(str(path))
+    assert _reloads("incremental") == before + 1
+    pd.testing.assert_frame_equal(new, read_properties(str(path)))
+
+    # Indexes were patched onto the new frame, and answer like fresh ones.
+    assert get_property_index(new) is not old_index and get_property_index(new).df is new
+    assert get_property_index(new).find("p099")["property_name"] == "Harbour Lofts"
+    assert get_property_index(new).find("P005") is None
+    assert get_trigram_index(new).search("harbor lofts")[0].position == 2
+    fresh = get_facet_index(read_properties(str(path)))
+    for name, permutation in get_facet_index(new).permutations.items():
+        assert list(permutation) == list(fresh.permutations[name])
+    assert get_facet_index(new).filter(city="Dubai").tolist() == fresh.filter(city="Dubai").tolist()
+    patched, rebuilt = get_bm25_index(new), BM25Index.build(read_properties(str(path)))
+    assert patched is not old_bm25
+    for query in ["villa with private pool", "anything near metro", "sea view apartment", "office"]:
+        assert patched.search(query, k=10) == rebuilt.search(query, k=10)
+
+    # The previous snapshot and its indexes are untouched.
+    assert len(old) == len(lines) - 1 and old.loc[1, "price"] == 1250000
+    assert old_index.find("P005")["listing_id"] == "P005" and old_index.find("P099") is None
+    assert old_trigrams.df is old and len(old_trigrams) == len(old)
+    assert len(old_facets.permutations["Price (low→high)"]) == len(old)
+    assert len(old_bm25) == len(old)
+
+
+def test_header_change_falls_back_to_full_reload(tmp_path):
+    path = tmp_path / "properties.csv"
+    lines = open(SOURCE).read().splitlines()
+    _write(path, lines, 1)
+    load_properties(str(path))
+
+    before = _reloads("full")
+    _write(path, [lines[0].replace("agent_email", "agent")] + lines[1:], 2)
+    new = load_properties(str(path))
+    assert _reloads("full") == before + 1
+    assert "agent" in new.columns and "agent_email" not in new.columns
+
+
+def test_booking_flow_survives_reload(tmp_path):
+    path, bookings = tmp_path / "properties.csv", tmp_path / "visits.csv"
+    lines = open(SOURCE).read().splitlines()
+    _write(path, lines, 1)
+    engine = ChatEngine(properties_path=str(path), bookings_path=str(bookings), polish=False)
+    state = None
+    for message in ["book a visit", "Asha", "+971500000000"]:
+        state = engine.handle(state, message).state
+    assert state["booking_flow"]["step"] == "ask_property"
+
+    # The catalog changes between two turns of the flow.
+    _write(path, _edited(lines), 2)
+    turn = engine.handle(state, "Harbour Lofts")
+    assert turn.state["booking_flow"] is None
+    saved = pd.read_csv(bookings)
+    assert saved.loc[0, "listing_id"] == "P099" and saved.loc[0, "name"] == "Asha"
+
+
+def test_watcher_publishes_new_version(tmp_path):
+    path = tmp_path / "properties.csv"
+    lines = open(SOURCE).read().splitlines()
+    _write(path, lines, 1)
+    watcher = PropertiesWatcher(str(path), interval=60)
+    first = watcher.check()
+    _write(path, _edited(lines), 2)
+    second = watcher.check()
+    assert first != second and load_properties(str(path)).attrs["dataset_version"] == second
+
+    path.unlink()
+    failures = helpers.RELOAD_FAILURES.value()
+    assert watcher.check() is None  # keeps serving the last good frame
+    assert helpers.RELOAD_FAILURES.value() == failures + 1
+    watcher.start().stop()
+
+
+def test_cold_start_from_snapshot_does_not_rehash_the_csv(tmp_path, monkeypatch):
+    path = tmp_path / "properties.csv"
+    lines = open(SOURCE).read().splitlines()
+    _write(path, lines, 1)
+    load_properties(str(path))  # writes the snapshot with the line hashes
+
+    def no_reads(csv_path):
+        raise AssertionError("the CSV was re-read")
+
+    # As in a new process: nothing cached, and the CSV must not be read.
+    helpers._PROPERTIES_CACHE.pop(str(path))
+    with monkeypatch.context() as patch:
+        patch.setattr(helpers, "_line_hashes", no_reads)
+        cold = load_properties(str(path))
+    assert cold._line_fingerprints is not None
+
+    # The stored hashes still drive an incremental reload.
+    before = _reloads("incremental")
+    _write(path, _edited(lines), 2)
+    pd.testing.assert_frame_equal(load_properties(str(path)), read_properties(str(path)))
+    assert _reloads("incremental") == before + 1
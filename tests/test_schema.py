@@ -0,0 +1,49 @@
+import pickle
+
+import pandas as pd
+
+from helpers import find_property, load_properties, lookup_keys, read_properties, snapshot_path
+
+
+def test_loaded_frame_uses_typed_schema():
+    df = load_properties()
+    assert df["city"].dtype == "category" and df["agent_email"].dtype == "category"
+    assert df["bedrooms"].dtype == "int8" and df["area_sqft"].dtype == "int32"
+    assert df["price"].dtype == "int64" and df["listing_id"].dtype == object
+    raw = pd.read_csv("data/properties.csv")
+    assert df.memory_usage(deep=True).sum() < raw.memory_usage(deep=True).sum()
+    assert df.astype(raw.dtypes.to_dict()).equals(raw)
+
+
+def test_chunked_load_matches_single_batch(tmp_path):
+    path = tmp_path / "properties.csv"
+    raw = pd.read_csv("data/properties.csv")
+    raw.loc[len(raw)] = raw.iloc[0].to_dict() | {"listing_id": "P999", "city": "Goa", "bedrooms": None}
+    raw.to_csv(path, index=False)
+    whole = read_properties(str(path))
+    chunked = read_properties(str(path), chunksize=3)
+    pd.testing.assert_frame_equal(whole, chunked)
+    # categories are unified across batches; a missing count stays a float
+    assert "Goa" in chunked["city"].cat.categories
+    assert chunked["bedrooms"].dtype == "float64" and chunked["bathrooms"].dtype == "int8"
+    assert list(lookup_keys(chunked)["listing_id"][-2:]) == ["P012", "P999"]
+
+
+def test_bad_values_are_coerced_and_counted(tmp_path):
+    path = tmp_path / "properties.csv"
+    raw = pd.read_csv("data/properties.csv").astype({"price": object})
+    raw.loc[2, "price"] = "call us"
+    raw.to_csv(path, index=False)
+    df = read_properties(str(path), chunksize=5)
+    assert df.attrs["schema_errors"] == {"price": 1}
+    assert pd.isna(df.loc[2, "price"]) and df["price"].dtype == "float64"
+    assert find_property(df, "p003")["property_name"] == "Marina Studio"
+
+
+def test_stale_snapshot_schema_is_rebuilt(tmp_path):
+    path = tmp_path / "properties.csv"
+    pd.read_csv("data/properties.csv").to_csv(path, index=False)
+    stat = path.stat()
+    with open(snapshot_path(str(path)), "wb") as fh:
+        pickle.dump({"source": (stat.st_mtime_ns, stat.st_size), "frame": pd.read_csv(path)}, fh)
+    assert load_properties(str(path))["city"].dtype == "category"
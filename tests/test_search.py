@@ -0,0 +1,28 @@
+import pandas as pd
+
+from helpers import load_properties
+from search import TrigramIndex, is_confident
+
+
+def test_misspelled_name_ranks_first():
+    df = load_properties()
+    index = TrigramIndex(df)
+    hits = index.search("Sunrse Apartmnts")
+    assert df.iloc[hits[0].position]["listing_id"] == "P001"
+    assert is_confident(hits)
+    assert index.search("qqq zzz") == []
+
+
+def test_half_matching_query_is_not_confident():
+    df = load_properties()
+    index = TrigramIndex(df)
+    for query in ["green vally", "Sunrise Towers"]:
+        hits = index.search(query)
+        assert hits[0].coverage == 0.5 and not is_confident(hits), query
+
+
+def test_exact_name_scores_one_and_ties_keep_catalog_order():
+    df = pd.DataFrame({"property_name": ["Palm Court", "Palm Tower", "Palm Court"]})
+    hits = TrigramIndex(df).search("palm court", k=3)
+    assert [(h.position, h.score) for h in hits[:2]] == [(0, 1.0), (2, 1.0)]
+    assert hits[2].position == 1 and hits[2].score < 1.0
@@ -0,0 +1,117 @@
+import asyncio
+import http.client
+import json
+import socket
+import threading
+
+import pandas as pd
+import pytest
+
+from engine import ChatEngine, MemorySessionStore, SQLiteSessionStore
+from server import ChatServer, make_socket, shard_count
+
+
+@pytest.fixture
+def api(tmp_path):
+    visits = str(tmp_path / "visits.csv")
+    server = ChatServer(ChatEngine(bookings_path=visits), SQLiteSessionStore(str(tmp_path / "sessions.db")))
+    sock = make_socket("127.0.0.1", 0)
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(server.serve(sock))
+    thread = threading.Thread(target=loop.run_until_complete, args=(asyncio.gather(task, return_exceptions=True),))
+    thread.start()
+    yield sock.getsockname()[1], visits
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join()
+    loop.close()
+
+
+def post(conn, payload):
+    conn.request("POST", "/chat", json.dumps(payload), {"Content-Type": "application/json"})
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_booking_flow_over_http(api):
+    port, visits = api
+    conn = http.client.HTTPConnection("127.0.0.1", port)  # one keep-alive connection
+    status, body = post(conn, {"message": "I want to book a visit"})
+    assert status == 200 and body["state"]["booking_flow"]["step"] == "ask_name"
+    session = body["session_id"]
+    for message in ["Jane", "555-0100", "P003"]:
+        status, body = post(conn, {"session_id": session, "message": message})
+    assert body["reply"].startswith("✅ Booking captured")
+    assert pd.read_csv(visits).iloc[0]["listing_id"] == "P003"
+
+
+def test_concurrent_sessions_and_errors(api):
+    port, _ = api
+    results = []
+
+    def chat(i):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        results.append(post(conn, {"message": "What is the price of P003?"}))
+
+    threads = [threading.Thread(target=chat, args=(i,)) for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({body["session_id"] for _, body in results}) == 20
+    assert all(status == 200 and body["reply"].startswith("Marina Studio") for status, body in results)
+
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    assert post(conn, {"session_id": "x"})[0] == 400
+    conn.request("GET", "/nope")
+    assert conn.getresponse().status == 404
+
+
+def test_memory_store_evicts_oldest_and_copies():
+    store = MemorySessionStore(max_sessions=2)
+    state = {"booking_flow": None}
+    store.put("a", state)
+    state["booking_flow"] = "mutated"
+    assert store.get("a") == {"booking_flow": None}
+    store.put("b", {})
+    store.put("c", {})
+    assert store.get("a") is None
+
+
+def test_metrics_endpoints(api):
+    port, _ = api
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    conn.request("GET", "/metrics")
+    response = conn.getresponse()
+    assert response.status == 200 and response.getheader("Content-Type").startswith("text/plain")
+    assert "cache_hits_total" in response.read().decode()
+    conn.request("GET", "/metrics.json")
+    assert "pid" in json.loads(conn.getresponse().read())
+
+
+def test_bad_requests_get_an_answer(api, monkeypatch):
+    port, _ = api
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    status, body = post(conn, {"session_id": ["not", "hashable"], "message": "hi"})
+    assert status == 400 and "session_id" in body["error"]
+
+    with socket.create_connection(("127.0.0.1", port)) as raw:
+        raw.sendall(b"POST /chat HTTP/1.1\r\nContent-Length: lots\r\n\r\n")
+        assert raw.recv(4096).startswith(b"HTTP/1.1 400 Bad Request")
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(ChatEngine, "handle", broken)
+    status, body = post(conn, {"message": "hi"})
+    assert (status, body) == (500, {"error": "internal server error"})
+    conn.request("GET", "/health")  # the connection is still usable
+    assert conn.getresponse().status == 200
+
+
+def test_shard_count_is_per_worker(monkeypatch):
+    monkeypatch.setattr("os.cpu_count", lambda: 8)
+    assert shard_count("3", 4) == 3
+    assert shard_count("0", 4) == 0
+    assert shard_count("auto", 1) == 8 and shard_count("auto", 4) == 2 and shard_count("auto", 16) == 1
+    with pytest.raises(ValueError):
+        shard_count("-1", 1)
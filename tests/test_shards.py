@@ -0,0 +1,148 @@
+import multiprocessing
+import os
+
+import pytest
+
+from bm25 import BM25Index
+from engine import ChatEngine
+from facets import get_facet_index
+from helpers import find_property, load_properties
+from search import get_trigram_index
+from shards import ShardedCatalog, city_shards, shard_of
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "properties.csv"
+    load_properties().to_csv(path, index=False)
+    return str(path)
+
+
+def _listing(record):
+    return None if record is None else record["listing_id"]
+
+
+def _names(records):
+    return [r["property_name"] for r in records]
+
+
+@pytest.mark.parametrize("by", ["hash", "city"])
+def test_sharded_answers_match_one_process(csv_path, by):
+    df = load_properties(csv_path)
+    bm25 = BM25Index.build(df)
+    with ShardedCatalog(csv_path, shards=3, by=by) as catalog:
+        assert len(catalog) == len(df)
+        for query in ["P003", "p011", "marina studio", "villa", "city center office", "nothing like it"]:
+            expected = find_property(df, query)
+            found = catalog.find(query)
+            assert _listing(found) == _listing(expected), query
+
+        for city, kind, price, sort_by in [("All", "All", None, "Price (low→high)"),
+                                           ("Dubai", "All", None, "Price (high→low)"),
+                                           ("All", "Villa", (0, 10_000_000), "Area (high→low)"),
+                                           ("All", "All", None, "Bedrooms (high→low)")]:
+            positions = get_facet_index(df).filter(city, kind, price, sort_by)
+            total, records = catalog.filter(city, kind, price, sort_by, limit=5)
+            assert total == len(positions)
+            assert _names(records) == list(df.iloc[positions[:5]]["property_name"])
+
+        for query in ["villa with private pool", "near metro", "office in mumbai"]:
+            hits = catalog.search(query, k=4)
+            assert [h.position for h in hits] == [h.position for h in bm25.search(query, k=4)]
+            assert [h.score for h in hits] == pytest.approx([h.score for h in bm25.search(query, k=4)])
+        hits = catalog.fuzzy_search("marna studo", k=3)
+        assert [h.position for h in hits] == [h.position for h in get_trigram_index(df).search("marna studo", k=3)]
+        assert catalog.facets().cities == get_facet_index(df).cities
+
+
+@pytest.mark.parametrize("by", ["hash", "city"])
+def test_more_shards_than_cities_leaves_empty_shards_out(csv_path, by):
+    df = load_properties(csv_path)
+    shards = df["city"].nunique() + 2
+    with ShardedCatalog(csv_path, shards=shards, by=by) as catalog:
+        assert len(catalog) == len(df) and 0 < len(catalog._workers) < shards
+        assert _listing(catalog.find("P003")) == "P003"
+        total, records = catalog.filter(sort_by="Price (high→low)", limit=3)
+        positions = get_facet_index(df).filter(sort_by="Price (high→low)")
+        assert total == len(df) and _names(records) == list(df.iloc[positions[:3]]["property_name"])
+        hits = catalog.search("villa with private pool", k=3)
+        assert [h.position for h in hits] == [h.position for h in BM25Index.build(df).search("villa with private pool", k=3)]
+        facets = catalog.facets()
+        assert (facets.min_price, facets.max_price) == (int(df["price"].min()), int(df["price"].max()))
+
+
+def test_chat_engine_answers_through_the_shards(csv_path, tmp_path, monkeypatch):
+    monkeypatch.delenv("LLM_API_KEY", raising=False)
+    single = ChatEngine(properties_path=csv_path, polish=False)
+    messages = ["What is the price of P003?", "find P003", "marina studio with parking", "villa with private pool",
+                "villa with private pool in gurgaon", "2 BHK in Dubai under 300k", "prices under 2m", "Sunrse Apartmnts",
+                "green vally", "tell me about the moon", "price of P999"]
+    with ShardedCatalog(csv_path, shards=2) as catalog:
+        sharded = ChatEngine(properties_path=csv_path, bookings_path=str(tmp_path / "visits.csv"), polish=False,
+                             catalog=catalog)
+        for message in messages:
+            assert sharded.handle(None, message) == single.handle(None, message), message
+        state = None
+        for message in ["book a visit", "Asha", "+971500000000"]:
+            state = sharded.handle(state, message).state
+        assert sharded.handle(state, "p003").reply.startswith("✅ Booking captured")
+
+
+def test_shard_files_are_reused_until_the_csv_changes(csv_path):
+    directory = os.path.splitext(csv_path)[0] + ".shards"
+    with ShardedCatalog(csv_path, shards=2):
+        (layout,) = os.listdir(directory)
+        meta = os.path.join(directory, layout, "0", "meta.json")
+        written = os.stat(meta).st_mtime_ns
+    with ShardedCatalog(csv_path, shards=2):
+        assert os.stat(meta).st_mtime_ns == written
+
+    with open(csv_path, "a", encoding="utf-8") as fh:
+        fh.write("99,P099,Late Listing,1 New St,Dubai,900,2,2,500000,USD,Apartment,Available,Brand new,a@b.com\n")
+    with ShardedCatalog(csv_path, shards=2) as catalog:
+        assert os.listdir(directory) != [layout]
+        assert catalog.find("P099")["property_name"] == "Late Listing"
+
+
+def _start_catalog(csv_path, results):
+    try:
+        with ShardedCatalog(csv_path, shards=3) as catalog:
+            results.put((len(catalog), _listing(catalog.find("P003"))))
+    except Exception as exc:
+        results.put(repr(exc))
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="server workers are forked")
+def test_catalogs_started_together_share_one_build(csv_path):
+    # One catalog per server worker, all building the same fresh layout.
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_start_catalog, args=(csv_path, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    answers = [results.get(timeout=60) for _ in workers]
+    for worker in workers:
+        worker.join()
+    assert answers == [(len(load_properties(csv_path)), "P003")] * len(workers)
+
+
+def test_old_layouts_are_kept_while_a_catalog_reads_them(csv_path):
+    directory = os.path.splitext(csv_path)[0] + ".shards"
+    old = ShardedCatalog(csv_path, shards=2).start()
+    (layout,) = os.listdir(directory)
+    with open(csv_path, "a", encoding="utf-8") as fh:
+        fh.write("99,P099,Late Listing,1 New St,Dubai,900,2,2,500000,USD,Apartment,Available,Brand new,a@b.com\n")
+    try:
+        with ShardedCatalog(csv_path, shards=2):
+            assert layout in os.listdir(directory)
+        assert old.find("P001")["listing_id"] == "P001"
+    finally:
+        old.close()
+    with ShardedCatalog(csv_path, shards=2):
+        assert layout not in os.listdir(directory)
+
+
+def test_partitioning_is_stable_and_balanced():
+    assert shard_of(" p003", 4) == shard_of("P003", 4)
+    mapping = city_shards({"Dubai": 50, "Pune": 30, "Goa": 20, "Oslo": 10}, 2)
+    assert mapping == {"Dubai": 0, "Pune": 1, "Goa": 1, "Oslo": 0}
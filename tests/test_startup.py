@@ -0,0 +1,103 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import helpers
+from engine import ChatEngine
+from helpers import find_property, load_properties
+import lookup
+from lookup import compact_path, load_compact_catalog
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "properties.csv"
+    load_properties().to_csv(path, index=False)
+    load_properties(str(path))  # writes the lookup snapshot too
+    return str(path)
+
+
+def test_compact_catalog_finds_what_the_frame_finds(csv_path):
+    assert os.path.exists(compact_path(csv_path))
+    df = load_properties(csv_path)
+    catalog = load_compact_catalog(csv_path)
+    assert len(catalog) == len(df) and catalog.attrs["dataset_version"] == df.attrs["dataset_version"]
+    for query in ["P003", "p011", "Marina Studio", "villa", "city center", "office center", "", "nothing"]:
+        expected = find_property(df, query)
+        found = find_property(catalog.index, query)
+        assert (found is None) == (expected is None), query
+        if found is not None:
+            assert found == {k: (None if v != v else v) for k, v in expected.items()}, query
+
+
+def test_stale_snapshot_is_ignored_until_rewritten(csv_path):
+    with open(csv_path, "a", encoding="utf-8") as fh:
+        fh.write("99,P099,Late Listing,1 New St,Dubai,900,2,2,500000,USD,Apartment,Available,Brand new,a@b.com\n")
+    assert load_compact_catalog(csv_path) is None
+    lookup.main([csv_path])
+    assert find_property(load_compact_catalog(csv_path).index, "P099")["property_name"] == "Late Listing"
+
+
+def test_fast_startup_replies_match_the_frame(csv_path, tmp_path):
+    fast = ChatEngine(csv_path, str(tmp_path / "visits.csv"), polish=False, fast_startup=True)
+    full = ChatEngine(csv_path, str(tmp_path / "visits.csv"), polish=False)
+    for message in ["P003", "price of p002", "tell me about marina studio", "marna studo", "hours?"]:
+        assert fast.handle(None, message) == full.handle(None, message), message
+
+
+def test_headless_fast_path_does_not_import_pandas(csv_path, tmp_path):
+    code = f"""
+import json, sys
+from engine import ChatEngine
+chat = ChatEngine({csv_path!r}, {str(tmp_path / "visits.csv")!r}, polish=False, fast_startup=True)
+replies = [chat.handle(None, "what are your working hours").reply, chat.handle(None, "P003").reply]
+state = None
+for message in ["book a visit", "Ann", "555-0100", "marina studio"]:
+    state = chat.handle(state, message).state
+print(json.dumps([replies, sorted(m for m in ("pandas", "numpy", "requests") if m in sys.modules)]))
+"""
+    env = dict(os.environ, PYTHONPATH=SRC)
+    out = subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True).stdout
+    replies, heavy = json.loads(out)
+    assert heavy == []
+    assert replies[1].startswith("Marina Studio")
+    assert "Marina Studio" in (tmp_path / "visits.csv").read_text()
+
+
+def test_fast_startup_watcher_does_not_load_the_frame(csv_path):
+    before = load_properties(csv_path).attrs["dataset_version"]
+    code = f"""
+import json, os, sys
+import helpers
+from helpers import PropertiesWatcher
+from lookup import load_compact_catalog
+watcher = PropertiesWatcher({csv_path!r}, fast_startup=True)
+versions = [watcher.check()]
+with open({csv_path!r}, "a", encoding="utf-8") as fh:
+    fh.write("99,P099,Late Listing,1 New St,Dubai,900,2,2,500000,USD,Apartment,Available,Brand new,a@b.com\\n")
+os.utime({csv_path!r}, ns=(1, 1))
+versions.append(watcher.check())
+loaded = {{"frame": bool(helpers._PROPERTIES_CACHE), "pandas": "pandas" in sys.modules,
+           "catalog": load_compact_catalog({csv_path!r}) is not None}}
+print(json.dumps([versions, loaded]))
+"""
+    env = dict(os.environ, PYTHONPATH=SRC)
+    out = subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True).stdout
+    versions, loaded = json.loads(out)
+    assert versions[0] == before != versions[1] == load_properties(csv_path).attrs["dataset_version"]
+    assert loaded == {"frame": False, "pandas": False, "catalog": False}
+
+
+def test_fast_startup_watcher_reloads_once_a_frame_is_loaded(csv_path):
+    watcher = helpers.PropertiesWatcher(csv_path, fast_startup=True)
+    df = load_properties(csv_path)
+    with open(csv_path, "a", encoding="utf-8") as fh:
+        fh.write("99,P099,Late Listing,1 New St,Dubai,900,2,2,500000,USD,Apartment,Available,Brand new,a@b.com\n")
+    os.utime(csv_path, ns=(1, 1))
+    assert watcher.check() != df.attrs["dataset_version"]
+    assert helpers._PROPERTIES_CACHE[os.path.abspath(csv_path)][1] is not df
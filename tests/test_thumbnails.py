@@ -0,0 +1,33 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from thumbnails import thumbnail_path
+
+
+def test_thumbnail_is_generated_once_and_pre_sized(tmp_path):
+    path = thumbnail_path("P003", "Studio", size=(300, 180), directory=str(tmp_path))
+    with Image.open(path) as image:
+        assert image.size == (300, 180)
+    mtime = os.path.getmtime(path)
+    assert thumbnail_path("P003", "Studio", size=(300, 180), directory=str(tmp_path)) == path
+    assert os.path.getmtime(path) == mtime
+
+
+def test_concurrent_sessions_render_the_same_listing(tmp_path):
+    with ThreadPoolExecutor(8) as pool:
+        paths = set(pool.map(lambda _: thumbnail_path("P001", size=(300, 180), directory=str(tmp_path)), range(16)))
+    (path,) = paths
+    with Image.open(path) as image:
+        image.load()
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+
+
+def test_label_and_raw_id_pick_the_file(tmp_path):
+    directory = str(tmp_path)
+    studio = thumbnail_path("P003", "Studio", size=(300, 180), directory=directory)
+    assert thumbnail_path("P003", "Apartment", size=(300, 180), directory=directory) != studio
+    assert thumbnail_path("P/1", size=(300, 180), directory=directory) != thumbnail_path(
+        "P_1", size=(300, 180), directory=directory)
+    assert len(os.listdir(directory)) == 4